@@ -1,56 +1,93 @@
 import os
 import json
 import sys
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Header, Query
 from fastapi.responses import FileResponse, StreamingResponse
 import asyncio
-from typing import List, Dict, Optional
+from typing import Dict, List, Optional
 import uuid
 from app.services.document_processor import DocumentProcessor
 from app.services.mismatch_detector import MismatchDetector
-from app.services.excel_generator import ExcelGenerator
-from app.config import UPLOAD_DIR
+from app.services.job_runner import (
+    get_job_runner,
+    reconcile_invoices,
+    build_mismatch_report,
+    build_analysis_report,
+    build_invoice_sheet
+)
+from app.services.job_queue import get_job_queue
+from app.services.ocr_engine import estimate_pages
+from app.services.extraction_cache import ExtractionCache
+from app.api.responses import FastJSONResponse
+from app.services.event_bus import TERMINAL_STATUSES, coalesce, get_event_bus
+from app.services.result_spill import (
+    SPILL_COLLECTIONS,
+    StaleCursor,
+    get_result_spill,
+    invoice_rows,
+    spill_reconciliation
+)
+from app.services.sessions import ProcessingSession, processing_jobs, progress_snapshot, save_session
+from app.config import (
+    UPLOAD_DIR,
+    EVENTS_KEEPALIVE_SECONDS,
+    RESULTS_PAGE_SIZE,
+    RESULTS_MAX_PAGE_SIZE,
+    RECONCILE_CLAIM_MINUTES
+)
 
 router = APIRouter()
 
-# In-memory storage for processing jobs (in production, use a database)
-processing_jobs: Dict[str, Dict] = {}
-
-class ProcessingSession:
-    """Manages a processing session for documents"""
-    
-    def __init__(self, session_id: str, client_name: str, month: str):
-        self.session_id = session_id
-        self.client_name = client_name
-        self.month = month
-        self.status = "initialized"
-        self.progress = 0
-        self.extracted_invoices = []
-        self.gstr2b_data = None
-        self.mismatch_results = None
-        self.excel_data = None
-        self.error = None
-    
-    def to_dict(self):
-        return {
-            "session_id": self.session_id,
-            "client_name": self.client_name,
-            "month": self.month,
-            "status": self.status,
-            "progress": self.progress,
-            "extracted_invoices": self.extracted_invoices,
-            "gstr2b_data": self.gstr2b_data,
-            "mismatch_results": self.mismatch_results,
-            "excel_data": self.excel_data,
-            "error": self.error
-        }
+# Session statuses while a mismatch detection job is running
+DETECTION_STATUSES = ("detecting_mismatches", "building_report")
+
+
+def rematch(session: ProcessingSession, changes: Dict[int, Dict], full_list: bool):
+    """
+    Bring the session's matching up to date with its edited invoices and
+    spill the new results (blocking; run it with asyncio.to_thread).
+    
+    The matching state stays on the session between edits; a session loaded
+    in another process takes the one saved in the spill and re-matches only
+    the invoices that differ from it. Only a session without a saved state
+    is matched from scratch.
+    """
+    spill = get_result_spill()
+    detector = MismatchDetector()
+    state = session.reconciliation
+    if state is not None and not full_list:
+        state.apply_changes(changes)
+    else:
+        state = state or spill.read_state(session.session_id)
+        if state is not None:
+            state.update(session.extracted_invoices)
+        else:
+            state = detector.reconcile(session.extracted_invoices, session.gstr2b_data, session.gstr2b_index)
+    
+    session.reconciliation = state
+    session.gstr2b_index = state.index
+    results = state.results()
+    session.mismatch_results = {
+        "results": results,
+        "report_card": detector.generate_report_card(results, include_detail=False)
+    }
+    spill_reconciliation(spill, session.session_id, state)
 
 
 @router.post("/process")
-async def process_documents(client_name: str, month: str, background_tasks: BackgroundTasks):
+async def process_documents(
+    client_name: str,
+    month: str,
+    preprocess: bool = True
+):
     """
     Initiate document processing for uploaded files
     Returns a session ID for tracking progress
+    
+    The files are queued for the extraction workers (see app/worker.py), so
+    processing survives restarts of this process.
+    
+    - **preprocess**: Clean up images (deskew, binarize, downscale) before OCR
     """
     print(f"\n[PROCESS] Starting process endpoint: client={client_name}, month={month}", file=sys.stderr)
     
@@ -58,7 +95,7 @@ async def process_documents(client_name: str, month: str, background_tasks: Back
         # Create processing session
         session_id = str(uuid.uuid4())
         session = ProcessingSession(session_id, client_name, month)
-        processing_jobs[session_id] = session
+        await save_session(session)
         print(f"[PROCESS] Created session: {session_id}", file=sys.stderr)
         
         # Get file paths
@@ -76,7 +113,7 @@ async def process_documents(client_name: str, month: str, background_tasks: Back
         file_paths = [
             os.path.join(client_path, f)
             for f in all_items
-            if os.path.isfile(os.path.join(client_path, f))
+            if os.path.isfile(os.path.join(client_path, f)) and not f.endswith(".part")
         ]
         
         print(f"[PROCESS] Found {len(file_paths)} files: {[os.path.basename(f) for f in file_paths]}", file=sys.stderr)
@@ -85,99 +122,136 @@ async def process_documents(client_name: str, month: str, background_tasks: Back
             print(f"[PROCESS] ERROR: No files found in {client_path}", file=sys.stderr)
             raise HTTPException(status_code=400, detail="No files found in upload directory")
         
-        # Start background processing
-        print(f"[PROCESS] Starting background task for {len(file_paths)} files", file=sys.stderr)
-        background_tasks.add_task(
-            process_documents_background,
-            session_id,
-            file_paths
-        )
-        print(f"[PROCESS] ✓ Background task queued for session {session_id}", file=sys.stderr)
+        # Queue one task per file for the extraction workers; page counts
+        # let the scheduler put small jobs first, and content hashes pick up
+        # files already extracted on arrival
+        pages, file_hashes = await asyncio.to_thread(lambda: (
+            [estimate_pages(path) for path in file_paths],
+            [ExtractionCache.hash_file(path) for path in file_paths]
+        ))
+        queue = get_job_queue()
+        job_id = queue.enqueue(session_id, client_name, file_paths, preprocess, pages, file_hashes)
+        done, _ = queue.progress(job_id)
+        if done:
+            session.progress = 10 + int(done / len(file_paths) * 70)
+        session.status = "queued"
+        processing_jobs.save_progress(session)
+        print(f"[PROCESS] ✓ Job {job_id} queued for session {session_id} ({done} file(s) already extracted)", file=sys.stderr)
         
         return {
             "status": "processing_started",
             "session_id": session_id,
             "client_name": client_name,
             "month": month,
-            "file_count": len(file_paths)
+            "file_count": len(file_paths),
+            "page_count": sum(pages),
+            "job_id": job_id
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def process_documents_background(session_id: str, file_paths: List[str]):
-    """Background task for processing documents"""
-    session = processing_jobs[session_id]
-    print(f"\n[BACKGROUND] Starting background processing for session {session_id}", file=sys.stderr)
-    print(f"[BACKGROUND] Processing {len(file_paths)} files", file=sys.stderr)
-    
-    try:
-        session.status = "extracting"
-        session.progress = 10
-        print(f"[BACKGROUND] Status set to 'extracting', progress: 10%", file=sys.stderr)
-        
-        # Initialize processor
-        print(f"[BACKGROUND] Initializing DocumentProcessor...", file=sys.stderr)
-        processor = DocumentProcessor()
-        
-        # Process documents
-        async def progress_callback(progress_data):
-            new_progress = 10 + int(progress_data["current"] / progress_data["total"] * 70)
-            session.progress = new_progress
-            session.status = progress_data["status"]
-            print(f"[BACKGROUND] Progress update: {new_progress}% - {progress_data['status']}", file=sys.stderr)
-        
-        print(f"[BACKGROUND] Starting document processing...", file=sys.stderr)
-        result = await processor.process_documents(file_paths, progress_callback)
-        
-        print(f"[BACKGROUND] Processing complete. Extracted {len(result.get('invoices', []))} invoices", file=sys.stderr)
-        
-        session.extracted_invoices = result.get("invoices", [])
-        session.progress = 80
-        session.status = "extracted"
-        print(f"[BACKGROUND] Status set to 'extracted', progress: 80%", file=sys.stderr)
-        
-        # Generate initial Excel
-        print(f"[BACKGROUND] Generating Excel report...", file=sys.stderr)
-        generator = ExcelGenerator()
-        excel_data, filename = generator.generate_invoice_sheet(session.extracted_invoices)
-        session.excel_data = {
-            "filename": filename,
-            "size": len(excel_data),
-            "data_preview": [inv for inv in session.extracted_invoices[:5]]  # First 5 for preview
-        }
-        
-        session.progress = 100
-        session.status = "completed"
-        print(f"[BACKGROUND] ✓ Processing complete! Status: completed, progress: 100%", file=sys.stderr)
-        
-    except Exception as e:
-        session.status = "error"
-        session.error = str(e)
-        print(f"[BACKGROUND] ✗ ERROR: {str(e)}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
-        session.progress = 0
+@router.get("/queue/stats")
+async def get_queue_stats():
+    """Extraction queue depth and wait times per client, plus each worker's cache, batching and pipeline stats"""
+    queue = get_job_queue()
+    return {
+        "clients": await asyncio.to_thread(queue.stats),
+        "workers": await asyncio.to_thread(queue.worker_stats)
+    }
 
 
 @router.get("/progress/{session_id}")
 async def get_progress(session_id: str):
-    """Get processing progress for a session"""
+    """Get processing progress for a session (prefer the /events stream over polling this)"""
     if session_id not in processing_jobs:
-        print(f"[PROGRESS] Session not found: {session_id}", file=sys.stderr)
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = processing_jobs[session_id]
-    progress_data = {
-        "session_id": session_id,
-        "status": session.status,
-        "progress": session.progress,
-        "extracted_count": len(session.extracted_invoices),
-        "error": session.error
-    }
-    print(f"[PROGRESS] Returning progress for {session_id}: {progress_data}", file=sys.stderr)
-    return progress_data
+    return progress_snapshot(processing_jobs[session_id])
+
+
+def _sse_message(event_type: str, data: Dict, seq: Optional[int] = None) -> str:
+    message = f"event: {event_type}\n"
+    if seq is not None:
+        message += f"id: {seq}\n"
+    return message + f"data: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+def _sse_batch(events: List[Dict]) -> str:
+    """One write for a burst of events; only the last message carries the id to resume from"""
+    merged = coalesce(events)
+    return "".join(
+        _sse_message(event["type"], event["data"], events[-1]["seq"] if i == len(merged) - 1 else None)
+        for i, event in enumerate(merged)
+    )
+
+
+@router.get("/events/{session_id}")
+async def stream_events(session_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of a session's progress.
+    
+    Starts with a "progress" snapshot, then pushes stage-level events as they
+    happen: "progress" (status changes), "text_ready", "ocr_page", "llm_done",
+    "invoice" (per finished file) and "detection" (mismatch detection steps).
+    Bursts are coalesced into one write, keeping only the latest progress.
+    The stream ends after a terminal status (completed, error,
+    mismatch_detection_completed); reconnecting clients resume after the
+    Last-Event-ID they send.
+    """
+    if session_id not in processing_jobs:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    bus = get_event_bus()
+    resume_after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    
+    async def stream():
+        queue = bus.subscribe(session_id)
+        try:
+            # Events up to here are covered by the snapshot (or replayed on resume)
+            last_seq = await asyncio.to_thread(bus.last_seq, session_id)
+            if resume_after is not None:
+                missed = await asyncio.to_thread(bus.history, session_id, resume_after)
+                if missed:
+                    yield _sse_batch(missed)
+                    last_seq = max(last_seq, missed[-1]["seq"])
+            
+            session = processing_jobs.get(session_id)
+            if session is None:
+                return
+            snapshot = progress_snapshot(session)
+            yield _sse_message("progress", snapshot, last_seq or None)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return
+            
+            while True:
+                try:
+                    events = [await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_SECONDS)]
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                while not queue.empty():
+                    events.append(queue.get_nowait())
+                
+                events = [event for event in events if event["seq"] > last_seq]
+                if not events:
+                    continue
+                last_seq = events[-1]["seq"]
+                yield _sse_batch(events)
+                if any(
+                    event["type"] == "progress" and event["data"]["status"] in TERMINAL_STATUSES
+                    for event in events
+                ):
+                    return
+        finally:
+            bus.unsubscribe(session_id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.post("/upload-gstr2b/{session_id}")
@@ -199,7 +273,18 @@ async def upload_gstr2b(session_id: str, gstr2b_data: Dict):
             raise HTTPException(status_code=400, detail=validation_result["message"])
         
         session.gstr2b_data = gstr2b_data
+        session.gstr2b_index = await asyncio.to_thread(MismatchDetector().build_index, gstr2b_data)
+        # Matches against the previous GSTR2B no longer apply: stored results
+        # refer to rows of the old index by position
+        session.reconciliation = None
+        get_result_spill().discard_state(session_id)
+        if session.has("mismatch_results"):
+            session.mismatch_results = None
+            session.excel_data = None
+            get_result_spill().discard_report(session_id)
         session.status = "gstr2b_uploaded"
+        await save_session(session)
+        get_result_spill().discard(session_id, ("matches", "mismatches", "unmatched"))
         
         return {
             "status": "success",
@@ -244,73 +329,166 @@ async def fetch_gstr2b_from_govt(gstin: str, period: str):
 @router.post("/detect-mismatches/{session_id}")
 async def detect_mismatches(session_id: str):
     """
-    Run mismatch detection between extracted invoices and GSTR2B
+    Start mismatch detection between extracted invoices and GSTR2B
+    
+    Returns at once with a job handle; follow progress on /events/{session_id}
+    (or poll /progress/{session_id}) until the status is
+    "mismatch_detection_completed" (or "error"), then read the report card
+    from /session/{session_id}.
     """
     if session_id not in processing_jobs:
         raise HTTPException(status_code=404, detail="Session not found")
     
     session = processing_jobs[session_id]
     
-    if not session.extracted_invoices:
+    if not session.extracted_count:
         raise HTTPException(status_code=400, detail="No extracted invoices available")
     
-    if not session.gstr2b_data:
+    if not session.has("gstr2b_data"):
         raise HTTPException(status_code=400, detail="GSTR2B data not uploaded")
     
+    # Claimed in the shared store, so a request handled by another worker
+    # process does not start the same job twice
+    job_id = str(uuid.uuid4())
+    claimed = await asyncio.to_thread(
+        processing_jobs.claim_job,
+        session,
+        job_id,
+        "detecting_mismatches",
+        DETECTION_STATUSES,
+        RECONCILE_CLAIM_MINUTES * 60
+    )
+    if claimed:
+        get_job_runner().start(job_id, detect_mismatches_background(session))
+    
+    return {
+        "status": "accepted",
+        "session_id": session_id,
+        "job_id": session.job_id
+    }
+
+
+async def detect_mismatches_background(session: ProcessingSession):
+    """Reconcile and build the mismatch report in the job pool, reporting progress on the session"""
+    runner = get_job_runner()
+    bus = get_event_bus()
+    
     try:
-        session.status = "detecting_mismatches"
-        session.progress = 0
-        
-        # Initialize detector
-        detector = MismatchDetector()
+        session.progress = 10
+        processing_jobs.save_progress(session)
+        bus.publish(session.session_id, "detection", {"stage": "reconciling", "invoices": session.extracted_count})
+        await asyncio.to_thread(session.load)
         
-        # Detect mismatches
-        mismatch_results = detector.detect_mismatches(
+        # Detect mismatches, keeping the matching state for later edits
+        state, results, report_card = await runner.run(
+            reconcile_invoices,
             session.extracted_invoices,
-            session.gstr2b_data
+            session.gstr2b_data,
+            session.gstr2b_index
         )
-        
-        # Generate report card
-        report_card = detector.generate_report_card(mismatch_results)
-        
+        session.gstr2b_index = state.index
+        session.reconciliation = state
         session.mismatch_results = {
-            "analysis": mismatch_results,
+            "results": results,
             "report_card": report_card
         }
+        await asyncio.to_thread(spill_reconciliation, get_result_spill(), session.session_id, state)
+        session.status = "building_report"
+        session.progress = 70
+        await save_session(session)
+        bus.publish(session.session_id, "detection", {"stage": "reconciled", "summary": report_card["summary"]})
         
         # Generate final Excel with highlighted mismatches
-        generator = ExcelGenerator()
-        excel_data, filename = generator.generate_mismatch_report_sheet(mismatch_results)
+        # Replaces the invoice sheet as the workbook /download-excel serves
+        path = get_result_spill().report_path(session.session_id)
+        filename = await runner.run(
+            build_mismatch_report, results, session.extracted_invoices, state.index.invoices, path
+        )
         
         session.excel_data = {
             "filename": filename,
-            "size": len(excel_data),
+            "size": os.path.getsize(path),
             "type": "mismatch_report"
         }
         
+        bus.publish(session.session_id, "detection", {"stage": "report_built", "filename": filename})
         session.status = "mismatch_detection_completed"
         session.progress = 100
-        
-        return {
-            "status": "success",
-            "session_id": session_id,
-            "report_card": report_card
-        }
+        await save_session(session)
     
     except Exception as e:
         session.status = "error"
         session.error = str(e)
-        raise HTTPException(status_code=500, detail=str(e))
+        processing_jobs.save_progress(session)
+        print(f"[DETECT] Mismatch detection failed for {session.session_id}: {e}", file=sys.stderr)
 
 
 @router.get("/session/{session_id}")
-async def get_session_data(session_id: str):
-    """Get complete session data including all processing results"""
+async def get_session_data(session_id: str, summary: bool = False):
+    """
+    Get complete session data including all processing results, or with
+    `summary=true` only the status, counts and report card summary
+    """
     if session_id not in processing_jobs:
         raise HTTPException(status_code=404, detail="Session not found")
     
     session = processing_jobs[session_id]
-    return session.to_dict()
+    return FastJSONResponse(session.summary() if summary else await asyncio.to_thread(session.details))
+
+
+@router.get("/session/{session_id}/{collection}")
+async def get_session_results(
+    session_id: str,
+    collection: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(RESULTS_PAGE_SIZE, ge=1, le=RESULTS_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """
+    One page of a session's results, read from its on-disk spill.
+    
+    Collections: "invoices" (extracted, with their `index` for edits),
+    "matches" (matched pairs, status "matched" or "mismatch"), "mismatches"
+    (issues per matched invoice) and "unmatched" (status
+    "missing_from_gstr2b" or "extra_in_gstr2b").
+    
+    Args:
+        cursor: `next_cursor` of the previous page; omit for the first page
+        fields: Comma-separated fields to return, dotted for nested ones
+            (e.g. "index,extracted.invoice_number,match_score")
+        status: Comma-separated statuses to keep
+    """
+    if collection not in SPILL_COLLECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {collection}")
+    
+    session = processing_jobs.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    spill = get_result_spill()
+    if not spill.exists(session_id, collection):
+        if collection == "invoices":
+            # Sessions extracted before results were spilled
+            await asyncio.to_thread(spill.write, session_id, "invoices", invoice_rows(session.extracted_invoices))
+        else:
+            raise HTTPException(status_code=404, detail="No results yet; run mismatch detection first")
+    
+    try:
+        page = await asyncio.to_thread(
+            spill.page,
+            session_id,
+            collection,
+            cursor,
+            limit,
+            fields.split(",") if fields else None,
+            status.split(",") if status else None
+        )
+    except StaleCursor as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(page)
 
 
 @router.get("/download-excel/{session_id}")
@@ -324,25 +502,40 @@ async def download_excel(session_id: str):
     if not session.excel_data:
         raise HTTPException(status_code=400, detail="Excel file not generated yet")
     
-    try:
-        # Regenerate Excel on download
-        generator = ExcelGenerator()
-        
-        if session.mismatch_results:
-            excel_data, filename = generator.generate_mismatch_report_sheet(
-                session.mismatch_results["analysis"]
-            )
-        else:
-            excel_data, filename = generator.generate_invoice_sheet(session.extracted_invoices)
-        
-        return StreamingResponse(
-            iter([excel_data]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+    path = get_result_spill().report_path(session_id)
+    filename = session.excel_data["filename"]
+    if not os.path.exists(path):
+        # Built after extraction and detection; rebuilt here after edits
+        # (and for sessions stored before workbooks were kept), off the event loop
+        runner = get_job_runner()
+        try:
+            await asyncio.to_thread(session.load)
+            if session.mismatch_results and "results" in session.mismatch_results:
+                gstr2b_rows = (
+                    session.gstr2b_index.invoices if session.gstr2b_index is not None
+                    else MismatchDetector().gstr2b_rows(session.gstr2b_data)
+                )
+                filename = await runner.run(
+                    build_mismatch_report,
+                    session.mismatch_results["results"],
+                    session.extracted_invoices,
+                    gstr2b_rows,
+                    path
+                )
+            elif session.mismatch_results:
+                # Stored before results were kept in compact form
+                filename = await runner.run(build_analysis_report, session.mismatch_results["analysis"], path)
+            else:
+                filename = await runner.run(build_invoice_sheet, session.extracted_invoices, path)
+        
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=filename
+    )
 
 
 @router.post("/update-excel/{session_id}")
@@ -350,6 +543,11 @@ async def update_excel(session_id: str, updates: Dict):
     """
     Update Excel data with manual edits
     (Store edits and regenerate Excel)
+    
+    Accepts either the full edited list as `invoices`, or only the edited rows
+    as `changes: [{"index": <row>, "invoice": {...}}]` (or `"fields": {...}`
+    to change just those fields of the row). Only the invoices that changed,
+    and the ones competing for the same GSTR2B rows, are re-matched.
     """
     if session_id not in processing_jobs:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -358,21 +556,30 @@ async def update_excel(session_id: str, updates: Dict):
     
     try:
         # Apply updates to extracted invoices or GSTR2B data
-        if "invoices" in updates:
-            session.extracted_invoices = updates["invoices"]
-        
-        # Regenerate mismatch detection if needed
+        await asyncio.to_thread(session.load)
+        invoices = updates["invoices"] if "invoices" in updates else list(session.extracted_invoices)
+        changes = {}
+        for change in updates.get("changes", []):
+            index = change["index"]
+            if not 0 <= index < len(invoices):
+                raise HTTPException(status_code=400, detail=f"Invalid invoice index: {index}")
+            if "invoice" in change:
+                invoice = change["invoice"]
+            else:
+                invoice = {**invoices[index], **change.get("fields", {})}
+            invoices[index] = invoice
+            changes[index] = invoice
+        session.extracted_invoices = invoices
+        
+        # Regenerate mismatch detection if needed, off the event loop
         if session.gstr2b_data and session.extracted_invoices:
-            detector = MismatchDetector()
-            mismatch_results = detector.detect_mismatches(
-                session.extracted_invoices,
-                session.gstr2b_data
-            )
-            
-            session.mismatch_results = {
-                "analysis": mismatch_results,
-                "report_card": detector.generate_report_card(mismatch_results)
-            }
+            await asyncio.to_thread(rematch, session, changes, "invoices" in updates)
+        
+        # The kept workbook is stale; the next download rebuilds it
+        if session.excel_data:
+            session.excel_data["size"] = None
+        get_result_spill().discard_report(session_id)
+        await save_session(session)
         
         return {
             "status": "success",
@@ -380,6 +587,8 @@ async def update_excel(session_id: str, updates: Dict):
             "session_id": session_id
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -391,6 +600,7 @@ async def delete_session(session_id: str):
         raise HTTPException(status_code=404, detail="Session not found")
     
     del processing_jobs[session_id]
+    get_result_spill().delete(session_id)
     
     return {
         "status": "success",
@@ -0,0 +1,116 @@
+import gzip
+import asyncio
+import orjson
+from typing import Any, Optional
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from app.config import COMPRESS_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used instead
+    brotli = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON rendered with orjson (numpy values and non-string keys allowed,
+    anything else unknown as str). Large endpoints return it directly, which
+    also skips FastAPI's jsonable_encoder pass over the content.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported content coding the client accepts ("br", "gzip" or None)"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses JSON responses with brotli or gzip, as negotiated through
+    Accept-Encoding.
+    
+    Only single-body responses are compressed: streamed ones (the progress
+    event stream, Excel downloads) pass through untouched so they are neither
+    buffered nor compressed twice.
+    """
+    
+    def __init__(
+        self,
+        app,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None
+    ):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else COMPRESS_MIN_BYTES
+        self.gzip_level = gzip_level if gzip_level is not None else GZIP_LEVEL
+        self.brotli_quality = brotli_quality if brotli_quality is not None else BROTLI_QUALITY
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers until the body shows whether to compress
+                start_message = message
+                return
+            
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                if (
+                    not message.get("more_body", False)
+                    and len(body) >= self.minimum_size
+                    and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith("application/json")
+                ):
+                    body = await asyncio.to_thread(self._compress, body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    message = {**message, "body": body}
+                await send(start_message)
+                start_message = None
+            
+            await send(message)
+        
+        await self.app(scope, receive, send_compressed)
+    
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
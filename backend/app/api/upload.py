@@ -1,18 +1,157 @@
 import os
 import sys
+import asyncio
+import hashlib
+import aiofiles
+from collections import Counter
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import List
-from app.config import UPLOAD_DIR
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from typing import Dict, List, Optional
+from app.config import (
+    UPLOAD_DIR,
+    UPLOAD_CHUNK_KB,
+    UPLOAD_MAX_FILE_MB,
+    UPLOAD_MAX_REQUEST_MB,
+    UPLOAD_WRITE_CONCURRENCY,
+    PROCESS_ON_ARRIVAL
+)
+from app.services.job_queue import get_job_queue
+from app.services.ocr_engine import estimate_pages
 
 router = APIRouter()
 
 print(f"[UPLOAD] UPLOAD_DIR configured to: {UPLOAD_DIR}", file=sys.stderr)
 
+MB = 1024 * 1024
+
+
+class UploadQuota:
+    """Bytes still allowed in one upload request, shared by its parallel file writes"""
+    
+    def __init__(self, max_request_bytes: int, max_file_bytes: int):
+        self.remaining = max_request_bytes
+        self.max_file_bytes = max_file_bytes
+    
+    def take(self, filename: str, file_bytes: int, chunk_bytes: int):
+        if file_bytes > self.max_file_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{filename} is larger than the {self.max_file_bytes // MB} MB per-file limit"
+            )
+        self.remaining -= chunk_bytes
+        if self.remaining < 0:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds the {UPLOAD_MAX_REQUEST_MB} MB limit")
+
+
+class UploadLimitMiddleware:
+    """
+    Enforces the per-request upload limit before the multipart form is
+    parsed, since parsing spools every file to temp disk before the handler
+    runs. A request whose Content-Length is over the limit is refused
+    without reading its body; a body that streams past the limit (chunked,
+    or with a wrong Content-Length) is cut off there and answered with 413.
+    """
+    
+    def __init__(self, app, path_prefix: str = "/upload", max_request_bytes: Optional[int] = None):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_request_bytes = max_request_bytes if max_request_bytes is not None else UPLOAD_MAX_REQUEST_MB * MB
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        
+        if int(Headers(scope=scope).get("content-length") or 0) > self.max_request_bytes:
+            await self._reject(scope, receive, send)
+            return
+        
+        received = 0
+        exceeded = False
+        rejected = False
+        
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_request_bytes:
+                    # Parsing stops as if the client had gone away
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+        
+        async def send_checked(message):
+            nonlocal rejected
+            if not exceeded:
+                await send(message)
+            elif not rejected:
+                # Replace whatever the aborted parse produced
+                rejected = True
+                await self._reject(scope, receive, send)
+        
+        try:
+            await self.app(scope, limited_receive, send_checked)
+        except Exception:
+            if not exceeded:
+                raise
+            if not rejected:
+                rejected = True
+                await self._reject(scope, receive, send)
+    
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload exceeds the {self.max_request_bytes // MB} MB limit"}
+        )
+        await response(scope, receive, send)
+
+
+async def save_upload(file: UploadFile, file_path: str, quota: UploadQuota) -> Dict:
+    """
+    Stream an upload to disk in fixed-size chunks, hashing it on the way.
+    
+    The file is written under a temporary name and moved into place only when
+    complete, so a rejected or failed upload never leaves a partial file.
+    """
+    chunk_size = UPLOAD_CHUNK_KB * 1024
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = file_path + ".part"
+    
+    try:
+        async with aiofiles.open(partial_path, "wb") as out:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                quota.take(file.filename, size, len(chunk))
+                digest.update(chunk)
+                await out.write(chunk)
+        os.replace(partial_path, file_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    finally:
+        await file.close()
+    
+    return {
+        "filename": file.filename,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "path": file_path
+    }
+
+
 @router.post("/")
 async def upload_invoices(
     client_name: str = Form(...),
     month: str = Form(...),   # format: YYYY_MM
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    process_on_arrival: bool = Form(PROCESS_ON_ARRIVAL),
+    preprocess: bool = Form(True)
 ):
     """
     Upload multiple invoice files for a client and month
@@ -20,57 +159,63 @@ async def upload_invoices(
     - **client_name**: Client identifier (e.g., ABC_Enterprises)
     - **month**: Month in format YYYY_MM (e.g., 2026_01)
     - **files**: Multiple PDF/image files
+    - **process_on_arrival**: Start extracting the files right away; a later
+      /process/process call (with the same `preprocess`) reuses the results
+    
+    Files are streamed to disk in chunks (several at once) and hashed on the
+    way; requests over the per-file or per-request size limit get a 413 (the
+    request limit is enforced by `UploadLimitMiddleware` before the form is
+    parsed). Several files with the same name get a 400.
     """
     print(f"\n[UPLOAD] Starting upload for client={client_name}, month={month}, files={len(files)}", file=sys.stderr)
     
+    # Files of one request with the same path would race on one partial file
+    relative_paths = [os.path.normpath(file.filename.replace("\\", "/")) for file in files]
+    duplicates = sorted(path for path, count in Counter(relative_paths).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate file names in upload: {', '.join(duplicates)}")
+    
     try:
         # Create directory: uploads/client_name/month
         client_path = os.path.join(UPLOAD_DIR, client_name, month)
-        print(f"[UPLOAD] Creating directory: {client_path}", file=sys.stderr)
         os.makedirs(client_path, exist_ok=True)
         
-        # Verify directory was created
-        if not os.path.exists(client_path):
-            print(f"[UPLOAD] ERROR: Directory creation failed! Path: {client_path}", file=sys.stderr)
-            raise Exception(f"Failed to create directory: {client_path}")
+        quota = UploadQuota(UPLOAD_MAX_REQUEST_MB * MB, UPLOAD_MAX_FILE_MB * MB)
+        semaphore = asyncio.Semaphore(UPLOAD_WRITE_CONCURRENCY)
         
-        print(f"[UPLOAD] Directory created successfully", file=sys.stderr)
-
-        saved_files = []
-
-        for file in files:
-            # Normalize path (Windows safety)
-            relative_path = file.filename.replace("\\", "/")
-
+        async def save(file: UploadFile, relative_path: str) -> Dict:
             file_path = os.path.join(client_path, relative_path)
-
+            
             # 🔑 CREATE missing subfolders
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-            print(f"[UPLOAD] Saving file: {file.filename} to {file_path}", file=sys.stderr)
-
-            content = await file.read()
-            print(f"[UPLOAD] Read {len(content)} bytes from {file.filename}", file=sys.stderr)
-
-            with open(file_path, "wb") as f:
-                bytes_written = f.write(content)
-                print(f"[UPLOAD] Wrote {bytes_written} bytes to {file_path}", file=sys.stderr)
-
-            # Verify file was written
-            if not os.path.exists(file_path):
-                print(f"[UPLOAD] ERROR: File not found after writing: {file_path}", file=sys.stderr)
-                raise Exception(f"File write verification failed: {file_path}")
             
-            file_size = os.path.getsize(file_path)
-            print(f"[UPLOAD] File verified on disk: {file_path} ({file_size} bytes)", file=sys.stderr)
-
-            saved_files.append({
-                "filename": file.filename,
-                "size": len(content),
-                "path": file_path
-            })
-
-        print(f"[UPLOAD] ✓ Upload complete! {len(saved_files)} file(s) saved", file=sys.stderr)
+            async with semaphore:
+                return await save_upload(file, file_path, quota)
+        
+        results = await asyncio.gather(
+            *(save(file, relative_path) for file, relative_path in zip(files, relative_paths)),
+            return_exceptions=True
+        )
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            # All or nothing: drop the files of a rejected request
+            for result in results:
+                if not isinstance(result, BaseException):
+                    os.remove(result["path"])
+            raise failures[0]
+        saved_files = list(results)
+        
+        if process_on_arrival:
+            def prefetch():
+                queue = get_job_queue()
+                for saved in saved_files:
+                    queue.prefetch(
+                        client_name, month, saved["path"], saved["sha256"], preprocess, estimate_pages(saved["path"])
+                    )
+            await asyncio.to_thread(prefetch)
+        
+        total_bytes = sum(saved["size"] for saved in saved_files)
+        print(f"[UPLOAD] ✓ Upload complete! {len(saved_files)} file(s), {total_bytes} bytes saved to {client_path}", file=sys.stderr)
         
         return {
             "status": "success",
@@ -79,8 +224,11 @@ async def upload_invoices(
             "month": month,
             "file_count": len(saved_files),
             "files": saved_files,
-            "upload_dir": client_path
+            "upload_dir": client_path,
+            "processing_on_arrival": process_on_arrival
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[UPLOAD] ✗ ERROR: {str(e)}", file=sys.stderr)
         import traceback
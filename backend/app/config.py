@@ -16,3 +16,146 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_DIR = os.path.join(BASE_DIR, "data", "uploads")
 EXCEL_DIR = os.path.join(BASE_DIR, "data", "excel")
+CACHE_DIR = os.path.join(BASE_DIR, "data", "cache")
+
+# 🔹 Extraction cache (OCR text + structured JSON, keyed by file SHA-256)
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH", os.path.join(CACHE_DIR, "extraction_cache.sqlite3")
+)
+EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "512"))
+
+# 🔹 OCR process pool (0 = one worker per CPU core)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# 🔹 Gemini request dispatching
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+
+# 🔹 PDF rasterization for OCR (scratch dir defaults to tmpfs when available)
+RASTER_SCRATCH_DIR = os.getenv("RASTER_SCRATCH_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+)
+RASTER_WINDOW_PAGES = int(os.getenv("RASTER_WINDOW_PAGES", "2"))
+RASTER_JOB_MEMORY_MB = int(os.getenv("RASTER_JOB_MEMORY_MB", "256"))
+
+# 🔹 Adaptive OCR: fast low-DPI pass, re-OCR low-confidence pages at full DPI
+OCR_ADAPTIVE = os.getenv("OCR_ADAPTIVE", "1") == "1"
+OCR_FAST_DPI = int(os.getenv("OCR_FAST_DPI", "150"))
+OCR_FULL_DPI = int(os.getenv("OCR_FULL_DPI", "300"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))
+
+# 🔹 OCR backend: "auto" uses the in-process tesserocr binding when installed
+# (model stays loaded per worker), otherwise pytesseract's subprocess per image
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+TESSDATA_PATH = os.getenv("TESSDATA_PATH")
+
+# 🔹 Batched Gemini extraction: documents per request are limited by an
+# estimated token budget (0 disables batching)
+GEMINI_BATCH_TOKEN_BUDGET = int(os.getenv("GEMINI_BATCH_TOKEN_BUDGET", "8000"))
+GEMINI_BATCH_MAX_DOCUMENTS = int(os.getenv("GEMINI_BATCH_MAX_DOCUMENTS", "10"))
+
+# 🔹 Local rule-based extraction: Gemini is skipped when every required field
+# is found with at least this confidence (set above 1 to always use Gemini)
+RULE_EXTRACTOR_MIN_CONFIDENCE = float(os.getenv("RULE_EXTRACTOR_MIN_CONFIDENCE", "0.9"))
+
+# 🔹 Supplier layout templates learned from Gemini extractions
+TEMPLATE_STORE_PATH = os.getenv("TEMPLATE_STORE_PATH", os.path.join(CACHE_DIR, "supplier_templates.sqlite3"))
+TEMPLATE_MIN_CONFIRMATIONS = int(os.getenv("TEMPLATE_MIN_CONFIRMATIONS", "2"))
+TEMPLATE_VALIDATION_RATE = float(os.getenv("TEMPLATE_VALIDATION_RATE", "0.1"))
+TEMPLATE_MIN_ACCURACY = float(os.getenv("TEMPLATE_MIN_ACCURACY", "0.9"))
+# Accuracy is measured over the last TEMPLATE_ACCURACY_WINDOW validations and
+# only acted on once there are TEMPLATE_MIN_VALIDATIONS of them
+TEMPLATE_ACCURACY_WINDOW = int(os.getenv("TEMPLATE_ACCURACY_WINDOW", "20"))
+TEMPLATE_MIN_VALIDATIONS = int(os.getenv("TEMPLATE_MIN_VALIDATIONS", "10"))
+
+# 🔹 Process pool for reconciliation and report building, so large clients
+# do not block the event loop
+RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", "2"))
+# A detection run is claimed in the session store so only one process runs it;
+# a claim older than this is presumed dead (its process exited) and can be retaken
+RECONCILE_CLAIM_MINUTES = float(os.getenv("RECONCILE_CLAIM_MINUTES", "30"))
+
+# 🔹 Session store: SQLite shared by all workers, with a small in-memory tier
+SESSION_STORE_PATH = os.getenv(
+    "SESSION_STORE_PATH", os.path.join(BASE_DIR, "data", "sessions", "sessions.sqlite3")
+)
+SESSION_MEMORY_ITEMS = int(os.getenv("SESSION_MEMORY_ITEMS", "32"))
+SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "72"))
+SESSION_STORE_MAX_MB = int(os.getenv("SESSION_STORE_MAX_MB", "1024"))
+# Reads refresh a session's last-access time at most this often
+SESSION_TOUCH_SECONDS = float(os.getenv("SESSION_TOUCH_SECONDS", "60"))
+
+# 🔹 Extraction job queue: per-file tasks claimed by `python -m app.worker`
+# processes under a lease; the API process runs an embedded worker unless
+# EMBEDDED_WORKER=0 (0 concurrency = PIPELINE_QUEUE_SIZE files in flight; the
+# pipeline's own queues keep OCR and Gemini busy, and claiming more would only
+# hold leases on files waiting in them).
+# Idle workers poll from WORKER_POLL_SECONDS, backing off up to the max
+JOB_QUEUE_PATH = os.getenv(
+    "JOB_QUEUE_PATH", os.path.join(BASE_DIR, "data", "queue", "jobs.sqlite3")
+)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Completed and failed jobs (with any task rows left behind) are purged after this
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "72"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "0"))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1.0"))
+WORKER_MAX_POLL_SECONDS = float(os.getenv("WORKER_MAX_POLL_SECONDS", "10"))
+WORKER_STATS_SECONDS = float(os.getenv("WORKER_STATS_SECONDS", "30"))
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "1") == "1"
+
+# 🔹 Fair scheduling of queued files across clients: weighted fair queuing by
+# estimated pages ("client=weight,..."; others weigh 1), with jobs of at most
+# SCHEDULER_SMALL_JOB_PAGES pages (or waiting longer than the max wait) first
+SCHEDULER_CLIENT_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (
+        item.split("=", 1) for item in os.getenv("SCHEDULER_CLIENT_WEIGHTS", "").split(",") if "=" in item
+    )
+}
+SCHEDULER_SMALL_JOB_PAGES = int(os.getenv("SCHEDULER_SMALL_JOB_PAGES", "20"))
+SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "600"))
+
+# 🔹 Extraction pipeline: workers per stage (0 = sized from the OCR pool and
+# Gemini concurrency) and the bounded queue in front of each stage
+PIPELINE_PROBE_CONCURRENCY = int(os.getenv("PIPELINE_PROBE_CONCURRENCY", "0"))
+PIPELINE_OCR_CONCURRENCY = int(os.getenv("PIPELINE_OCR_CONCURRENCY", "0"))
+PIPELINE_LLM_CONCURRENCY = int(os.getenv("PIPELINE_LLM_CONCURRENCY", "0"))
+PIPELINE_VALIDATE_CONCURRENCY = int(os.getenv("PIPELINE_VALIDATE_CONCURRENCY", "2"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# 🔹 Uploads are streamed to disk in chunks, several files at a time
+UPLOAD_CHUNK_KB = int(os.getenv("UPLOAD_CHUNK_KB", "1024"))
+UPLOAD_MAX_FILE_MB = int(os.getenv("UPLOAD_MAX_FILE_MB", "200"))
+UPLOAD_MAX_REQUEST_MB = int(os.getenv("UPLOAD_MAX_REQUEST_MB", "2048"))
+UPLOAD_WRITE_CONCURRENCY = int(os.getenv("UPLOAD_WRITE_CONCURRENCY", "4"))
+
+# 🔹 Process on arrival: extract uploaded files right away so /process/process
+# mostly collects finished results (also selectable per upload request)
+PROCESS_ON_ARRIVAL = os.getenv("PROCESS_ON_ARRIVAL", "0") == "1"
+PREFETCH_TTL_HOURS = float(os.getenv("PREFETCH_TTL_HOURS", "24"))
+
+# 🔹 Progress events: stage-level events are written to a shared SQLite log and
+# pushed to /process/events/{session_id} subscribers (polled every
+# EVENTS_POLL_SECONDS per API process, kept for EVENTS_TTL_MINUTES)
+EVENTS_PATH = os.getenv(
+    "EVENTS_PATH", os.path.join(BASE_DIR, "data", "sessions", "events.sqlite3")
+)
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "0.25"))
+EVENTS_TTL_MINUTES = float(os.getenv("EVENTS_TTL_MINUTES", "60"))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# 🔹 Session results (invoices, matches, mismatches) and the GSTR2B data are
+# spilled to one append-only JSONL file per collection, kept until the session
+# is evicted, and served in cursor-paginated pages
+RESULTS_DIR = os.getenv("RESULTS_DIR", os.path.join(BASE_DIR, "data", "results"))
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "100"))
+RESULTS_MAX_PAGE_SIZE = int(os.getenv("RESULTS_MAX_PAGE_SIZE", "1000"))
+
+# 🔹 JSON responses of at least COMPRESS_MIN_BYTES are compressed with brotli
+# (if installed) or gzip, whichever the client accepts
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
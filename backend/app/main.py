@@ -1,10 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.upload import router as upload_router
+from app.api.upload import router as upload_router, UploadLimitMiddleware
 from app.api.processing import router as processing_router
+from app.api.responses import FastJSONResponse, CompressionMiddleware
+from app.services.ocr_engine import shutdown_ocr_engine
+from app.services.job_runner import shutdown_job_runner
+from app.worker import start_embedded_worker, stop_embedded_worker
+from app.config import EMBEDDED_WORKER
 
-app = FastAPI(title="AI GST Document Processing API")
+app = FastAPI(title="AI GST Document Processing API", default_response_class=FastJSONResponse)
 
+# Innermost, so its 413s still get CORS headers
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -12,10 +19,24 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(upload_router, prefix="/upload")
 app.include_router(processing_router, prefix="/process")
 
+@app.on_event("startup")
+async def start_workers():
+    # Single-process setups extract in the API process; with dedicated
+    # `python -m app.worker` processes set EMBEDDED_WORKER=0
+    if EMBEDDED_WORKER:
+        start_embedded_worker()
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    stop_embedded_worker()
+    shutdown_ocr_engine()
+    shutdown_job_runner()
+
 @app.get("/")
 def health_check():
     return {"status": "Backend running"}
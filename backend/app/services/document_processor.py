@@ -1,172 +1,413 @@
 import os
 import json
 import base64
-from typing import List, Dict, Optional
-from google import genai
-import pytesseract
-from PIL import Image
-import PyPDF2
-from pdf2image import convert_from_path
+import asyncio
+from typing import Callable, List, Dict, Optional, Tuple
 from pathlib import Path
+from app.config import (
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_BATCH_TOKEN_BUDGET,
+    GEMINI_BATCH_MAX_DOCUMENTS,
+    OCR_ADAPTIVE,
+    OCR_FAST_DPI,
+    OCR_FULL_DPI,
+    OCR_MIN_CONFIDENCE,
+    RULE_EXTRACTOR_MIN_CONFIDENCE,
+    PIPELINE_PROBE_CONCURRENCY,
+    PIPELINE_OCR_CONCURRENCY,
+    PIPELINE_LLM_CONCURRENCY,
+    PIPELINE_VALIDATE_CONCURRENCY,
+    PIPELINE_QUEUE_SIZE
+)
+from app.services.extraction_cache import ExtractionCache
+from app.services.ocr_engine import OCREngine, get_ocr_engine, use_tesserocr
+from app.services.llm_dispatcher import get_llm_dispatcher
+from app.services.llm_batcher import LLMBatcher
+from app.services.rule_extractor import RuleBasedExtractor
+from app.services.template_store import TemplateStore
+from app.services.pdf_rasterizer import MIN_TEXT_LAYER_CHARS, page_pixel_bytes
+from app.services.extraction_pipeline import ExtractionPipeline, Stage
+
+# Bump these whenever the OCR pipeline or the Gemini prompt changes so that
+# previously cached results are no longer reused.
+EXTRACTOR_VERSION = "3"
+PROMPT_VERSION = "2"
+GEMINI_MODEL = "gemini-2.5-flash"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tiff", ".bmp")
+
+# Fields an invoice needs before it can be marked valid
+REQUIRED_FIELDS = ("invoice_number", "invoice_date", "total_amount")
+
+# Invoice fields sent with the "invoice" progress event
+INVOICE_EVENT_FIELDS = ("invoice_number", "invoice_date", "supplier_gstin", "total_amount", "status")
+
+# Only the start of each document is sent to Gemini
+MAX_PROMPT_TEXT_CHARS = 4000
+
+INVOICE_FIELDS_PROMPT = """- invoice_number (string)
+            - invoice_date (string, YYYY-MM-DD format)
+            - gstin (string, 15 character GST number or null)
+            - supplier_gstin (string)
+            - invoice_amount (number)
+            - tax_amount (number)
+            - total_amount (number)
+            - items (array of objects with: description, quantity, rate, amount)
+            - status (string: valid, invalid, or partial)
+            """
 
 class DocumentProcessor:
-    """Handles OCR extraction and Gemini AI processing of documents"""
+    """
+    Handles OCR extraction and Gemini AI processing of documents
     
-    def __init__(self, api_key: Optional[str] = None):
+    Files go through a stage pipeline: probe (hash, cached text, PDF text
+    layer), OCR (rasterize and recognize scanned pages), LLM (rules, supplier
+    template or Gemini) and validate. Each stage has its own workers, so one
+    file's OCR overlaps another's Gemini call.
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[ExtractionCache] = None,
+        ocr_engine: Optional[OCREngine] = None,
+        template_store: Optional[TemplateStore] = None,
+        preprocess: bool = True,
+        adaptive_ocr: bool = OCR_ADAPTIVE,
+        batch_token_budget: int = GEMINI_BATCH_TOKEN_BUDGET
+    ):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if self.api_key:
-            self.client = genai.Client(api_key=self.api_key)
+            self.llm = get_llm_dispatcher(self.api_key)
+            self.client = self.llm.client
         else:
+            self.llm = None
             self.client = None
-    
-    async def process_documents(self, file_paths: List[str], progress_callback=None) -> Dict:
-        """
-        Process multiple documents and extract invoice data using OCR and Gemini
+        self.cache = cache or ExtractionCache()
+        self.ocr_engine = ocr_engine or get_ocr_engine()
+        self.rule_extractor = RuleBasedExtractor(min_confidence=RULE_EXTRACTOR_MIN_CONFIDENCE)
+        self.template_store = template_store or TemplateStore()
         
-        Args:
-            file_paths: List of file paths to process
-            progress_callback: Async callback for progress updates
+        # Several invoices per Gemini request, sized to a token budget (0 disables)
+        if self.llm and batch_token_budget > 0:
+            self.batcher = LLMBatcher(
+                run_batch=self._request_batch,
+                run_single=self._request_single,
+                estimate_tokens=self._estimate_tokens,
+                token_budget=batch_token_budget,
+                max_items=GEMINI_BATCH_MAX_DOCUMENTS
+            )
+        else:
+            self.batcher = None
         
-        Returns:
-            Dictionary with extracted invoice data and metadata
-        """
-        extracted_data = []
-        total_files = len(file_paths)
+        # Enough OCR and LLM workers to keep both the OCR pool and the Gemini quota busy
+        documents_per_request = GEMINI_BATCH_MAX_DOCUMENTS if self.batcher else 1
+        llm_concurrency = PIPELINE_LLM_CONCURRENCY or GEMINI_MAX_CONCURRENCY * documents_per_request
+        ocr_concurrency = PIPELINE_OCR_CONCURRENCY or self.ocr_engine.max_workers * 2
         
-        for index, file_path in enumerate(file_paths):
-            try:
-                # Update progress
-                if progress_callback:
-                    await progress_callback({
-                        "step": "extraction",
-                        "current": index + 1,
-                        "total": total_files,
-                        "status": f"Processing {os.path.basename(file_path)}..."
-                    })
-                
-                # Extract text from file
-                text = await self._extract_text_from_file(file_path)
-                
-                # Use Gemini to structure the data
-                if self.client and text:
-                    structured_data = await self._extract_structured_data(text, os.path.basename(file_path))
-                    extracted_data.append(structured_data)
-                else:
-                    # Fallback if Gemini not available
-                    extracted_data.append({
-                        "file": os.path.basename(file_path),
-                        "raw_text": text,
-                        "invoice_number": "UNKNOWN",
-                        "invoice_date": "UNKNOWN",
-                        "gstin": "UNKNOWN",
-                        "amount": 0.0,
-                        "status": "pending_review"
-                    })
-                
-            except Exception as e:
-                extracted_data.append({
-                    "file": os.path.basename(file_path),
-                    "error": str(e),
-                    "status": "error"
-                })
+        # Rasterization runs inside the OCR workers, so page images never
+        # cross process boundaries; it is part of the OCR stage
+        self.pipeline = ExtractionPipeline(
+            [
+                Stage("probe", self._probe_stage, PIPELINE_PROBE_CONCURRENCY or self.ocr_engine.max_workers),
+                Stage("ocr", self._ocr_stage, ocr_concurrency),
+                Stage("llm", self._llm_stage, llm_concurrency),
+                Stage("validate", self._validate_stage, PIPELINE_VALIDATE_CONCURRENCY)
+            ],
+            queue_size=PIPELINE_QUEUE_SIZE,
+            on_error=self._error_record
+        )
         
+        self.preprocess = preprocess
+        self.adaptive_ocr = adaptive_ocr
+        self.ocr_mode = "-".join([
+            "tesserocr" if use_tesserocr() else "pytesseract",
+            "preprocessed" if preprocess else "raw",
+            f"adaptive{OCR_FAST_DPI}" if adaptive_ocr else "fixed",
+            str(OCR_FULL_DPI)
+        ])
+    
+    def stats(self) -> Dict:
+        """Cache hit/miss counts, LLM batching counters and per-stage pipeline metrics"""
         return {
-            "status": "completed",
-            "total_processed": len(extracted_data),
-            "invoices": extracted_data
+            "cache": self.cache.stats(),
+            "llm_batching": dict(self.batcher.stats) if self.batcher else None,
+            "pipeline": self.pipeline.stats()
         }
     
-    async def _extract_text_from_file(self, file_path: str) -> str:
-        """Extract text from PDF or image file"""
+    async def process_file(
+        self,
+        file_path: str,
+        on_event: Optional[Callable[[str, Dict], None]] = None
+    ) -> Dict:
+        """
+        Run one file through the pipeline and return its invoice record.
+        
+        `on_event(type, data)` is called as the file passes each stage:
+        "text_ready" (cached text or PDF text layer), "ocr_page" (per OCR'd
+        window of pages), "llm_done" and "invoice" (the finished record).
+        """
+        return await self.pipeline.submit({"file_path": file_path, "on_event": on_event})
+    
+    async def _probe_stage(self, item: Dict) -> Optional[str]:
+        """Hash the file and reuse cached text or the PDF text layer; pages without text go to OCR"""
+        file_path = item["file_path"]
+        item["file_hash"] = await asyncio.to_thread(ExtractionCache.hash_file, file_path)
+        item["text_key"] = ExtractionCache.make_key(item["file_hash"], EXTRACTOR_VERSION, self.ocr_mode)
+        item["text"], item["pages"] = "", []
+        
+        cached = await asyncio.to_thread(self.cache.get, "text", item["text_key"])
+        if cached is not None:
+            item["text"], item["pages"] = cached["text"], cached["pages"]
+            self._emit(item, "text_ready", source="cache", pages=len(item["pages"]))
+            return "llm"
+        
         file_ext = Path(file_path).suffix.lower()
-        text = ""
+        if file_ext in IMAGE_EXTENSIONS:
+            return "ocr"
+        if file_ext != ".pdf":
+            print(f"Error extracting text from {file_path}: Unsupported file format: {file_ext}")
+            return "llm"
         
         try:
-            if file_ext == ".pdf":
-                text = await self._extract_text_from_pdf(file_path)
-            elif file_ext in [".png", ".jpg", ".jpeg", ".tiff", ".bmp"]:
-                text = await self._extract_text_from_image(file_path)
-            else:
-                raise ValueError(f"Unsupported file format: {file_ext}")
+            page_texts, page_sizes = await self.ocr_engine.extract_text_layer(file_path)
         except Exception as e:
-            print(f"Error extracting text from {file_path}: {e}")
-            text = ""
+            print(f"Error extracting text from PDF: {e}")
+            return "llm"
+        
+        item["page_texts"], item["page_sizes"] = page_texts, page_sizes
+        item["pages"] = [{"page": number, "source": "text_layer"} for number in range(1, len(page_texts) + 1)]
+        item["scanned"] = [
+            number for number, page_text in enumerate(page_texts, 1)
+            if len(page_text.strip()) < MIN_TEXT_LAYER_CHARS
+        ]
+        if item["scanned"]:
+            self._emit(item, "text_ready", source="text_layer", pages=len(page_texts), scanned=len(item["scanned"]))
+            return "ocr"
         
-        return text
+        await self._store_text(item)
+        self._emit(item, "text_ready", source="text_layer", pages=len(page_texts))
+        return "llm"
     
-    async def _extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from PDF using OCR"""
-        text = ""
+    async def _ocr_stage(self, item: Dict) -> Optional[str]:
+        """OCR the scanned pages of a PDF, or a whole image"""
+        file_path = item["file_path"]
+        if "page_texts" not in item:
+            item["text"], item["pages"] = await self._extract_text_from_image(file_path)
+            await self._store_text(item)
+            self._emit(item, "ocr_page", pages=item["pages"])
+            return "llm"
         
-        try:
-            # Try direct text extraction first
-            with open(pdf_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            
-            # If minimal text extracted, use OCR
-            if len(text.strip()) < 100:
-                images = convert_from_path(pdf_path, dpi=300)
-                for image in images:
-                    text += pytesseract.image_to_string(image) + "\n"
+        def on_window(results: Dict[int, Tuple[str, float, int]]):
+            self._emit(item, "ocr_page", pages=[
+                {"page": number, "confidence": confidence, "dpi": dpi}
+                for number, (_, confidence, dpi) in sorted(results.items())
+            ])
         
+        try:
+            results = await self._ocr_pdf_pages_adaptive(
+                file_path, item["scanned"], item["page_sizes"], on_window
+            )
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
-            text = ""
+            item["pages"] = []
+            return "llm"
+        
+        for number, (page_text, confidence, dpi) in results.items():
+            item["page_texts"][number - 1] = page_text
+            item["pages"][number - 1] = {"page": number, "source": "ocr", "dpi": dpi, "confidence": confidence}
+        await self._store_text(item)
+        return "llm"
+    
+    async def _llm_stage(self, item: Dict) -> Optional[str]:
+        item["result"] = await self._structure_text(item["text"], item["file_path"], item["file_hash"])
+        self._emit(item, "llm_done", method=item["result"].get("extraction_method"), status=item["result"].get("status"))
+        return "validate"
+    
+    async def _validate_stage(self, item: Dict) -> Optional[str]:
+        """Attach per-page OCR details and downgrade "valid" records that lack required fields"""
+        data = item["result"]
+        # Per-page text source, OCR confidence and resolution
+        data["ocr_pages"] = item["pages"]
+        if data.get("status") == "valid" and any(data.get(field) in (None, "") for field in REQUIRED_FIELDS):
+            data["status"] = "partial"
+        self._emit(item, "invoice", **{field: data.get(field) for field in INVOICE_EVENT_FIELDS})
+        return None
+    
+    @staticmethod
+    def _emit(item: Dict, event_type: str, **data):
+        """Report a stage event for the item's file, if anyone is listening"""
+        if item.get("on_event"):
+            item["on_event"](event_type, {"file": os.path.basename(item["file_path"]), **data})
+    
+    async def _store_text(self, item: Dict):
+        """Assemble the page texts (if any) and cache the extracted text for identical files"""
+        if "page_texts" in item:
+            item["text"] = "".join(page_text + "\n" for page_text in item["page_texts"])
+        if item["text"]:
+            entry = {"text": item["text"], "pages": item["pages"]}
+            await asyncio.to_thread(self.cache.put, "text", item["text_key"], entry)
+    
+    @staticmethod
+    def _error_record(item: Dict, error: Exception) -> Dict:
+        return {
+            "file": os.path.basename(item["file_path"]),
+            "error": str(error),
+            "status": "error"
+        }
+    
+    async def _structure_text(self, text: str, file_path: str, file_hash: str) -> Dict:
+        """
+        Turn extracted text into an invoice record, trying the cheap paths first:
+        generic rules, then the supplier's learned template, then Gemini
+        """
+        filename = os.path.basename(file_path)
+        
+        # Clean machine-generated invoices are parsed locally, skipping Gemini
+        rule_data, rule_confidence = self.rule_extractor.extract(text) if text else ({}, 0.0)
+        if self.rule_extractor.is_confident(rule_confidence):
+            rule_data["file"] = filename
+            rule_data["raw_text_preview"] = text[:500]
+            return rule_data
+        
+        # Repeat suppliers are parsed with the layout learned from earlier invoices
+        supplier = rule_data["supplier_gstin"] if rule_data.get("field_confidence", {}).get("supplier_gstin") == 1.0 else None
+        template_data, validate = (
+            await asyncio.to_thread(self.template_store.parse, supplier, text) if supplier else (None, False)
+        )
+        if template_data is not None and not (self.client and validate):
+            return self._template_record(template_data, rule_data, text, filename)
+        
+        if self.client and text:
+            # Use Gemini to structure the data
+            return await self._extract_structured_cached(text, file_path, file_hash, supplier)
+        
+        # Fallback if Gemini not available
+        return {
+            "file": filename,
+            "raw_text": text,
+            "invoice_number": "UNKNOWN",
+            "invoice_date": "UNKNOWN",
+            "gstin": "UNKNOWN",
+            "amount": 0.0,
+            "status": "pending_review"
+        }
+    
+    @staticmethod
+    def _template_record(values: Dict, rule_data: Dict, text: str, filename: str) -> Dict:
+        """Invoice record in the Gemini output shape from supplier-template values"""
+        supplier = rule_data["supplier_gstin"]
+        return {
+            "invoice_number": values["invoice_number"],
+            "invoice_date": values["invoice_date"],
+            "gstin": supplier,
+            "supplier_gstin": supplier,
+            "recipient_gstin": rule_data.get("recipient_gstin"),
+            "invoice_amount": values.get("invoice_amount", rule_data.get("invoice_amount")),
+            "tax_amount": values.get("tax_amount", rule_data.get("tax_amount")),
+            "total_amount": values["total_amount"],
+            "items": [],
+            "status": "valid",
+            "extraction_method": "template",
+            "file": filename,
+            "raw_text_preview": text[:500]
+        }
+    
+    async def _extract_structured_cached(
+        self,
+        text: str,
+        file_path: str,
+        file_hash: str,
+        supplier_gstin: Optional[str] = None
+    ) -> Dict:
+        """
+        Structure text with Gemini, reusing a previous result for identical file
+        contents. Fresh results also train the supplier's layout template.
+        """
+        filename = os.path.basename(file_path)
+        key = ExtractionCache.make_key(file_hash, EXTRACTOR_VERSION, self.ocr_mode, PROMPT_VERSION, GEMINI_MODEL)
+        cached = await asyncio.to_thread(self.cache.get, "structured", key)
+        if cached is not None:
+            cached["file"] = filename
+            return cached
         
-        return text
+        data = await self._extract_structured_data(text, filename)
+        if data.get("status") != "error":
+            await asyncio.to_thread(self.cache.put, "structured", key, data)
+            if supplier_gstin:
+                await asyncio.to_thread(self.template_store.observe, supplier_gstin, text, data)
+        return data
     
-    async def _extract_text_from_image(self, image_path: str) -> str:
-        """Extract text from image using OCR"""
+    async def _ocr_pdf_pages_adaptive(
+        self,
+        pdf_path: str,
+        page_numbers: List[int],
+        page_sizes: List[Tuple[float, float]],
+        on_window: Optional[Callable[[Dict[int, Tuple[str, float, int]]], None]] = None
+    ) -> Dict[int, Tuple[str, float, int]]:
+        """
+        OCR pages with a fast low-DPI pass, then re-rasterize only the pages whose
+        mean word confidence is below OCR_MIN_CONFIDENCE at full DPI.
+        `on_window` receives each finished window of pages from either pass.
+        
+        Returns:
+            {page_number: (text, confidence, dpi)}
+        """
+        async def ocr_at(numbers: List[int], dpi: int) -> Dict[int, Tuple[str, float, int]]:
+            page_bytes = max(page_pixel_bytes(*page_sizes[number - 1], dpi) for number in numbers)
+            def tag(window: Dict[int, Tuple[str, float]]) -> Dict[int, Tuple[str, float, int]]:
+                return {number: (text, confidence, dpi) for number, (text, confidence) in window.items()}
+            
+            results = await self.ocr_engine.ocr_pdf_pages(
+                pdf_path, numbers, page_bytes, dpi=dpi, preprocess=self.preprocess,
+                on_window=(lambda window: on_window(tag(window))) if on_window else None
+            )
+            return tag(results)
+        
+        if not self.adaptive_ocr:
+            return await ocr_at(page_numbers, OCR_FULL_DPI)
+        
+        results = await ocr_at(page_numbers, OCR_FAST_DPI)
+        low_confidence = [number for number, (_, confidence, _) in results.items() if confidence < OCR_MIN_CONFIDENCE]
+        if low_confidence:
+            for number, result in (await ocr_at(low_confidence, OCR_FULL_DPI)).items():
+                if result[1] >= results[number][1]:
+                    results[number] = result
+        return results
+    
+    async def _extract_text_from_image(self, image_path: str) -> Tuple[str, List[Dict]]:
+        """Extract text from image using OCR, escalating to full resolution on low confidence"""
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image)
-            return text
+            # Resolution only changes when preprocessing downscales the image
+            dpi = OCR_FAST_DPI if self.adaptive_ocr and self.preprocess else OCR_FULL_DPI
+            text, confidence = await self.ocr_engine.ocr_image(image_path, preprocess=self.preprocess, dpi=dpi)
+            
+            if dpi != OCR_FULL_DPI and confidence < OCR_MIN_CONFIDENCE:
+                full_text, full_confidence = await self.ocr_engine.ocr_image(
+                    image_path, preprocess=self.preprocess, dpi=OCR_FULL_DPI
+                )
+                if full_confidence >= confidence:
+                    text, confidence, dpi = full_text, full_confidence, OCR_FULL_DPI
+            
+            return text, [{"page": 1, "source": "ocr", "dpi": dpi, "confidence": confidence}]
         except Exception as e:
             print(f"Error extracting text from image: {e}")
-            return ""
+            return "", []
     
     async def _extract_structured_data(self, text: str, filename: str) -> Dict:
         """Use Gemini to extract structured invoice data from text"""
         try:
-            prompt = f"""
-            Extract structured invoice data from the following text. Return a JSON object with these fields:
-            - invoice_number (string)
-            - invoice_date (string, YYYY-MM-DD format)
-            - gstin (string, 15 character GST number or null)
-            - supplier_gstin (string)
-            - invoice_amount (number)
-            - tax_amount (number)
-            - total_amount (number)
-            - items (array of objects with: description, quantity, rate, amount)
-            - status (string: valid, invalid, or partial)
-            
-            If any field cannot be determined, use null.
-            Return ONLY valid JSON, no additional text.
-            
-            TEXT:
-            {text[:4000]}
-            """
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            response_text = response.text.strip()
-            
-            # Clean up response if it has markdown code blocks
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
+            if self.batcher:
+                data = await self.batcher.submit(text)
+            else:
+                data = await self._request_single((filename, text))
             
-            data = json.loads(response_text)
             data["file"] = filename
             data["raw_text_preview"] = text[:500]
+            data["extraction_method"] = "gemini"
             
             return data
-            
+        
         except json.JSONDecodeError as e:
             return {
                 "file": filename,
@@ -180,6 +421,77 @@ class DocumentProcessor:
                 "status": "error"
             }
     
+    async def _request_single(self, item: Tuple[str, str]) -> Dict:
+        """Send one document to Gemini and parse the JSON object it returns"""
+        _, text = item
+        prompt = f"""
+            Extract structured invoice data from the following text. Return a JSON object with these fields:
+            {INVOICE_FIELDS_PROMPT}
+            If any field cannot be determined, use null.
+            Return ONLY valid JSON, no additional text.
+            
+            TEXT:
+            {text[:MAX_PROMPT_TEXT_CHARS]}
+            """
+        
+        response_text = await self.llm.generate(prompt, model=GEMINI_MODEL)
+        return self._parse_json_response(response_text)
+    
+    async def _request_batch(self, items: List[Tuple[str, str]]) -> Dict[str, Dict]:
+        """
+        Send several documents in one Gemini request.
+        
+        Returns:
+            {item_id: data} for every document the response answered correctly
+            (doc_id N in the response refers to the Nth item)
+        """
+        documents = "\n".join(
+            f"=== DOCUMENT {doc_id} ===\n{text[:MAX_PROMPT_TEXT_CHARS]}\n"
+            for doc_id, (_, text) in enumerate(items, 1)
+        )
+        prompt = f"""
+            Extract structured invoice data from each of the {len(items)} documents below.
+            Return a JSON array with exactly one object per document. Each object must have
+            a "doc_id" field (the number after DOCUMENT) and these fields:
+            {INVOICE_FIELDS_PROMPT}
+            If any field cannot be determined, use null.
+            Return ONLY valid JSON, no additional text.
+            
+            {documents}
+            """
+        
+        response_text = await self.llm.generate(prompt, model=GEMINI_MODEL)
+        parsed = self._parse_json_response(response_text)
+        
+        results = {}
+        for entry in parsed if isinstance(parsed, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                doc_id = int(entry.pop("doc_id"))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 1 <= doc_id <= len(items) and items[doc_id - 1][0] not in results:
+                results[items[doc_id - 1][0]] = entry
+        return results
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough Gemini token count for a document's share of a batch prompt"""
+        return min(len(text), MAX_PROMPT_TEXT_CHARS) // 4 + 20
+    
+    @staticmethod
+    def _parse_json_response(response_text: str):
+        response_text = response_text.strip()
+        
+        # Clean up response if it has markdown code blocks
+        if "```json" in response_text:
+            response_text = response_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in response_text:
+            response_text = response_text.split("```")[1].split("```")[0].strip()
+        
+        return json.loads(response_text)
+    
     async def validate_gstr2b_data(self, gstr2b_data: Dict) -> Dict:
         """
         Validate and structure GSTR2B data
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import asyncio
+import sys
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from app.config import EVENTS_PATH, EVENTS_POLL_SECONDS, EVENTS_TTL_MINUTES
+
+# Events that end a session's stream
+TERMINAL_STATUSES = ("completed", "error", "mismatch_detection_completed")
+
+
+class EventBus:
+    """
+    Stage-level progress events per session, shared by all processes.
+    
+    Publishers (API handlers, queue workers in other processes) append events
+    to a small SQLite log. `publish()` only queues the event; a writer thread
+    inserts whatever has queued up in one transaction, so callers on the
+    event loop never wait on SQLite. Each API process runs one dispatcher
+    task that polls the log for new events and fans them out to the queues
+    of its subscribed streams, so hundreds of open streams cost one query per
+    poll interval instead of one per client. Events older than the TTL are
+    purged.
+    """
+    
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        poll_seconds: Optional[float] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.db_path = db_path or EVENTS_PATH
+        self.poll_seconds = poll_seconds if poll_seconds is not None else EVENTS_POLL_SECONDS
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else EVENTS_TTL_MINUTES * 60
+        
+        # session_id -> subscriber queues
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        
+        # Events waiting for the writer thread, and counters for flush()
+        self._pending: List[tuple] = []
+        self._pending_changed = threading.Condition()
+        self._queued = 0
+        self._written = 0
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session ON events(session_id, seq)")
+        self._conn.commit()
+    
+    def publish(self, session_id: str, event_type: str, data: Dict):
+        """Queue an event for the session's log (safe to call from any thread)"""
+        row = (session_id, event_type, json.dumps(data, separators=(",", ":"), default=str), time.time())
+        with self._pending_changed:
+            self._pending.append(row)
+            self._queued += 1
+            self._pending_changed.notify_all()
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="event-bus-writer", daemon=True)
+                self._writer.start()
+    
+    def flush(self):
+        """Wait until the events published so far are in the log"""
+        with self._pending_changed:
+            target = self._queued
+            while self._written < target and self._writer is not None and self._writer.is_alive():
+                self._pending_changed.wait(1.0)
+    
+    def _write_loop(self):
+        while True:
+            with self._pending_changed:
+                while not self._pending and not self._closed:
+                    self._pending_changed.wait()
+                if not self._pending:
+                    return
+                rows, self._pending = self._pending, []
+            
+            try:
+                self._insert(rows)
+            except Exception as e:
+                print(f"[EVENTS] Dropped {len(rows)} event(s): {e}", file=sys.stderr)
+            with self._pending_changed:
+                self._written += len(rows)
+                self._pending_changed.notify_all()
+    
+    def _insert(self, rows: List[tuple]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO events (session_id, type, data, created_at) VALUES (?, ?, ?, ?)", rows
+            )
+            if now - self._last_purge > 60:
+                self._last_purge = now
+                self._conn.execute("DELETE FROM events WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+    
+    def history(self, session_id: str, after_seq: int = 0) -> List[Dict]:
+        """Events of a session published after `after_seq` (including ones still queued in this process)"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, type, data FROM events WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, after_seq)
+            ).fetchall()
+        return [{"seq": seq, "type": event_type, "data": json.loads(data)} for seq, event_type, data in rows]
+    
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        """Queue that receives the session's new events until `unsubscribe()`"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._dispatcher = loop.create_task(self._dispatch(self.last_seq()))
+        return queue
+    
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(session_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[session_id]
+    
+    def last_seq(self, session_id: Optional[str] = None) -> int:
+        """Sequence number of the latest event (of one session, or of any)"""
+        with self._lock:
+            if session_id is None:
+                return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM events WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+    
+    def _fetch(self, after_seq: int, session_ids: List[str]) -> Tuple[List[tuple], int]:
+        """
+        New events of the given sessions, and the seq every event up to which
+        has now been seen. The bound is read first: writers commit one at a
+        time, so every event up to it is already visible to the second query.
+        """
+        with self._lock:
+            bound = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT seq, session_id, type, data FROM events "
+                f"WHERE seq > ? AND seq <= ? AND session_id IN ({', '.join('?' * len(session_ids))}) ORDER BY seq",
+                (after_seq, bound, *session_ids)
+            ).fetchall()
+        return rows, max(after_seq, bound)
+    
+    async def _dispatch(self, cursor: int):
+        """Poll the log and hand new events to subscribers; stops when nobody is listening"""
+        while self._subscribers:
+            await asyncio.sleep(self.poll_seconds)
+            session_ids = list(self._subscribers)
+            # Events of sessions nobody watches still advance the cursor
+            rows, cursor = await asyncio.to_thread(self._fetch, cursor, session_ids)
+            for seq, session_id, event_type, data in rows:
+                event = {"seq": seq, "type": event_type, "data": json.loads(data)}
+                for queue in self._subscribers.get(session_id, ()):
+                    queue.put_nowait(event)
+    
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        with self._pending_changed:
+            self._closed = True
+            self._pending_changed.notify_all()
+        if self._writer is not None:
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+
+def coalesce(events: List[Dict]) -> List[Dict]:
+    """
+    Merge a burst of events into as few messages as possible: only the latest
+    progress snapshot is kept and page-level OCR events are grouped per file.
+    """
+    merged: List[Dict] = []
+    progress = None
+    ocr_pages: Dict[str, Dict] = {}
+    for event in events:
+        if event["type"] == "progress":
+            if progress is not None:
+                merged.remove(progress)
+            progress = event
+            merged.append(event)
+        elif event["type"] == "ocr_page":
+            grouped = ocr_pages.get(event["data"]["file"])
+            if grouped is None:
+                grouped = ocr_pages[event["data"]["file"]] = {
+                    "seq": event["seq"], "type": "ocr_page", "data": dict(event["data"], pages=[])
+                }
+                merged.append(grouped)
+            grouped["seq"] = event["seq"]
+            grouped["data"]["pages"] = grouped["data"]["pages"] + event["data"]["pages"]
+        else:
+            merged.append(event)
+    return merged
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = EventBus()
+    return _event_bus
@@ -1,119 +1,176 @@
-from typing import Dict, List, Tuple
-import pandas as pd
+import io
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
-import io
+
+# A file path or a writable binary stream
+Target = Union[str, BinaryIO]
+
 
 class ExcelGenerator:
-    """Handles generation and manipulation of Excel sheets"""
+    """
+    Handles generation and manipulation of Excel sheets.
+    
+    Workbooks are written in openpyxl's write-only mode: rows are taken from
+    iterators and streamed to the target (a temp file or a stream) one at a
+    time, and cell formatting comes from a few named styles registered once
+    per workbook, so memory stays flat whatever the number of rows.
+    """
     
     def __init__(self):
         self.highlight_color = "FFFF00"  # Yellow for mismatches
         self.error_color = "FF0000"  # Red for errors
         self.match_color = "00B050"  # Green for matches
     
-    def generate_invoice_sheet(self, invoices: List[Dict], title: str = "Extracted Invoices") -> Tuple[bytes, str]:
+    def write_invoice_sheet(self, invoices: Iterable[Dict], target: Target) -> str:
         """
-        Generate Excel sheet from extracted invoice data
+        Write the extracted invoices to an Excel file
         
         Returns:
-            Tuple of (excel_bytes, filename)
+            Download filename
         """
-        df = self._prepare_dataframe(invoices)
+        workbook = self._new_workbook()
+        worksheet = workbook.create_sheet("Invoices")
         
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Invoices"
+        for col_num, column_title in enumerate(INVOICE_COLUMNS, 1):
+            worksheet.column_dimensions[get_column_letter(col_num)].width = min(len(column_title) + 7, 50)
         
-        # Write headers
-        for col_num, column_title in enumerate(df.columns, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.value = column_title
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Write data
-        for row_num, row_data in enumerate(df.values, 2):
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.value = value
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                cell.border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-        
-        # Adjust column widths
-        for col_num, column_title in enumerate(df.columns, 1):
-            column_letter = get_column_letter(col_num)
-            max_length = len(str(column_title)) + 2
-            worksheet.column_dimensions[column_letter].width = min(max_length + 5, 50)
-        
-        # Save to bytes
-        excel_bytes = io.BytesIO()
-        workbook.save(excel_bytes)
-        excel_bytes.seek(0)
+        worksheet.append(self._cells(worksheet, INVOICE_COLUMNS, "invoice_header"))
+        for inv in invoices:
+            worksheet.append(self._cells(worksheet, self._invoice_row(inv), "invoice_cell"))
         
-        return excel_bytes.getvalue(), "invoices.xlsx"
+        workbook.save(target)
+        return "invoices.xlsx"
     
-    def generate_mismatch_report_sheet(self, mismatch_data: Dict) -> Tuple[bytes, str]:
+    def write_mismatch_report(self, mismatch_data: Dict, target: Target) -> str:
         """
-        Generate Excel sheet with mismatch analysis and highlighted differences
+        Write the mismatch analysis, with differences highlighted, to an Excel file
         
         Returns:
-            Tuple of (excel_bytes, filename)
+            Download filename
         """
-        workbook = Workbook()
+        workbook = self._new_workbook()
         
         # Sheet 1: Summary
-        summary_ws = workbook.active
-        summary_ws.title = "Summary"
-        self._write_summary_sheet(summary_ws, mismatch_data)
+        self._write_summary_sheet(workbook.create_sheet("Summary"), mismatch_data)
         
         # Sheet 2: Matched Invoices
         if mismatch_data["matched_pairs"]:
-            matched_ws = workbook.create_sheet("Matched")
-            self._write_matched_sheet(matched_ws, mismatch_data["matched_pairs"])
+            self._write_matched_sheet(workbook.create_sheet("Matched"), mismatch_data["matched_pairs"])
         
         # Sheet 3: Mismatches
         if mismatch_data["mismatches"]:
-            mismatch_ws = workbook.create_sheet("Mismatches")
-            self._write_mismatches_sheet(mismatch_ws, mismatch_data["mismatches"])
+            self._write_mismatches_sheet(workbook.create_sheet("Mismatches"), mismatch_data["mismatches"])
         
         # Sheet 4: Unmatched Extracted
         if mismatch_data["unmatched_extracted"]:
-            unmatched_ext_ws = workbook.create_sheet("Unmatched Extracted")
-            self._write_unmatched_extracted_sheet(unmatched_ext_ws, mismatch_data["unmatched_extracted"])
+            self._write_unmatched_extracted_sheet(
+                workbook.create_sheet("Unmatched Extracted"), mismatch_data["unmatched_extracted"]
+            )
         
         # Sheet 5: Unmatched GSTR2B
         if mismatch_data["unmatched_gstr2b"]:
-            unmatched_gstr_ws = workbook.create_sheet("Unmatched GSTR2B")
-            self._write_unmatched_gstr2b_sheet(unmatched_gstr_ws, mismatch_data["unmatched_gstr2b"])
+            self._write_unmatched_gstr2b_sheet(
+                workbook.create_sheet("Unmatched GSTR2B"), mismatch_data["unmatched_gstr2b"]
+            )
+        
+        workbook.save(target)
+        return "mismatch_report.xlsx"
+    
+    def generate_invoice_sheet(self, invoices: Iterable[Dict], title: str = "Extracted Invoices") -> Tuple[bytes, str]:
+        """
+        Generate Excel sheet from extracted invoice data in memory
+        (prefer `write_invoice_sheet` to a file for large sessions)
         
-        # Save to bytes
+        Returns:
+            Tuple of (excel_bytes, filename)
+        """
         excel_bytes = io.BytesIO()
-        workbook.save(excel_bytes)
-        excel_bytes.seek(0)
+        filename = self.write_invoice_sheet(invoices, excel_bytes)
+        return excel_bytes.getvalue(), filename
+    
+    def generate_mismatch_report_sheet(self, mismatch_data: Dict) -> Tuple[bytes, str]:
+        """
+        Generate Excel sheet with mismatch analysis in memory
+        (prefer `write_mismatch_report` to a file for large sessions)
         
-        return excel_bytes.getvalue(), "mismatch_report.xlsx"
+        Returns:
+            Tuple of (excel_bytes, filename)
+        """
+        excel_bytes = io.BytesIO()
+        filename = self.write_mismatch_report(mismatch_data, excel_bytes)
+        return excel_bytes.getvalue(), filename
+    
+    def _new_workbook(self) -> Workbook:
+        """Write-only workbook with the report's named styles registered"""
+        workbook = Workbook(write_only=True)
+        for style in self._named_styles():
+            workbook.add_named_style(style)
+        return workbook
+    
+    def _named_styles(self) -> List[NamedStyle]:
+        thin = Side(style="thin")
+        wrapped = Alignment(horizontal="left", vertical="center", wrap_text=True)
+        
+        def fill(color: str) -> PatternFill:
+            return PatternFill(start_color=color, end_color=color, fill_type="solid")
+        
+        def header(name: str, color: str, alignment: Optional[Alignment] = None) -> NamedStyle:
+            style = NamedStyle(name=name, font=Font(bold=True, color="FFFFFF"), fill=fill(color))
+            if alignment is not None:
+                style.alignment = alignment
+            return style
+        
+        return [
+            header("invoice_header", "366092", Alignment(horizontal="center", vertical="center")),
+            header("header", "366092"),
+            header("mismatch_header", "C00000"),
+            header("unmatched_header", "FF8C00"),
+            NamedStyle(
+                name="invoice_cell",
+                alignment=wrapped,
+                border=Border(left=thin, right=thin, top=thin, bottom=thin)
+            ),
+            NamedStyle(name="summary_label", alignment=Alignment(horizontal="left", vertical="center")),
+            NamedStyle(
+                name="summary_value",
+                font=Font(bold=True),
+                alignment=Alignment(horizontal="left", vertical="center")
+            ),
+            NamedStyle(name="cell", alignment=wrapped),
+            NamedStyle(name="highlight_cell", alignment=wrapped, fill=fill(self.highlight_color)),
+            NamedStyle(
+                name="error_cell",
+                alignment=wrapped,
+                fill=fill(self.error_color),
+                font=Font(color="FFFFFF")
+            )
+        ]
+    
+    @staticmethod
+    def _cells(worksheet, values: Iterable[Any], style: str) -> List[WriteOnlyCell]:
+        """One row of cells sharing a named style"""
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(worksheet, value)
+            cell.style = style
+            cells.append(cell)
+        return cells
+    
+    @staticmethod
+    def _set_widths(worksheet, widths: List[float]):
+        """Column widths; write-only sheets need them before the first row"""
+        for col_num, width in enumerate(widths, 1):
+            worksheet.column_dimensions[get_column_letter(col_num)].width = width
     
     def _write_summary_sheet(self, worksheet, mismatch_data: Dict):
         """Write summary information to worksheet"""
         summary = mismatch_data["summary"]
         
-        worksheet.column_dimensions["A"].width = 40
-        worksheet.column_dimensions["B"].width = 20
-        
-        headers = ["Metric", "Value"]
-        for col_num, header in enumerate(headers, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        self._set_widths(worksheet, [40, 20])
+        worksheet.append(self._cells(worksheet, ["Metric", "Value"], "header"))
         
         data = [
             ["Total Invoices Extracted", summary["total_extracted"]],
@@ -125,25 +182,19 @@ class ExcelGenerator:
             ["Match Rate (%)", round((summary["matched"] / summary["total_extracted"] * 100) if summary["total_extracted"] > 0 else 0, 2)]
         ]
         
-        for row_num, row_data in enumerate(data, 2):
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.value = value
-                if col_num == 2:
-                    cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="left", vertical="center")
+        for label, value in data:
+            worksheet.append(
+                self._cells(worksheet, [label], "summary_label") + self._cells(worksheet, [value], "summary_value")
+            )
     
-    def _write_matched_sheet(self, worksheet, matched_pairs: List[Dict]):
+    def _write_matched_sheet(self, worksheet, matched_pairs: Iterable[Dict]):
         """Write matched invoices to worksheet"""
         headers = ["Invoice #", "Date", "GSTIN", "Extracted Amount", "GSTR2B Amount", "Match Score", "Issues"]
         
-        for col_num, header in enumerate(headers, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        self._set_widths(worksheet, [20] * len(headers))
+        worksheet.append(self._cells(worksheet, headers, "header"))
         
-        for row_num, pair in enumerate(matched_pairs, 2):
+        for pair in matched_pairs:
             ext = pair["extracted"]
             gstr = pair["gstr2b"]
             
@@ -157,58 +208,30 @@ class ExcelGenerator:
                 "; ".join(pair["mismatches"]) if pair["mismatches"] else "No issues"
             ]
             
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.value = value
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                
-                # Highlight rows with mismatches
-                if pair["mismatches"]:
-                    cell.fill = PatternFill(start_color=self.highlight_color, end_color=self.highlight_color, fill_type="solid")
-        
-        # Adjust column widths
-        for col_num in range(1, len(headers) + 1):
-            worksheet.column_dimensions[get_column_letter(col_num)].width = 20
+            # Highlight rows with mismatches
+            worksheet.append(self._cells(worksheet, row_data, "highlight_cell" if pair["mismatches"] else "cell"))
     
-    def _write_mismatches_sheet(self, worksheet, mismatches: List[Dict]):
+    def _write_mismatches_sheet(self, worksheet, mismatches: Iterable[Dict]):
         """Write mismatch details to worksheet"""
-        headers = ["Invoice #", "Match Score", "Issues"]
+        self._set_widths(worksheet, [20, 15, 50])
+        worksheet.append(self._cells(worksheet, ["Invoice #", "Match Score", "Issues"], "mismatch_header"))
         
-        for col_num, header in enumerate(headers, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="C00000", end_color="C00000", fill_type="solid")
-        
-        for row_num, mismatch in enumerate(mismatches, 2):
+        for mismatch in mismatches:
             row_data = [
                 mismatch["invoice_number"],
                 round(mismatch["match_score"], 3),
                 "\n".join(mismatch["issues"])
             ]
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.value = value
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                cell.fill = PatternFill(start_color=self.highlight_color, end_color=self.highlight_color, fill_type="solid")
-        
-        # Adjust column widths
-        worksheet.column_dimensions["A"].width = 20
-        worksheet.column_dimensions["B"].width = 15
-        worksheet.column_dimensions["C"].width = 50
+            worksheet.append(self._cells(worksheet, row_data, "highlight_cell"))
     
-    def _write_unmatched_extracted_sheet(self, worksheet, unmatched: List[Dict]):
+    def _write_unmatched_extracted_sheet(self, worksheet, unmatched: Iterable[Dict]):
         """Write unmatched extracted invoices"""
         headers = ["File", "Invoice #", "Amount", "Reason"]
         
-        for col_num, header in enumerate(headers, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="FF8C00", end_color="FF8C00", fill_type="solid")
+        self._set_widths(worksheet, [20] * len(headers))
+        worksheet.append(self._cells(worksheet, headers, "unmatched_header"))
         
-        for row_num, item in enumerate(unmatched, 2):
+        for item in unmatched:
             inv = item["invoice"]
             row_data = [
                 inv.get("file", "N/A"),
@@ -216,28 +239,16 @@ class ExcelGenerator:
                 inv.get("total_amount", 0),
                 item["reason"]
             ]
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.value = value
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                cell.fill = PatternFill(start_color=self.error_color, end_color=self.error_color, fill_type="solid")
-                cell.font = Font(color="FFFFFF")
-        
-        for col_num in range(1, len(headers) + 1):
-            worksheet.column_dimensions[get_column_letter(col_num)].width = 20
+            worksheet.append(self._cells(worksheet, row_data, "error_cell"))
     
-    def _write_unmatched_gstr2b_sheet(self, worksheet, unmatched: List[Dict]):
+    def _write_unmatched_gstr2b_sheet(self, worksheet, unmatched: Iterable[Dict]):
         """Write unmatched GSTR2B invoices"""
         headers = ["Invoice #", "Date", "GSTIN", "Amount", "Status"]
         
-        for col_num, header in enumerate(headers, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="FF8C00", end_color="FF8C00", fill_type="solid")
+        self._set_widths(worksheet, [20] * len(headers))
+        worksheet.append(self._cells(worksheet, headers, "unmatched_header"))
         
-        for row_num, inv in enumerate(unmatched, 2):
+        for inv in unmatched:
             row_data = [
                 inv.get("invoice_number", "N/A"),
                 inv.get("invoice_date", "N/A"),
@@ -245,43 +256,32 @@ class ExcelGenerator:
                 inv.get("total_amount", 0),
                 "Not found in extracted invoices"
             ]
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.value = value
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                cell.fill = PatternFill(start_color=self.error_color, end_color=self.error_color, fill_type="solid")
-                cell.font = Font(color="FFFFFF")
-        
-        for col_num in range(1, len(headers) + 1):
-            worksheet.column_dimensions[get_column_letter(col_num)].width = 20
+            worksheet.append(self._cells(worksheet, row_data, "error_cell"))
     
-    def _prepare_dataframe(self, invoices: List[Dict]) -> pd.DataFrame:
-        """Prepare dataframe from invoice list"""
-        data = []
-        
-        for inv in invoices:
-            if inv.get("status") == "error":
-                data.append({
-                    "File": inv.get("file", "N/A"),
-                    "Invoice #": "ERROR",
-                    "Date": "ERROR",
-                    "GSTIN": inv.get("error", "Unknown error"),
-                    "Amount": 0,
-                    "Tax": 0,
-                    "Total": 0,
-                    "Status": "error"
-                })
-            else:
-                data.append({
-                    "File": inv.get("file", "N/A"),
-                    "Invoice #": inv.get("invoice_number", "N/A"),
-                    "Date": inv.get("invoice_date", "N/A"),
-                    "GSTIN": inv.get("gstin", "N/A"),
-                    "Amount": inv.get("invoice_amount", 0),
-                    "Tax": inv.get("tax_amount", 0),
-                    "Total": inv.get("total_amount", 0),
-                    "Status": inv.get("status", "unknown")
-                })
-        
-        return pd.DataFrame(data)
+    @staticmethod
+    def _invoice_row(inv: Dict) -> List[Any]:
+        """Invoice sheet row, in INVOICE_COLUMNS order"""
+        if inv.get("status") == "error":
+            return [
+                inv.get("file", "N/A"),
+                "ERROR",
+                "ERROR",
+                inv.get("error", "Unknown error"),
+                0,
+                0,
+                0,
+                "error"
+            ]
+        return [
+            inv.get("file", "N/A"),
+            inv.get("invoice_number", "N/A"),
+            inv.get("invoice_date", "N/A"),
+            inv.get("gstin", "N/A"),
+            inv.get("invoice_amount", 0),
+            inv.get("tax_amount", 0),
+            inv.get("total_amount", 0),
+            inv.get("status", "unknown")
+        ]
+
+
+INVOICE_COLUMNS = ["File", "Invoice #", "Date", "GSTIN", "Amount", "Tax", "Total", "Status"]
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional
+from app.config import EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_MB
+
+class ExtractionCache:
+    """
+    Persistent, content-addressed cache for document extraction results.
+    
+    Entries live in a single SQLite file and are stored in two layers:
+    - "text": OCR / text-layer output, keyed by file hash + extractor version
+    - "structured": Gemini JSON, keyed by file hash + extractor + prompt version
+    
+    Eviction is least-recently-used once the total payload size exceeds
+    the configured limit. The total is kept in its own row, updated in the
+    same transaction as each insert and eviction, so a put never has to sum
+    the whole table.
+    """
+    
+    LAYERS = ("text", "structured")
+    
+    def __init__(self, db_path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.db_path = db_path or EXTRACTION_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else EXTRACTION_CACHE_MAX_MB * 1024 * 1024
+        self.hits = {layer: 0 for layer in self.LAYERS}
+        self.misses = {layer: 0 for layer in self.LAYERS}
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                layer TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (layer, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)"
+        )
+        # Seeded once, also for caches created before the total was kept
+        self._conn.execute(
+            "INSERT OR IGNORE INTO totals (id, size) SELECT 0, COALESCE(SUM(size), 0) FROM entries"
+        )
+    
+    @staticmethod
+    def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """Return the SHA-256 hex digest of a file's contents"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def make_key(file_hash: str, *versions: str) -> str:
+        """Build a cache key from a content hash and the versions that produced the value"""
+        return ":".join([file_hash, *versions])
+    
+    def get(self, layer: str, key: str) -> Optional[Dict]:
+        """Look up an entry, refreshing its LRU position on hit"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE layer = ? AND key = ?", (layer, key)
+            ).fetchone()
+            if row is None:
+                self.misses[layer] += 1
+                return None
+            
+            self.hits[layer] += 1
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE layer = ? AND key = ?",
+                (time.time(), layer, key)
+            )
+        
+        return json.loads(row[0])
+    
+    def put(self, layer: str, key: str, value: Dict):
+        """Store an entry and evict old ones if the cache is over its size limit"""
+        payload = json.dumps(value).encode("utf-8")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = self._conn.execute(
+                    "SELECT size FROM entries WHERE layer = ? AND key = ?", (layer, key)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (layer, key, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (layer, key, payload, len(payload), time.time())
+                )
+                total = self._add_size(len(payload) - (replaced[0] if replaced else 0))
+                if total > self.max_bytes:
+                    self._evict(total)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def _add_size(self, delta: int) -> int:
+        """Adjust the stored total payload size; returns the new total"""
+        self._conn.execute("UPDATE totals SET size = size + ? WHERE id = 0", (delta,))
+        return self._conn.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+    
+    def _evict(self, total: int):
+        """Drop least-recently-used entries until the cache fits in max_bytes"""
+        rows = self._conn.execute(
+            "SELECT layer, key, size FROM entries ORDER BY last_access ASC"
+        )
+        stale = []
+        freed = 0
+        for layer, key, size in rows:
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((layer, key))
+            freed += size
+        
+        self._conn.executemany("DELETE FROM entries WHERE layer = ? AND key = ?", stale)
+        self._add_size(-freed)
+    
+    def stats(self) -> Dict:
+        """Hit/miss counts per layer for this cache instance"""
+        return {
+            layer: {"hits": self.hits[layer], "misses": self.misses[layer]}
+            for layer in self.LAYERS
+        }
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,122 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# A stage handler works on an item in place and returns the name of the
+# stage the item goes to next, or None when the item is finished
+StageHandler = Callable[[Dict], Awaitable[Optional[str]]]
+
+
+class Stage:
+    """One pipeline step with its own worker count, input queue and metrics"""
+    
+    def __init__(self, name: str, handler: StageHandler, concurrency: int):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue: Optional[asyncio.Queue] = None
+        
+        self.processed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+    
+    def stats(self, elapsed: float) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_seconds": round(self.busy_seconds / self.processed, 3) if self.processed else 0.0,
+            "throughput_per_minute": round(self.processed / elapsed * 60, 1) if elapsed > 0 else 0.0
+        }
+
+
+class ExtractionPipeline:
+    """
+    Runs documents through a chain of stages connected by bounded queues.
+    
+    Every stage has its own pool of worker coroutines, so different files
+    can be in different stages at once (OCR of one file overlaps the LLM
+    call for another). A full queue blocks the stage feeding it, which keeps
+    fast stages from running ahead of slow ones. Stages may route an item
+    past later steps (e.g. a cached file skips OCR).
+    
+    A handler exception finishes the item with an error record built by
+    `on_error`.
+    """
+    
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int,
+        on_error: Callable[[Dict, Exception], Dict]
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        self.first = stages[0].name
+        self.queue_size = max(1, queue_size)
+        self.on_error = on_error
+        self._loop = None
+        self._tasks: List[asyncio.Task] = []
+        self._started_at = time.monotonic()
+    
+    def _start(self):
+        """Start the stage workers on the running event loop (again, if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._started_at = time.monotonic()
+        self._tasks = []
+        for stage in self.stages.values():
+            stage.queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks.extend(
+                loop.create_task(self._work(stage)) for _ in range(stage.concurrency)
+            )
+    
+    async def submit(self, item: Dict) -> Any:
+        """Feed an item into the first stage and wait until it comes out finished"""
+        self._start()
+        item["future"] = self._loop.create_future()
+        await self._put(self.first, item)
+        return await item["future"]
+    
+    async def _put(self, name: str, item: Dict):
+        stage = self.stages[name]
+        await stage.queue.put(item)
+        stage.max_queue_depth = max(stage.max_queue_depth, stage.queue.qsize())
+    
+    async def _work(self, stage: Stage):
+        while True:
+            item = await stage.queue.get()
+            stage.in_flight += 1
+            started = time.monotonic()
+            try:
+                next_stage = await stage.handler(item)
+            except Exception as e:
+                stage.errors += 1
+                item["result"] = self.on_error(item, e)
+                next_stage = None
+            finally:
+                stage.in_flight -= 1
+                stage.processed += 1
+                stage.busy_seconds += time.monotonic() - started
+                stage.queue.task_done()
+            
+            if next_stage is not None:
+                await self._put(next_stage, item)
+            elif not item["future"].done():
+                item["future"].set_result(item.get("result"))
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Per-stage throughput, latency and queue depth since the workers started"""
+        elapsed = time.monotonic() - self._started_at
+        return {name: stage.stats(elapsed) for name, stage in self.stages.items()}
+    
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
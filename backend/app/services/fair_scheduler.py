@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional
+from app.config import SCHEDULER_CLIENT_WEIGHTS, SCHEDULER_SMALL_JOB_PAGES, SCHEDULER_MAX_WAIT_SECONDS
+
+
+class FairScheduler:
+    """
+    Chooses which queued job the next file comes from.
+    
+    Clients share the workers by weighted fair queuing: each client has a
+    virtual time that advances by pages / weight for every file handed out,
+    and the client furthest behind goes next. The scheduler clock is the
+    start time of the last file handed out; a client that was idle starts
+    from it instead of spending credit it banked while away.
+    Within a client, the job with the fewest pages left goes first.
+    
+    Small jobs (at most `small_job_pages` estimated pages) are served ahead of
+    large ones, so a 5-invoice upload does not wait behind a 2,000-page month;
+    a large job that has waited longer than `max_wait` is treated as small so
+    it cannot starve.
+    """
+    
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        small_job_pages: Optional[int] = None,
+        max_wait: Optional[float] = None
+    ):
+        self.weights = weights if weights is not None else SCHEDULER_CLIENT_WEIGHTS
+        self.small_job_pages = small_job_pages if small_job_pages is not None else SCHEDULER_SMALL_JOB_PAGES
+        self.max_wait = max_wait if max_wait is not None else SCHEDULER_MAX_WAIT_SECONDS
+    
+    def weight(self, client_name: str) -> float:
+        return max(self.weights.get(client_name, 1.0), 1e-6)
+    
+    @staticmethod
+    def start_time(client_name: str, virtual_times: Dict[str, float], clock: float) -> float:
+        """Virtual time a waiting client is served at; new or returning clients start at the clock"""
+        return max(virtual_times.get(client_name, clock), clock)
+    
+    def pick(self, jobs: List[Dict], virtual_times: Dict[str, float], clock: float, now: float) -> Dict:
+        """
+        The job to serve next.
+        
+        Args:
+            jobs: Jobs with claimable files, each with client_name, pages
+                (estimated total), remaining (pages left) and created_at
+            virtual_times: Stored virtual time per client
+            clock: Scheduler clock
+        """
+        def key(job):
+            small = job["pages"] <= self.small_job_pages or now - job["created_at"] >= self.max_wait
+            start = self.start_time(job["client_name"], virtual_times, clock)
+            return (not small, start, job["remaining"], job["created_at"])
+        
+        return min(jobs, key=key)
+    
+    def charge(self, client_name: str, start_time: float, pages: int) -> float:
+        """Client's virtual time after being handed a file of `pages` pages"""
+        return start_time + pages / self.weight(client_name)
@@ -0,0 +1,71 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class InvoiceNumberIndex:
+    """
+    Fuzzy lookup index over invoice numbers.
+    
+    Numbers are embedded as L2-normalized TF-IDF vectors of their character
+    2-3-grams, so the cosine similarity of two numbers is a sparse dot
+    product. Queries against the whole index, or a subset of its rows, are
+    answered with one sparse matrix multiplication.
+    """
+    
+    def __init__(self, numbers: List[str], ngram_range: Tuple[int, int] = (2, 3), max_df: float = 0.5):
+        self.size = len(numbers)
+        self.vectorizer = None
+        self.matrix = csr_matrix((self.size, 1), dtype=np.float32)
+        
+        # N-grams shared by most numbers (a common "INV" prefix) add little
+        # signal but make every query touch every row, so they are dropped
+        # when enough distinctive n-grams remain
+        for limit in (max_df, 1.0):
+            if not any(numbers):
+                break
+            vectorizer = TfidfVectorizer(
+                analyzer="char_wb", ngram_range=ngram_range, lowercase=True, max_df=limit, dtype=np.float32
+            )
+            try:
+                self.matrix = vectorizer.fit_transform(numbers).tocsr()
+            except ValueError:
+                continue
+            self.vectorizer = vectorizer
+            break
+        
+        # Row-major transpose, so a query's product walks only its own n-grams
+        self.matrix_t = self.matrix.T.tocsr()
+    
+    def transform(self, numbers: List[str]) -> csr_matrix:
+        """Vectors for query numbers in the index's n-gram space"""
+        if self.vectorizer is None:
+            return csr_matrix((len(numbers), 1), dtype=np.float32)
+        return self.vectorizer.transform(numbers).tocsr()
+    
+    def similarity(self, queries: csr_matrix, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dense cosine similarity of query vectors against (a subset of) the indexed rows"""
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        return (queries @ matrix.T).toarray()
+    
+    def top_k(self, numbers: List[str], k: int = 5, min_similarity: float = 0.0) -> List[List[Tuple[int, float]]]:
+        """
+        The k most similar indexed rows for each query number.
+        
+        Returns:
+            Per query, a list of (row index, cosine similarity), best first
+        """
+        scores = (self.transform(numbers) @ self.matrix_t).tocsr()
+        results = []
+        for query in range(scores.shape[0]):
+            start, end = scores.indptr[query], scores.indptr[query + 1]
+            rows, values = scores.indices[start:end], scores.data[start:end]
+            keep = values > min_similarity
+            rows, values = rows[keep], values[keep]
+            if len(values) > k:
+                best = np.argpartition(-values, k - 1)[:k]
+                rows, values = rows[best], values[best]
+            order = np.argsort(-values, kind="stable")
+            results.append([(int(rows[i]), float(values[i])) for i in order])
+        return results
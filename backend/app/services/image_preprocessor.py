@@ -0,0 +1,136 @@
+import time
+from typing import Dict, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+
+class ImagePreprocessor:
+    """
+    Prepares page images for Tesseract: grayscale, downscale to the OCR DPI,
+    border crop, deskew and adaptive binarization. All stages operate on
+    NumPy arrays through OpenCV; smaller, cleaner images OCR much faster.
+    """
+    
+    # Photos rarely carry a meaningful DPI, so their long side is capped at A4 size
+    A4_LONG_SIDE_INCHES = 11.69
+    
+    def __init__(
+        self,
+        target_dpi: int = 300,
+        max_deskew_angle: float = 10.0,
+        block_size: int = 31,
+        threshold_offset: int = 15,
+        crop_padding: int = 20
+    ):
+        self.target_dpi = target_dpi
+        self.max_deskew_angle = max_deskew_angle
+        self.block_size = block_size
+        self.threshold_offset = threshold_offset
+        self.crop_padding = crop_padding
+        self.stages = [
+            ("downscale", self._downscale),
+            ("crop", self._crop_border),
+            ("deskew", self._deskew),
+            ("binarize", self._binarize),
+        ]
+    
+    def process(self, image: Image.Image, source_dpi: Optional[float] = None) -> Image.Image:
+        """Run all stages on a PIL image and return the cleaned grayscale image"""
+        array, _ = self._run(image, source_dpi)
+        return Image.fromarray(array)
+    
+    def benchmark(self, image: Image.Image, source_dpi: Optional[float] = None) -> Dict[str, float]:
+        """Run all stages and return per-stage wall time in milliseconds"""
+        _, timings = self._run(image, source_dpi)
+        return timings
+    
+    def _run(self, image: Image.Image, source_dpi: Optional[float]) -> Tuple[np.ndarray, Dict[str, float]]:
+        timings = {}
+        
+        start = time.perf_counter()
+        array = self._to_grayscale(image)
+        timings["grayscale"] = (time.perf_counter() - start) * 1000
+        
+        dpi = source_dpi or self._image_dpi(image)
+        for name, stage in self.stages:
+            start = time.perf_counter()
+            array = stage(array, dpi) if name == "downscale" else stage(array)
+            timings[name] = (time.perf_counter() - start) * 1000
+        
+        timings["total"] = sum(timings.values())
+        return array, timings
+    
+    @staticmethod
+    def _image_dpi(image: Image.Image) -> Optional[float]:
+        dpi = image.info.get("dpi")
+        return float(dpi[0]) if dpi else None
+    
+    @staticmethod
+    def _to_grayscale(image: Image.Image) -> np.ndarray:
+        if image.mode == "L":
+            return np.asarray(image)
+        return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    
+    def _downscale(self, gray: np.ndarray, source_dpi: Optional[float]) -> np.ndarray:
+        """Shrink to the DPI Tesseract needs; phone photos are capped by size instead"""
+        height, width = gray.shape
+        scale = min(1.0, self.A4_LONG_SIDE_INCHES * self.target_dpi / max(height, width))
+        if source_dpi and source_dpi > self.target_dpi:
+            scale = min(scale, self.target_dpi / source_dpi)
+        if scale >= 0.95:
+            return gray
+        return cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    
+    def _crop_border(self, gray: np.ndarray) -> np.ndarray:
+        """Trim dark scanner/photo borders, then crop to the inked area plus padding"""
+        dark = gray < 60
+        rows = np.flatnonzero(dark.mean(axis=1) < 0.5)
+        cols = np.flatnonzero(dark.mean(axis=0) < 0.5)
+        if rows.size == 0 or cols.size == 0:
+            return gray
+        gray = gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        
+        _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        rows = np.flatnonzero(ink.any(axis=1))
+        cols = np.flatnonzero(ink.any(axis=0))
+        if rows.size == 0 or cols.size == 0:
+            return gray
+        
+        pad = self.crop_padding
+        top, bottom = max(rows[0] - pad, 0), min(rows[-1] + pad + 1, gray.shape[0])
+        left, right = max(cols[0] - pad, 0), min(cols[-1] + pad + 1, gray.shape[1])
+        return gray[top:bottom, left:right]
+    
+    def _deskew(self, gray: np.ndarray) -> np.ndarray:
+        """Rotate so text lines are horizontal, using the min-area rectangle of the ink"""
+        # Estimate the angle on a reduced copy; it needs far fewer points
+        height, width = gray.shape
+        factor = min(1.0, 1000 / max(height, width))
+        small = cv2.resize(gray, (int(width * factor), int(height * factor)), interpolation=cv2.INTER_AREA)
+        _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        points = cv2.findNonZero(ink)
+        if points is None or len(points) < 100:
+            return gray
+        
+        angle = cv2.minAreaRect(points)[-1]
+        if angle > 45:
+            angle -= 90
+        if abs(angle) < 0.2 or abs(angle) > self.max_deskew_angle:
+            return gray
+        
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        return cv2.warpAffine(
+            gray, matrix, (width, height),
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_REPLICATE
+        )
+    
+    def _binarize(self, gray: np.ndarray) -> np.ndarray:
+        """Adaptive (local) thresholding copes with uneven lighting in photos"""
+        return cv2.adaptiveThreshold(
+            gray, 255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY,
+            self.block_size,
+            self.threshold_offset
+        )
@@ -0,0 +1,583 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from app.config import (
+    JOB_QUEUE_PATH,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETENTION_HOURS,
+    PREFETCH_TTL_HOURS
+)
+from app.services.fair_scheduler import FairScheduler
+
+
+class JobQueue:
+    """
+    Durable local queue of document extraction jobs.
+    
+    A job is one session's upload; each of its files is a task. Workers (in
+    any process) claim tasks under a time-limited lease and store each file's
+    result when done, so a job interrupted by a crash resumes with only the
+    unfinished files once their leases expire. A task that keeps losing its
+    worker is given up after `max_attempts` and recorded as an error.
+    
+    Once every file of a job is done, the job itself is claimed once more
+    ("finalize") to assemble the results into the session.
+    
+    Which job the next file comes from is decided by the `FairScheduler`
+    from the jobs' estimated page counts and each client's virtual time.
+    
+    Files can also be queued as they are uploaded ("prefetch"), before any
+    session exists. A later job adopts the prefetch task for a file with the
+    same content hash, finished or not, instead of extracting it again.
+    
+    Completed and failed jobs are kept for `retention_hours` (for stats and
+    late progress reads), then purged along with the expired-lease check.
+    """
+    
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        scheduler: Optional[FairScheduler] = None,
+        retention_hours: Optional[float] = None
+    ):
+        self.db_path = db_path or JOB_QUEUE_PATH
+        self.lease_seconds = lease_seconds if lease_seconds is not None else JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts if max_attempts is not None else JOB_MAX_ATTEMPTS
+        self.retention_seconds = (retention_hours if retention_hours is not None else JOB_RETENTION_HOURS) * 3600
+        self.scheduler = scheduler or FairScheduler()
+        self._lock = threading.Lock()
+        self._last_stale_check = 0.0
+        
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Autocommit mode; claims open their own write transaction
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                session_id TEXT,
+                client_name TEXT NOT NULL,
+                prefetch INTEGER NOT NULL DEFAULT 0,
+                preprocess INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                pages INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                lease_owner TEXT,
+                lease_expires REAL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                file_path TEXT NOT NULL,
+                file_hash TEXT,
+                pages INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                UNIQUE (job_id, position)
+            )
+            """
+        )
+        # Per-client virtual time for fair queuing, plus wait statistics
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS clients (
+                client_name TEXT PRIMARY KEY,
+                virtual_time REAL NOT NULL,
+                claims INTEGER NOT NULL DEFAULT 0,
+                total_wait REAL NOT NULL DEFAULT 0,
+                max_wait REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Latest statistics reported by each worker process
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                stats TEXT NOT NULL,
+                reported_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS scheduler (id INTEGER PRIMARY KEY CHECK (id = 0), clock REAL NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO scheduler (id, clock) VALUES (0, 0)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, job_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_hash ON tasks (file_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+    
+    def enqueue(
+        self,
+        session_id: str,
+        client_name: str,
+        file_paths: List[str],
+        preprocess: bool = True,
+        pages: Optional[List[int]] = None,
+        file_hashes: Optional[List[str]] = None
+    ) -> str:
+        """
+        Add a job with one task per file (with its estimated page count) and
+        return its id. Files whose hash matches a prefetch task of the same
+        client are taken over from it instead of being extracted again.
+        """
+        job_id = str(uuid.uuid4())
+        pages = pages or [1] * len(file_paths)
+        file_hashes = file_hashes or [None] * len(file_paths)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO jobs (job_id, session_id, client_name, preprocess, status, total, pages, created_at)
+                    VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)
+                    """,
+                    (job_id, session_id, client_name, int(preprocess), len(file_paths), sum(pages), now)
+                )
+                for position, (file_path, file_pages, file_hash) in enumerate(zip(file_paths, pages, file_hashes)):
+                    prefetched = file_hash and self._conn.execute(
+                        """
+                        SELECT tasks.task_id FROM tasks JOIN jobs ON jobs.job_id = tasks.job_id
+                        WHERE tasks.file_hash = ? AND jobs.prefetch = 1
+                          AND jobs.client_name = ? AND jobs.preprocess = ?
+                        ORDER BY tasks.status = 'done' DESC LIMIT 1
+                        """,
+                        (file_hash, client_name, int(preprocess))
+                    ).fetchone()
+                    if prefetched:
+                        self._conn.execute(
+                            "UPDATE tasks SET job_id = ?, position = ?, file_path = ? WHERE task_id = ?",
+                            (job_id, position, file_path, prefetched[0])
+                        )
+                    else:
+                        self._conn.execute(
+                            """
+                            INSERT INTO tasks (job_id, position, file_path, file_hash, pages, created_at, status)
+                            VALUES (?, ?, ?, ?, ?, ?, 'pending')
+                            """,
+                            (job_id, position, file_path, file_hash, file_pages, now)
+                        )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+    
+    def prefetch(
+        self,
+        client_name: str,
+        batch: str,
+        file_path: str,
+        file_hash: str,
+        preprocess: bool = True,
+        pages: int = 1
+    ):
+        """
+        Queue a just-uploaded file for extraction ahead of any job.
+        
+        Files of one client's upload batch (e.g. a month) share a prefetch job,
+        so the scheduler sees them as one job of their combined size.
+        """
+        job_id = f"prefetch:{client_name}/{batch}:{int(preprocess)}"
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._purge_prefetch(now)
+                self._conn.execute(
+                    """
+                    INSERT OR IGNORE INTO jobs
+                        (job_id, session_id, client_name, prefetch, preprocess, status, total, pages, created_at)
+                    VALUES (?, NULL, ?, 1, ?, 'pending', 0, 0, ?)
+                    """,
+                    (job_id, client_name, int(preprocess), now)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET total = total + 1, pages = pages + ? WHERE job_id = ?", (pages, job_id)
+                )
+                position = self._conn.execute("SELECT total FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+                self._conn.execute(
+                    """
+                    INSERT INTO tasks (job_id, position, file_path, file_hash, pages, created_at, status)
+                    VALUES (?, ?, ?, ?, ?, ?, 'pending')
+                    """,
+                    (job_id, position, file_path, file_hash, pages, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def _purge_prefetch(self, now: float):
+        """Drop prefetched results no job has taken over within the TTL"""
+        cutoff = now - PREFETCH_TTL_HOURS * 3600
+        self._conn.execute(
+            """
+            DELETE FROM tasks WHERE status = 'done' AND created_at < ?
+              AND job_id IN (SELECT job_id FROM jobs WHERE prefetch = 1)
+            """,
+            (cutoff,)
+        )
+        self._conn.execute(
+            """
+            DELETE FROM jobs WHERE prefetch = 1 AND created_at < ?
+              AND NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.job_id = jobs.job_id)
+            """,
+            (cutoff,)
+        )
+    
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Lease the next piece of work for a worker.
+        
+        Returns:
+            None when there is nothing to do, otherwise a dict with `kind`
+            "finalize" (every file of the job is done) or "file", plus
+            job_id, session_id, preprocess and, for files, task_id and file_path
+            (session_id is None for prefetched files)
+        """
+        now = time.time()
+        expires = now + self.lease_seconds
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases only matter at lease granularity; skip the scan on most claims
+                if now - self._last_stale_check >= self.lease_seconds / 4:
+                    self._last_stale_check = now
+                    self._give_up_stale(now)
+                    self._purge_finished(now)
+                
+                job = self._conn.execute(
+                    """
+                    SELECT job_id, session_id, preprocess FROM jobs
+                    WHERE (status = 'pending' OR (status = 'finalizing' AND lease_expires < ?))
+                      AND prefetch = 0
+                      AND NOT EXISTS (
+                          SELECT 1 FROM tasks WHERE tasks.job_id = jobs.job_id AND tasks.status != 'done'
+                      )
+                    ORDER BY created_at LIMIT 1
+                    """,
+                    (now,)
+                ).fetchone()
+                if job is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'finalizing', lease_owner = ?, lease_expires = ? WHERE job_id = ?",
+                        (worker_id, expires, job[0])
+                    )
+                    self._conn.execute("COMMIT")
+                    return {"kind": "finalize", "job_id": job[0], "session_id": job[1], "preprocess": bool(job[2])}
+                
+                task = self._claim_task(worker_id, now, expires)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return task
+    
+    def _claim_task(self, worker_id: str, now: float, expires: float) -> Optional[Dict]:
+        """Lease the next file of the job the scheduler picks; runs inside the claim transaction"""
+        claimable = "(tasks.status = 'pending' OR (tasks.status = 'leased' AND tasks.lease_expires < ?))"
+        jobs = [
+            {"job_id": row[0], "client_name": row[1], "pages": row[2], "created_at": row[3], "remaining": row[4]}
+            for row in self._conn.execute(
+                f"""
+                SELECT jobs.job_id, jobs.client_name, jobs.pages, jobs.created_at, SUM(tasks.pages)
+                FROM tasks JOIN jobs ON jobs.job_id = tasks.job_id
+                WHERE {claimable}
+                GROUP BY jobs.job_id
+                """,
+                (now,)
+            )
+        ]
+        if not jobs:
+            return None
+        
+        virtual_times = dict(self._conn.execute("SELECT client_name, virtual_time FROM clients"))
+        clock = self._conn.execute("SELECT clock FROM scheduler").fetchone()[0]
+        job = self.scheduler.pick(jobs, virtual_times, clock, now)
+        client_name = job["client_name"]
+        
+        task_id, file_path, pages, attempts, created_at, session_id, preprocess = self._conn.execute(
+            f"""
+            SELECT tasks.task_id, tasks.file_path, tasks.pages, tasks.attempts, tasks.created_at,
+                   jobs.session_id, jobs.preprocess
+            FROM tasks JOIN jobs ON jobs.job_id = tasks.job_id
+            WHERE tasks.job_id = ? AND {claimable}
+            ORDER BY tasks.position LIMIT 1
+            """,
+            (job["job_id"], now)
+        ).fetchone()
+        self._conn.execute(
+            """
+            UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+            WHERE task_id = ?
+            """,
+            (worker_id, expires, task_id)
+        )
+        
+        # Advance the clock and the client's virtual time; record queue wait on first claim
+        start_time = self.scheduler.start_time(client_name, virtual_times, clock)
+        self._conn.execute("UPDATE scheduler SET clock = ?", (max(clock, start_time),))
+        wait = now - created_at if attempts == 0 else 0.0
+        self._conn.execute(
+            """
+            INSERT INTO clients (client_name, virtual_time, claims, total_wait, max_wait) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (client_name) DO UPDATE SET
+                virtual_time = excluded.virtual_time,
+                claims = claims + excluded.claims,
+                total_wait = total_wait + excluded.total_wait,
+                max_wait = MAX(max_wait, excluded.max_wait)
+            """,
+            (
+                client_name,
+                self.scheduler.charge(client_name, start_time, pages),
+                int(attempts == 0),
+                wait,
+                wait
+            )
+        )
+        
+        return {
+            "kind": "file",
+            "job_id": job["job_id"],
+            "task_id": task_id,
+            "file_path": file_path,
+            "session_id": session_id,
+            "preprocess": bool(preprocess)
+        }
+    
+    def _give_up_stale(self, now: float):
+        """Record expired tasks that have used all their attempts as errors"""
+        stale = self._conn.execute(
+            """
+            SELECT task_id, file_path, attempts FROM tasks
+            WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """,
+            (now, self.max_attempts)
+        ).fetchall()
+        for task_id, file_path, attempts in stale:
+            result = {
+                "file": os.path.basename(file_path),
+                "error": f"Worker lost the file {attempts} times; giving up",
+                "status": "error"
+            }
+            self._conn.execute(
+                "UPDATE tasks SET status = 'done', lease_owner = NULL, result = ? WHERE task_id = ?",
+                (json.dumps(result), task_id)
+            )
+    
+    def _purge_finished(self, now: float):
+        """Drop completed and failed jobs finished longer ago than the retention period"""
+        cutoff = now - self.retention_seconds
+        finished = "SELECT job_id FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?"
+        self._conn.execute(f"DELETE FROM tasks WHERE job_id IN ({finished})", (cutoff,))
+        self._conn.execute(f"DELETE FROM jobs WHERE job_id IN ({finished})", (cutoff,))
+    
+    def renew(self, work: Dict, worker_id: str) -> bool:
+        """Extend a held lease; False if the lease was lost to another worker"""
+        expires = time.time() + self.lease_seconds
+        with self._lock:
+            if work["kind"] == "finalize":
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND lease_owner = ? AND status = 'finalizing'",
+                    (expires, work["job_id"], worker_id)
+                )
+            else:
+                cursor = self._conn.execute(
+                    """
+                    UPDATE tasks SET lease_expires = ?
+                    WHERE task_id = ? AND lease_owner = ? AND status = 'leased'
+                    """,
+                    (expires, work["task_id"], worker_id)
+                )
+            return cursor.rowcount == 1
+    
+    def complete(self, work: Dict, worker_id: str, result: Dict) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Checkpoint a file's result.
+        
+        Returns:
+            (job_id, session_id) the task now belongs to (a prefetched file
+            may have been taken over meanwhile), or None if the lease was
+            lost and the result discarded
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    """
+                    UPDATE tasks SET status = 'done', lease_owner = NULL, result = ?
+                    WHERE task_id = ? AND lease_owner = ? AND status = 'leased'
+                    """,
+                    (json.dumps(result, default=str), work["task_id"], worker_id)
+                )
+                owner = self._conn.execute(
+                    """
+                    SELECT jobs.job_id, jobs.session_id FROM tasks JOIN jobs ON jobs.job_id = tasks.job_id
+                    WHERE tasks.task_id = ?
+                    """,
+                    (work["task_id"],)
+                ).fetchone() if cursor.rowcount == 1 else None
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return owner
+    
+    def release(self, work: Dict, worker_id: str):
+        """Hand unfinished work back at once (e.g. on shutdown) without counting the attempt"""
+        with self._lock:
+            if work["kind"] == "finalize":
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', lease_owner = NULL WHERE job_id = ? AND lease_owner = ?",
+                    (work["job_id"], worker_id)
+                )
+            else:
+                self._conn.execute(
+                    """
+                    UPDATE tasks SET status = 'pending', lease_owner = NULL, attempts = attempts - 1
+                    WHERE task_id = ? AND lease_owner = ? AND status = 'leased'
+                    """,
+                    (work["task_id"], worker_id)
+                )
+    
+    def progress(self, job_id: str) -> Tuple[int, int]:
+        """(files done, total files) for a job"""
+        with self._lock:
+            done, total = self._conn.execute(
+                """
+                SELECT (SELECT COUNT(*) FROM tasks WHERE job_id = ? AND status = 'done'), total
+                FROM jobs WHERE job_id = ?
+                """,
+                (job_id, job_id)
+            ).fetchone()
+        return done, total
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Queue depth and wait times per client"""
+        now = time.time()
+        with self._lock:
+            clients = {
+                client_name: {
+                    "weight": self.scheduler.weight(client_name),
+                    "jobs": jobs,
+                    "pending_files": pending_files or 0,
+                    "pending_pages": pending_pages or 0,
+                    "in_progress_files": in_progress or 0,
+                    "oldest_wait_seconds": round(now - oldest, 1)
+                }
+                for client_name, jobs, pending_files, pending_pages, in_progress, oldest in self._conn.execute(
+                    """
+                    SELECT jobs.client_name,
+                           COUNT(DISTINCT jobs.job_id),
+                           SUM(tasks.status = 'pending'),
+                           SUM(CASE WHEN tasks.status = 'pending' THEN tasks.pages ELSE 0 END),
+                           SUM(tasks.status = 'leased'),
+                           MIN(jobs.created_at)
+                    FROM tasks JOIN jobs ON jobs.job_id = tasks.job_id
+                    WHERE tasks.status != 'done'
+                    GROUP BY jobs.client_name
+                    """
+                )
+            }
+            for client_name, claims, total_wait, max_wait in self._conn.execute(
+                "SELECT client_name, claims, total_wait, max_wait FROM clients"
+            ):
+                entry = clients.setdefault(client_name, {
+                    "weight": self.scheduler.weight(client_name),
+                    "jobs": 0,
+                    "pending_files": 0,
+                    "pending_pages": 0,
+                    "in_progress_files": 0,
+                    "oldest_wait_seconds": 0.0
+                })
+                entry["files_started"] = claims
+                entry["avg_wait_seconds"] = round(total_wait / claims, 1) if claims else 0.0
+                entry["max_wait_seconds"] = round(max_wait, 1)
+        return clients
+    
+    def report_worker(self, worker_id: str, stats: Dict):
+        """Store a worker's latest statistics, dropping workers silent for a day"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO workers (worker_id, stats, reported_at) VALUES (?, ?, ?)
+                ON CONFLICT (worker_id) DO UPDATE SET stats = excluded.stats, reported_at = excluded.reported_at
+                """,
+                (worker_id, json.dumps(stats, default=str), now)
+            )
+            self._conn.execute("DELETE FROM workers WHERE reported_at < ?", (now - 86400,))
+    
+    def worker_stats(self, max_age: float = 3600) -> Dict[str, Dict]:
+        """Statistics of workers that reported within `max_age` seconds"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker_id, stats, reported_at FROM workers WHERE reported_at >= ? ORDER BY worker_id",
+                (now - max_age,)
+            ).fetchall()
+        return {
+            worker_id: {**json.loads(stats), "reported_seconds_ago": round(now - reported_at, 1)}
+            for worker_id, stats, reported_at in rows
+        }
+    
+    def results(self, job_id: str) -> List[Dict]:
+        """Per-file results of a job in upload order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM tasks WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return [json.loads(result) for (result,) in rows]
+    
+    def finish(self, job_id: str, worker_id: str, status: str = "completed"):
+        """Close a finalized job; its per-file results now live in the session"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, finished_at = ?, lease_owner = NULL
+                    WHERE job_id = ? AND lease_owner = ?
+                    """,
+                    (status, time.time(), job_id, worker_id)
+                )
+                if cursor.rowcount == 1:
+                    self._conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return this process's connection to the job queue"""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Dict, Optional, Tuple
+from app.config import RECONCILE_WORKERS
+from app.services.excel_generator import ExcelGenerator
+from app.services.match_index import GSTR2BIndex
+from app.services.mismatch_detector import MismatchDetector
+from app.services.reconciliation import ReconciliationState, expand_results
+
+# Worker-side functions. They run inside the process pool, so they must stay
+# module-level (picklable); their arguments and results are pickled too.
+
+
+def reconcile_invoices(
+    extracted_invoices: list,
+    gstr2b_data: Dict,
+    index: Optional[GSTR2BIndex]
+) -> Tuple[ReconciliationState, Dict, Dict]:
+    """Match invoices against GSTR2B, returning (state, compact results, report card summary)"""
+    detector = MismatchDetector()
+    state = detector.reconcile(extracted_invoices, gstr2b_data, index)
+    results = state.results()
+    return state, results, detector.generate_report_card(results, include_detail=False)
+
+
+def build_mismatch_report(results: Dict, extracted_invoices: list, gstr2b_rows: list, path: str) -> str:
+    """Write the mismatch report workbook from compact results to `path`; returns its download filename"""
+    return build_analysis_report(expand_results(results, extracted_invoices, gstr2b_rows), path)
+
+
+def build_analysis_report(analysis: Dict, path: str) -> str:
+    """Write the mismatch report workbook from an expanded analysis to `path`"""
+    return _write_workbook(path, lambda target: ExcelGenerator().write_mismatch_report(analysis, target))
+
+
+def build_invoice_sheet(invoices: list, path: str) -> str:
+    """Write the invoice sheet to `path`; returns its download filename"""
+    return _write_workbook(path, lambda target: ExcelGenerator().write_invoice_sheet(invoices, target))
+
+
+def _write_workbook(path: str, write) -> str:
+    """Write next to `path` and move the file into place, so downloads never see a partial workbook"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        filename = write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return filename
+
+
+class JobRunner:
+    """
+    Runs CPU-bound reconciliation and report building in a process pool.
+    
+    `start()` launches a background coroutine under a job id and returns at
+    once; the coroutine awaits pool work through `run()` and reports its
+    progress on the session it was started for.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or RECONCILE_WORKERS
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._jobs: Dict[str, asyncio.Task] = {}
+    
+    def run(self, fn, *args) -> asyncio.Future:
+        """Schedule a picklable function on the pool and return an awaitable future"""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, fn, *args)
+    
+    def start(self, job_id: str, job: Awaitable) -> str:
+        """Run `job` in the background; the task is kept referenced until it finishes"""
+        task = asyncio.ensure_future(job)
+        self._jobs[job_id] = task
+        task.add_done_callback(lambda done: self._finished(job_id, done))
+        return job_id
+    
+    def _finished(self, job_id: str, task: asyncio.Task):
+        self._jobs.pop(job_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[JOBS] Job {job_id} failed: {task.exception()}", file=sys.stderr)
+    
+    def shutdown(self):
+        for task in self._jobs.values():
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    """Return the process-wide job runner, starting its pool on first use"""
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    return _runner
+
+
+def shutdown_job_runner():
+    global _runner
+    if _runner is not None:
+        _runner.shutdown()
+        _runner = None
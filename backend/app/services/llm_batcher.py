@@ -0,0 +1,115 @@
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# An item is (item_id, payload); a batch runner returns {item_id: result} for
+# the items it managed to handle and simply omits the ones that failed.
+# Item ids are assigned by the batcher, one per submit, so that two documents
+# that happen to share a name can never receive each other's result.
+BatchItem = Tuple[str, Any]
+
+
+class LLMBatcher:
+    """
+    Packs concurrent single-document LLM requests into batched requests.
+    
+    Callers await `submit()` as if it were a single call. Pending items are
+    flushed when the next one would exceed the token budget, when the batch
+    is full, or after `max_wait` seconds. Items missing from a batch response
+    are split in half and retried, down to the single-document request.
+    """
+    
+    def __init__(
+        self,
+        run_batch: Callable[[List[BatchItem]], Awaitable[Dict[str, Any]]],
+        run_single: Callable[[BatchItem], Awaitable[Any]],
+        estimate_tokens: Callable[[Any], int],
+        token_budget: int,
+        max_items: int = 20,
+        max_wait: float = 0.2
+    ):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.estimate_tokens = estimate_tokens
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self.max_wait = max_wait
+        
+        self._pending: List[Tuple[BatchItem, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._ids = itertools.count(1)
+        self.stats = {"requests": 0, "batched_items": 0, "split_retries": 0, "single_requests": 0}
+    
+    async def submit(self, payload: Any) -> Any:
+        """Queue one item and wait for its result"""
+        item_id = str(next(self._ids))
+        tokens = self.estimate_tokens(payload)
+        if self._pending and self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((item_id, payload), future))
+        self._pending_tokens += tokens
+        
+        if len(self._pending) >= self.max_items or self._pending_tokens >= self.token_budget:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        
+        pending, self._pending, self._pending_tokens = self._pending, [], 0
+        task = asyncio.ensure_future(self._dispatch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _dispatch(self, pending: List[Tuple[BatchItem, asyncio.Future]]):
+        if len(pending) == 1:
+            item, future = pending[0]
+            self.stats["requests"] += 1
+            self.stats["single_requests"] += 1
+            try:
+                self._resolve(future, result=await self.run_single(item))
+            except Exception as e:
+                self._resolve(future, error=e)
+            return
+        
+        self.stats["requests"] += 1
+        try:
+            results = await self.run_batch([item for item, _ in pending])
+        except Exception:
+            results = {}
+        
+        failed = []
+        for item, future in pending:
+            if item[0] in results:
+                self.stats["batched_items"] += 1
+                self._resolve(future, result=results[item[0]])
+            else:
+                failed.append((item, future))
+        
+        # Retry only the affected documents, halving the batch each time
+        if failed:
+            self.stats["split_retries"] += 1
+            middle = (len(failed) + 1) // 2
+            halves = [half for half in (failed[:middle], failed[middle:]) if half]
+            await asyncio.gather(*(self._dispatch(half) for half in halves))
+    
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any = None, error: Optional[Exception] = None):
+        # The caller may have been cancelled while the request was in flight
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
@@ -0,0 +1,122 @@
+import sys
+import time
+import random
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional
+import httpx
+from google import genai
+from google.genai import errors
+from app.config import GEMINI_MAX_CONCURRENCY, GEMINI_REQUESTS_PER_MINUTE, GEMINI_MAX_RETRIES
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, bursting up to `capacity`.
+    Tokens are reserved under a thread lock and the wait happens on the caller's
+    loop, so one bucket limits requests from any number of event loops.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Take a token, going into debt if none is left; returns the seconds until it is due"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            return max(0.0, -self._tokens / self.rate)
+    
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class LLMDispatcher:
+    """
+    Sends Gemini requests through the async client with bounded concurrency,
+    a requests-per-minute token bucket and jittered exponential backoff on
+    rate-limit (429) and server (5xx) errors.
+    """
+    
+    RETRYABLE_CODES = {429, 500, 502, 503, 504}
+    
+    def __init__(
+        self,
+        client: genai.Client,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0
+    ):
+        self.client = client
+        self.max_retries = max_retries if max_retries is not None else GEMINI_MAX_RETRIES
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+        self.concurrency = max_concurrency or GEMINI_MAX_CONCURRENCY
+        rate = (requests_per_minute or GEMINI_REQUESTS_PER_MINUTE) / 60
+        self._bucket = TokenBucket(rate=rate, capacity=max(1.0, min(self.concurrency, rate * 60)))
+        # asyncio semaphores belong to the loop that first waits on them, while the
+        # dispatcher outlives any one loop (scripts, tests or a restarted worker
+        # calling asyncio.run again), so each loop gets its own
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit for the running loop, created on first use in that loop"""
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+            return semaphore
+    
+    async def generate(self, prompt: str, model: str) -> str:
+        """Run one generate_content call and return the response text"""
+        attempt = 0
+        while True:
+            async with self._semaphore():
+                await self._bucket.acquire()
+                try:
+                    response = await self.client.aio.models.generate_content(
+                        model=model,
+                        contents=prompt
+                    )
+                    return response.text
+                except Exception as e:
+                    if attempt >= self.max_retries or not self._is_retryable(e):
+                        raise
+                    error = e
+            
+            # Back off outside the semaphore so other requests can proceed
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            attempt += 1
+            print(f"[GEMINI] Retry {attempt}/{self.max_retries} in {delay:.1f}s after: {error}", file=sys.stderr)
+            await asyncio.sleep(delay)
+    
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, errors.APIError):
+            return error.code in self.RETRYABLE_CODES
+        return isinstance(error, httpx.TransportError)
+
+
+_dispatchers: Dict[str, LLMDispatcher] = {}
+
+
+def get_llm_dispatcher(api_key: str) -> LLMDispatcher:
+    """
+    Return the process-wide dispatcher for an API key, so the concurrency
+    and rate limits apply across all sessions rather than per request
+    """
+    if api_key not in _dispatchers:
+        _dispatchers[api_key] = LLMDispatcher(genai.Client(api_key=api_key))
+    return _dispatchers[api_key]
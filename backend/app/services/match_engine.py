@@ -0,0 +1,356 @@
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, min_weight_full_bipartite_matching
+from app.services.match_index import GSTR2BIndex, block_keys, invoice_columns
+
+# (extracted row, GSTR-2B row, overall score, per-field sub-scores)
+Match = Tuple[int, int, float, Dict[str, float]]
+
+SCORE_FIELDS = ("invoice_number", "date", "gstin", "amount")
+
+# Components up to this many (invoice, GSTR-2B row) cells are solved densely
+DENSE_ASSIGNMENT_CELLS = 4_000_000
+
+
+def _codes(left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer codes shared by both sides, so equality becomes an int comparison"""
+    codes, _ = pd.factorize(np.concatenate([left, right]))
+    return codes[:len(left)], codes[len(left):]
+
+
+class MatchEngine:
+    """
+    Matches extracted invoices to GSTR-2B rows with vectorized scoring and an
+    optimal one-to-one assignment.
+    
+    Invoices are only compared with rows that agree on every field a match
+    cannot do without (with the default weights: supplier GSTIN and invoice
+    date, compared after parsing, so "15/01/2026" equals "2026-01-15"), and,
+    when the amount is needed too, whose amount is within the tolerance that
+    can still reach the threshold. Candidate pairs are scored as flat arrays
+    in chunks of at most `chunk_pairs`, so memory stays bounded however large
+    one supplier is. Every pair that could still reach the threshold (given
+    the other sub-scores and the length bound on the invoice-number
+    similarity) gets the exact SequenceMatcher score. Only blocks with more
+    than `shortlist_above_pairs` such pairs are pruned heuristically to the
+    `candidates_per_invoice` nearest by character n-gram similarity, per
+    invoice and per GSTR-2B row. Each block is split into connected
+    components of qualifying pairs and solved with the Hungarian algorithm,
+    so the result does not depend on the order of the invoices.
+    """
+    
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        threshold: float,
+        candidates_per_invoice: int = 5,
+        shortlist_above_pairs: int = 100_000,
+        chunk_pairs: int = 250_000
+    ):
+        self.weights = weights
+        self.threshold = threshold
+        self.candidates_per_invoice = candidates_per_invoice
+        self.shortlist_above_pairs = shortlist_above_pairs
+        self.chunk_pairs = chunk_pairs
+    
+    def match(self, extracted: List[Dict], index: GSTR2BIndex) -> List[Match]:
+        """Optimal one-to-one matches between extracted invoices and the indexed rows"""
+        return self.assign(self.candidate_pairs(extracted, index))
+    
+    def candidate_pairs(self, extracted: List[Dict], index: GSTR2BIndex) -> List[Match]:
+        """Every (extracted row, GSTR-2B row) pair that reaches the threshold"""
+        if not extracted or not index.size:
+            return []
+        
+        left = invoice_columns(extracted)
+        left["number_vector"] = index.numbers.transform(list(left["number_key"]))
+        
+        keyed = self._required_fields()
+        pairs = []
+        for rows, cols in self._blocks(left, index, keyed):
+            pairs.extend(self._score_block(left, index, rows, cols, keyed))
+        return pairs
+    
+    @staticmethod
+    def assign(pairs: List[Match]) -> List[Match]:
+        """
+        Maximum-total-score one-to-one selection from qualifying pairs, solved
+        separately for each connected component of the pair graph
+        """
+        if not pairs:
+            return []
+        
+        row_ids, rows = np.unique([pair[0] for pair in pairs], return_inverse=True)
+        col_ids, cols = np.unique([pair[1] for pair in pairs], return_inverse=True)
+        graph = coo_matrix(
+            (np.ones(len(pairs)), (rows, cols + len(row_ids))),
+            shape=(len(row_ids) + len(col_ids),) * 2
+        )
+        _, labels = connected_components(graph, directed=False)
+        
+        components: Dict[int, List[int]] = {}
+        for position, label in enumerate(labels[rows]):
+            components.setdefault(label, []).append(position)
+        
+        matches = []
+        for positions in components.values():
+            if len(positions) == 1:
+                matches.append(pairs[positions[0]])
+                continue
+            
+            block_rows, local_rows = np.unique(rows[positions], return_inverse=True)
+            block_cols, local_cols = np.unique(cols[positions], return_inverse=True)
+            scores = [pairs[position][2] for position in positions]
+            if len(block_rows) * len(block_cols) <= DENSE_ASSIGNMENT_CELLS:
+                dense = np.zeros((len(block_rows), len(block_cols)))
+                chosen = np.full(dense.shape, -1)
+                dense[local_rows, local_cols] = scores
+                chosen[local_rows, local_cols] = positions
+                for i, j in zip(*linear_sum_assignment(dense, maximize=True)):
+                    if chosen[i, j] >= 0:
+                        matches.append(pairs[chosen[i, j]])
+                continue
+            
+            # Large components are solved on the sparse pair graph. Every
+            # invoice also gets its own "unmatched" column costing 2, so a
+            # full matching always exists and minimising sum(2 - score)
+            # maximises the total score of the real pairs
+            n_rows, n_cols = len(block_rows), len(block_cols)
+            costs = csr_matrix(
+                (
+                    np.concatenate([2 - np.asarray(scores), np.full(n_rows, 2.0)]),
+                    (np.concatenate([local_rows, np.arange(n_rows)]), np.concatenate([local_cols, n_cols + np.arange(n_rows)]))
+                ),
+                shape=(n_rows, n_cols + n_rows)
+            )
+            chosen = dict(zip(zip(local_rows.tolist(), local_cols.tolist()), positions))
+            for i, j in zip(*min_weight_full_bipartite_matching(costs)):
+                if j < n_cols:
+                    matches.append(pairs[chosen[i, j]])
+        return matches
+    
+    def _required_fields(self) -> Tuple[str, ...]:
+        """GSTIN and date, whichever rules out a match on its own when it disagrees"""
+        return tuple(
+            field for field in ("gstin", "date")
+            if sum(weight for other, weight in self.weights.items() if other != field) < self.threshold - 1e-9
+        )
+    
+    def _blocks(self, left: Dict[str, np.ndarray], index: GSTR2BIndex, keyed: Tuple[str, ...]):
+        """(extracted rows, GSTR-2B rows sorted by amount) groups that can contain matches"""
+        right_blocks = index.blocks(keyed)
+        left_blocks: Dict[tuple, List[int]] = {}
+        for row, key in enumerate(block_keys(left, keyed)):
+            left_blocks.setdefault(key, []).append(row)
+        for key, rows in left_blocks.items():
+            cols = right_blocks.get(key)
+            if cols is not None:
+                # Sorted by amount like the GSTR-2B rows, so neighbouring
+                # invoices have overlapping amount windows
+                rows = np.asarray(rows)
+                yield rows[np.argsort(left["amount"][rows], kind="stable")], cols
+    
+    def _score_block(
+        self,
+        left: Dict[str, np.ndarray],
+        index: GSTR2BIndex,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        keyed: Tuple[str, ...]
+    ) -> List[Match]:
+        block = self._block_columns(left, index, rows, cols, keyed)
+        
+        # Every candidate is kept unless there are too many that can still qualify
+        oversized = (
+            block["candidates"] > self.shortlist_above_pairs
+            and sum(np.count_nonzero(self._features(block, i, j)["feasible"]) for i, j in self._chunks(block))
+            > self.shortlist_above_pairs
+        )
+        if oversized:
+            i, j = self._nearest(left, index, block)
+            return self._score_pairs(block, i, j)
+        
+        matches = []
+        for i, j in self._chunks(block):
+            feasible = self._features(block, i, j)["feasible"]
+            matches.extend(self._score_pairs(block, i[feasible], j[feasible]))
+        return matches
+    
+    def _block_columns(
+        self,
+        left: Dict[str, np.ndarray],
+        index: GSTR2BIndex,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        keyed: Tuple[str, ...]
+    ) -> Dict:
+        """Per-side arrays of one block, and each invoice's slice of the amount-sorted rows"""
+        right = index.columns
+        block = {
+            "rows": rows,
+            "cols": cols,
+            "left_amounts": left["amount"][rows],
+            "right_amounts": right["amount"][cols],
+            "left_numbers": left["invoice_number"][rows],
+            "right_numbers": right["invoice_number"][cols],
+            "left_lengths": np.array([len(number) for number in left["invoice_number"][rows]], dtype=float),
+            "right_lengths": np.array([len(number) for number in right["invoice_number"][cols]], dtype=float)
+        }
+        # Fields the block is keyed on agree for every pair and are not compared
+        for field in ("date", "gstin"):
+            if field not in keyed:
+                block[f"left_{field}"], block[f"right_{field}"] = _codes(left[field][rows], right[field][cols])
+        
+        # Amount score any pair still needs, given full marks elsewhere
+        weights = self.weights
+        needed = (self.threshold - sum(weight for field, weight in weights.items() if field != "amount")) / weights["amount"]
+        tolerance = 1 - needed + 1e-9
+        if tolerance < 1:
+            # 1 - |e - g| / g >= needed  <=>  e / (1 + tolerance) <= g <= e / (1 - tolerance)
+            amounts = np.where(block["left_amounts"] > 0, block["left_amounts"], np.nan)
+            block["start"] = np.searchsorted(block["right_amounts"], amounts / (1 + tolerance), side="left")
+            block["end"] = np.searchsorted(block["right_amounts"], amounts / (1 - tolerance), side="right")
+            block["end"] = np.where(np.isnan(amounts), block["start"], block["end"])
+        else:
+            block["start"] = np.zeros(len(rows), dtype=int)
+            block["end"] = np.full(len(rows), len(cols))
+        block["candidates"] = int((block["end"] - block["start"]).sum())
+        return block
+    
+    def _chunks(self, block: Dict) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Candidate pairs as (block row, block column) arrays. Each chunk is a
+        run of invoices whose windows together span at most `chunk_pairs`
+        (invoice, GSTR-2B row) cells, or a single invoice
+        """
+        start, end = block["start"], block["end"]
+        counts = end - start
+        first = 0
+        while first < len(counts):
+            spans = np.arange(1, len(counts) - first + 1) * (np.maximum.accumulate(end[first:]) - start[first])
+            last = first + max(1, int(np.searchsorted(spans, self.chunk_pairs, side="right")))
+            i = np.repeat(np.arange(first, last), counts[first:last])
+            offsets = np.arange(len(i)) - np.repeat(np.cumsum(counts[first:last]) - counts[first:last], counts[first:last])
+            yield i, block["start"][i] + offsets
+            first = last
+    
+    def _features(self, block: Dict, i: np.ndarray, j: np.ndarray) -> Dict[str, np.ndarray]:
+        """Date, GSTIN and amount sub-scores of candidate pairs, and whether each can still qualify"""
+        weights = self.weights
+        features = {}
+        for field in ("date", "gstin"):
+            if f"left_{field}" in block:
+                features[field] = (block[f"left_{field}"][i] == block[f"right_{field}"][j]).astype(float)
+            else:
+                features[field] = np.ones(len(i))
+        
+        # Amount within a relative tolerance of the GSTR-2B figure
+        ext_amounts, gstr_amounts = block["left_amounts"][i], block["right_amounts"][j]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amount_scores = np.maximum(0.0, 1 - np.abs(ext_amounts - gstr_amounts) / gstr_amounts)
+        features["amount"] = np.where((gstr_amounts > 0) & np.isfinite(amount_scores), amount_scores, 0.0)
+        
+        # Similarity each pair needs to reach the threshold. Pairs whose
+        # length bound (SequenceMatcher.real_quick_ratio) cannot reach it are
+        # ruled out exactly
+        partial = sum(features[field] * weights[field] for field in ("date", "gstin", "amount"))
+        features["needed"] = (self.threshold - partial) / weights["invoice_number"] - 1e-9
+        left_lengths, right_lengths = block["left_lengths"][i], block["right_lengths"][j]
+        total_lengths = left_lengths + right_lengths
+        with np.errstate(divide="ignore", invalid="ignore"):
+            length_bound = np.where(total_lengths > 0, 2 * np.minimum(left_lengths, right_lengths) / total_lengths, 1.0)
+        features["feasible"] = length_bound >= features["needed"]
+        return features
+    
+    def _score_pairs(self, block: Dict, i: np.ndarray, j: np.ndarray) -> List[Match]:
+        """Exact scores of candidate pairs; returns those reaching the threshold"""
+        if not len(i):
+            return []
+        features = self._features(block, i, j)
+        needed = features["needed"]
+        left_numbers, right_numbers = block["left_numbers"], block["right_numbers"]
+        
+        # Pairs are walked column by column so the matcher analyses each
+        # GSTR-2B number only once; the cheap upper bounds skip most full comparisons
+        number_scores = np.zeros(len(i))
+        matcher = SequenceMatcher(None)
+        current = None
+        for pair in np.lexsort((i, j)):
+            a, b = left_numbers[i[pair]], right_numbers[j[pair]]
+            if a == b:
+                number_scores[pair] = 1.0
+                continue
+            if j[pair] != current:
+                matcher.set_seq2(b)
+                current = j[pair]
+            matcher.set_seq1(a)
+            if matcher.real_quick_ratio() >= needed[pair] and matcher.quick_ratio() >= needed[pair]:
+                number_scores[pair] = matcher.ratio()
+        
+        features["invoice_number"] = number_scores
+        scores = sum(features[field] * self.weights[field] for field in SCORE_FIELDS)
+        return [
+            (
+                int(block["rows"][i[pair]]),
+                int(block["cols"][j[pair]]),
+                float(scores[pair]),
+                {field: float(features[field][pair]) for field in SCORE_FIELDS}
+            )
+            for pair in np.flatnonzero(scores >= self.threshold)
+        ]
+    
+    def _nearest(
+        self,
+        left: Dict[str, np.ndarray],
+        index: GSTR2BIndex,
+        block: Dict
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Heuristic pruning for oversized blocks: of the pairs that can still
+        qualify, the `candidates_per_invoice` nearest by n-gram similarity for
+        each invoice and for each GSTR-2B row
+        """
+        k = self.candidates_per_invoice
+        kept_i, kept_j = [], []
+        # Best invoices per GSTR-2B row so far, merged chunk by chunk
+        col_best = np.full((len(block["cols"]), k), -1)
+        col_similarity = np.full((len(block["cols"]), k), -np.inf)
+        for i, j in self._chunks(block):
+            feasible = self._features(block, i, j)["feasible"]
+            i, j = i[feasible], j[feasible]
+            if not len(i):
+                continue
+            # One product over the chunk's rectangle of cells; cells that are
+            # not feasible pairs can never be chosen
+            first, low = i.min(), j.min()
+            queries = left["number_vector"][block["rows"][first:i.max() + 1]]
+            targets = index.numbers.matrix[block["cols"][low:j.max() + 1]]
+            product = (queries @ targets.T).toarray()
+            similarity = np.full(product.shape, -np.inf)
+            similarity[i - first, j - low] = product[i - first, j - low]
+            height, width = similarity.shape
+            
+            # Chunks hold whole invoices, so the per-invoice choice is final
+            depth = min(k, width)
+            best = np.argpartition(-similarity, depth - 1, axis=1)[:, :depth]
+            best_i = np.repeat(np.arange(height), depth)
+            best_j = best.ravel()
+            chosen = np.isfinite(similarity[best_i, best_j])
+            kept_i.append(best_i[chosen] + first)
+            kept_j.append(best_j[chosen] + low)
+            
+            merged = np.hstack([col_similarity[low:low + width], similarity.T])
+            invoices = np.hstack([col_best[low:low + width], np.broadcast_to(np.arange(first, first + height), (width, height))])
+            best = np.argpartition(-merged, k - 1, axis=1)[:, :k]
+            col_similarity[low:low + width] = np.take_along_axis(merged, best, axis=1)
+            col_best[low:low + width] = np.take_along_axis(invoices, best, axis=1)
+        
+        col_j, slot = np.nonzero(np.isfinite(col_similarity))
+        i = np.concatenate(kept_i + [col_best[col_j, slot]])
+        j = np.concatenate(kept_j + [col_j])
+        unique = np.unique(i * len(block["cols"]) + j)
+        return unique // len(block["cols"]), unique % len(block["cols"])
@@ -0,0 +1,90 @@
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.services.fuzzy_index import InvoiceNumberIndex
+from app.services.rule_extractor import parse_date
+
+
+def normalize_gstin(value) -> str:
+    return re.sub(r"\s+", "", str(value or "")).upper()
+
+
+def normalize_invoice_number(value) -> str:
+    """Upper-case alphanumerics only, so "inv/001" and "INV-001 " share a key"""
+    return re.sub(r"[^A-Z0-9]", "", str(value or "").upper())
+
+
+def parse_amount(value) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def invoice_columns(invoices: List[Dict]) -> Dict[str, np.ndarray]:
+    """Normalize invoices once into columnar arrays for matrix scoring"""
+    # Each distinct date string is parsed only once
+    parsed_dates = {}
+    dates = []
+    for invoice in invoices:
+        raw = invoice.get("invoice_date")
+        if isinstance(raw, str):
+            if raw not in parsed_dates:
+                parsed_dates[raw] = parse_date(raw) or raw
+            raw = parsed_dates[raw]
+        dates.append(raw)
+    
+    amounts = []
+    for invoice in invoices:
+        amount = parse_amount(invoice.get("total_amount", 0))
+        amounts.append(np.nan if amount is None else amount)
+    
+    return {
+        "invoice_number": np.array([str(invoice.get("invoice_number", "")).lower() for invoice in invoices], dtype=object),
+        "number_key": np.array([normalize_invoice_number(invoice.get("invoice_number")) for invoice in invoices], dtype=object),
+        "date": np.array(dates, dtype=object),
+        "gstin": np.array([normalize_gstin(invoice.get("gstin")) for invoice in invoices], dtype=object),
+        "amount": np.array(amounts, dtype=float)
+    }
+
+
+def block_keys(columns: Dict[str, np.ndarray], fields: Tuple[str, ...]) -> List[tuple]:
+    """Each row's values of the given normalized columns (a missing value is "")"""
+    values = [["" if value is None else str(value) for value in columns[field]] for field in fields]
+    return list(zip(*values)) if fields else [()] * len(columns["amount"])
+
+
+class GSTR2BIndex:
+    """
+    Blocking index over GSTR-2B rows, built once per GSTR-2B upload and
+    reused by every reconciliation against it.
+    
+    Rows are grouped by the values of the fields a match has to agree on
+    (normalized supplier GSTIN, parsed invoice date or both, depending on
+    the match weights); each group is kept sorted by total amount so the
+    rows within an invoice's amount tolerance are a contiguous slice. The
+    normalized columns and a fuzzy invoice-number index are kept too.
+    """
+    
+    def __init__(self, invoices: List[Dict]):
+        self.invoices = invoices
+        self.size = len(invoices)
+        self.columns = invoice_columns(invoices)
+        self.numbers = InvoiceNumberIndex(list(self.columns["number_key"]))
+        self._blocks: Dict[Tuple[str, ...], Dict[tuple, np.ndarray]] = {}
+    
+    def blocks(self, fields: Tuple[str, ...]) -> Dict[tuple, np.ndarray]:
+        """
+        Row indices grouped by their values of `fields`, each group sorted by
+        amount (rows without an amount last); built on first use
+        """
+        if fields not in self._blocks:
+            groups: Dict[tuple, List[int]] = {}
+            for idx, key in enumerate(block_keys(self.columns, fields)):
+                groups.setdefault(key, []).append(idx)
+            amounts = self.columns["amount"]
+            self._blocks[fields] = {
+                key: np.asarray(rows)[np.argsort(amounts[rows], kind="stable")]
+                for key, rows in groups.items()
+            }
+        return self._blocks[fields]
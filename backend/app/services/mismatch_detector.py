@@ -1,102 +1,52 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional
 import pandas as pd
-from difflib import SequenceMatcher
+from app.services.match_engine import MatchEngine
+from app.services.match_index import GSTR2BIndex, normalize_invoice_number, parse_amount
+from app.services.reconciliation import ReconciliationState
 
 class MismatchDetector:
     """Handles detection of mismatches between extracted invoices and GSTR2B"""
     
     def __init__(self):
         self.similarity_threshold = 0.85  # For fuzzy matching
+        self.weights = {"invoice_number": 0.4, "date": 0.2, "gstin": 0.2, "amount": 0.2}
+        self.engine = MatchEngine(self.weights, self.similarity_threshold)
     
-    def detect_mismatches(self, extracted_invoices: List[Dict], gstr2b_data: Dict) -> Dict:
+    def build_index(self, gstr2b_data: Dict) -> GSTR2BIndex:
+        """Parse and index GSTR2B data once so it can be reused across reconciliations"""
+        return GSTR2BIndex(self._parse_gstr2b(gstr2b_data))
+    
+    def detect_mismatches(
+        self,
+        extracted_invoices: List[Dict],
+        gstr2b_data: Dict,
+        index: Optional[GSTR2BIndex] = None
+    ) -> Dict:
         """
         Compare extracted invoices with GSTR2B and identify mismatches
         
         Args:
             extracted_invoices: List of extracted invoice data
             gstr2b_data: GSTR2B data containing reported invoices
+            index: Index previously built from the same GSTR2B data
         
         Returns:
             Dictionary with mismatch analysis and report cards
         """
-        gstr2b_invoices = self._parse_gstr2b(gstr2b_data)
-        
-        matched_pairs = []
-        unmatched_extracted = []
-        unmatched_gstr2b = []
-        mismatch_details = []
-        
-        # Track which GSTR2B invoices have been matched
-        matched_gstr2b_indices = set()
-        
-        # Compare each extracted invoice with GSTR2B invoices
-        for extracted in extracted_invoices:
-            if extracted.get("status") == "error":
-                unmatched_extracted.append({
-                    "invoice": extracted,
-                    "reason": "Failed to extract data"
-                })
-                continue
-            
-            best_match = None
-            best_score = 0
-            best_index = None
-            
-            # Find best matching GSTR2B invoice
-            for idx, gstr2b in enumerate(gstr2b_invoices):
-                if idx in matched_gstr2b_indices:
-                    continue
-                
-                score, mismatches = self._calculate_match_score(extracted, gstr2b)
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = (gstr2b, mismatches)
-                    best_index = idx
-            
-            if best_score >= self.similarity_threshold:
-                matched_gstr2b_indices.add(best_index)
-                gstr2b, mismatches = best_match
-                
-                matched_pairs.append({
-                    "extracted": extracted,
-                    "gstr2b": gstr2b,
-                    "match_score": best_score,
-                    "mismatches": mismatches
-                })
-                
-                if mismatches:
-                    mismatch_details.append({
-                        "invoice_number": extracted.get("invoice_number", "UNKNOWN"),
-                        "match_score": best_score,
-                        "issues": mismatches
-                    })
-            else:
-                unmatched_extracted.append({
-                    "invoice": extracted,
-                    "reason": "No matching invoice in GSTR2B"
-                })
-        
-        # Remaining GSTR2B invoices that weren't matched
-        for idx, gstr2b in enumerate(gstr2b_invoices):
-            if idx not in matched_gstr2b_indices:
-                unmatched_gstr2b.append(gstr2b)
-        
-        return {
-            "status": "completed",
-            "summary": {
-                "total_extracted": len(extracted_invoices),
-                "total_gstr2b": len(gstr2b_invoices),
-                "matched": len(matched_pairs),
-                "unmatched_extracted": len(unmatched_extracted),
-                "unmatched_gstr2b": len(unmatched_gstr2b),
-                "mismatch_count": len(mismatch_details)
-            },
-            "matched_pairs": matched_pairs,
-            "unmatched_extracted": unmatched_extracted,
-            "unmatched_gstr2b": unmatched_gstr2b,
-            "mismatches": mismatch_details
-        }
+        return self.reconcile(extracted_invoices, gstr2b_data, index).analysis()
+    
+    def reconcile(
+        self,
+        extracted_invoices: List[Dict],
+        gstr2b_data: Dict,
+        index: Optional[GSTR2BIndex] = None
+    ) -> ReconciliationState:
+        """Match invoices and keep the state needed to re-match them incrementally after edits"""
+        return ReconciliationState(self, extracted_invoices, index or self.build_index(gstr2b_data))
+    
+    def gstr2b_rows(self, gstr2b_data: Dict) -> List[Dict]:
+        """Normalized GSTR2B rows, in the order compact results refer to them"""
+        return self._parse_gstr2b(gstr2b_data)
     
     def _parse_gstr2b(self, gstr2b_data: Dict) -> List[Dict]:
         """Parse GSTR2B data into standardized format"""
@@ -127,59 +77,46 @@ class MismatchDetector:
         
         return normalized
     
-    def _calculate_match_score(self, extracted: Dict, gstr2b: Dict) -> Tuple[float, List[str]]:
-        """
-        Calculate similarity score between extracted and GSTR2B invoice
-        
-        Returns:
-            Tuple of (score, list of mismatches)
-        """
+    def suggest_closest(self, unmatched: List[Dict], index: GSTR2BIndex, k: int = 3):
+        """Attach the GSTR2B rows with the most similar invoice numbers, to help manual review"""
+        if not unmatched or not index.size:
+            return
+        
+        numbers = [normalize_invoice_number(entry["invoice"].get("invoice_number")) for entry in unmatched]
+        for entry, nearest in zip(unmatched, index.numbers.top_k(numbers, k=k)):
+            entry["closest_gstr2b"] = [
+                {
+                    "invoice_number": index.invoices[row]["invoice_number"],
+                    "gstin": index.invoices[row]["gstin"],
+                    "similarity": round(similarity, 3)
+                }
+                for row, similarity in nearest
+            ]
+    
+    def describe_mismatches(self, extracted: Dict, gstr2b: Dict, sub_scores: Dict[str, float]) -> List[str]:
+        """Human-readable list of the fields that differ in a matched pair"""
         mismatches = []
-        scores = []
         
-        # Invoice number comparison (high weight)
-        inv_num_score = self._string_similarity(
-            str(extracted.get("invoice_number", "")),
-            str(gstr2b.get("invoice_number", ""))
-        )
-        scores.append(inv_num_score * 0.4)
-        if inv_num_score < 0.9:
+        if sub_scores["invoice_number"] < 0.9:
             mismatches.append(f"Invoice number mismatch: {extracted.get('invoice_number')} vs {gstr2b.get('invoice_number')}")
-        
-        # Date comparison (medium weight)
-        date_score = 1.0 if extracted.get("invoice_date") == gstr2b.get("invoice_date") else 0.0
-        scores.append(date_score * 0.2)
-        if date_score < 1.0:
+        if sub_scores["date"] < 1.0:
             mismatches.append(f"Date mismatch: {extracted.get('invoice_date')} vs {gstr2b.get('invoice_date')}")
-        
-        # GSTIN comparison (medium weight)
-        gstin_score = 1.0 if extracted.get("gstin") == gstr2b.get("gstin") else 0.0
-        scores.append(gstin_score * 0.2)
-        if gstin_score < 1.0:
+        if sub_scores["gstin"] < 1.0:
             mismatches.append(f"GSTIN mismatch: {extracted.get('gstin')} vs {gstr2b.get('gstin')}")
         
-        # Amount comparison (high weight, allow 5% variance)
-        ext_amount = float(extracted.get("total_amount", 0))
-        gstr_amount = float(gstr2b.get("total_amount", 0))
-        if gstr_amount > 0:
-            amount_diff_percent = abs(ext_amount - gstr_amount) / gstr_amount * 100
-            amount_score = max(0, 1 - (amount_diff_percent / 100))
-        else:
-            amount_score = 0.0
-        
-        scores.append(amount_score * 0.2)
-        if amount_score < 0.95:
+        # Amounts within 5% of the GSTR-2B figure are accepted
+        if sub_scores["amount"] < 0.95:
+            ext_amount = parse_amount(extracted.get("total_amount", 0))
+            gstr_amount = parse_amount(gstr2b.get("total_amount", 0))
             mismatches.append(f"Amount mismatch: {ext_amount} vs {gstr_amount}")
         
-        overall_score = sum(scores)
-        return overall_score, mismatches
-    
-    def _string_similarity(self, str1: str, str2: str) -> float:
-        """Calculate string similarity ratio"""
-        return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+        return mismatches
     
-    def generate_report_card(self, mismatch_data: Dict) -> Dict:
-        """Generate detailed report card for findings"""
+    def generate_report_card(self, mismatch_data: Dict, include_detail: bool = True) -> Dict:
+        """
+        Generate detailed report card for findings (only the summary with
+        `include_detail=False`, which also accepts compact results)
+        """
         summary = mismatch_data["summary"]
         
         report_card = {
@@ -193,13 +130,14 @@ class MismatchDetector:
                 "missing_from_gstr2b": summary["unmatched_extracted"],
                 "extra_in_gstr2b": summary["unmatched_gstr2b"],
                 "compliance_status": self._get_compliance_status(summary)
-            },
-            "detail": {
+            }
+        }
+        if include_detail:
+            report_card["detail"] = {
                 "mismatches": mismatch_data["mismatches"],
                 "unmatched_extracted": mismatch_data["unmatched_extracted"],
                 "unmatched_gstr2b": mismatch_data["unmatched_gstr2b"]
             }
-        }
         
         return report_card
     
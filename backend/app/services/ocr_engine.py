@@ -0,0 +1,227 @@
+import sys
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import pytesseract
+from PIL import Image
+import PyPDF2
+from app.config import OCR_WORKERS, OCR_BACKEND, OCR_LANG, TESSDATA_PATH
+from app.services.pdf_rasterizer import iter_page_images, plan_windows
+from app.services.image_preprocessor import ImagePreprocessor
+
+try:
+    import tesserocr
+except ImportError:  # optional: pytesseract is used instead
+    tesserocr = None
+
+# Worker-side functions. They run inside the process pool, so they must stay
+# module-level (picklable). Importing this module also imports app.config,
+# which applies the Tesseract path in freshly spawned worker processes.
+
+# One Tesseract instance per worker process, created once and reused so the
+# language model is only loaded at startup
+_tess_api = None
+
+
+def use_tesserocr() -> bool:
+    return tesserocr is not None and OCR_BACKEND != "pytesseract"
+
+
+def report_backend():
+    """Say which OCR backend is active, loudly when tesserocr was wanted but is missing"""
+    if use_tesserocr():
+        print("[OCR] Using tesserocr (persistent in-process Tesseract API)", file=sys.stderr)
+    elif OCR_BACKEND == "pytesseract":
+        print("[OCR] Using pytesseract (OCR_BACKEND=pytesseract)", file=sys.stderr)
+    else:
+        print(
+            f"[OCR] WARNING: tesserocr is not installed (OCR_BACKEND={OCR_BACKEND}); falling back to "
+            "pytesseract, which starts a Tesseract subprocess and reloads the model for every page. "
+            "Install tesserocr (needs the libtesseract headers) for the faster path.",
+            file=sys.stderr
+        )
+
+
+def _get_tess_api():
+    global _tess_api
+    if _tess_api is None:
+        kwargs = {"lang": OCR_LANG}
+        if TESSDATA_PATH:
+            kwargs["path"] = TESSDATA_PATH
+        _tess_api = tesserocr.PyTessBaseAPI(**kwargs)
+    return _tess_api
+
+
+def init_worker():
+    """Process-pool initializer: load the Tesseract model before the first page arrives"""
+    if use_tesserocr():
+        _get_tess_api()
+
+
+def extract_pdf_text_layer(pdf_path: str) -> Tuple[List[str], List[Tuple[float, float]]]:
+    """Read the embedded text layer of a PDF; returns (page_texts, page_sizes_in_points)"""
+    texts = []
+    sizes = []
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            texts.append(page.extract_text() or "")
+            sizes.append((float(page.mediabox.width), float(page.mediabox.height)))
+    return texts, sizes
+
+
+def estimate_pages(file_path: str) -> int:
+    """Page count from the PDF page tree without extracting anything; 1 for images or unreadable files"""
+    if not file_path.lower().endswith(".pdf"):
+        return 1
+    try:
+        with open(file_path, "rb") as f:
+            return max(1, len(PyPDF2.PdfReader(f).pages))
+    except Exception:
+        return 1
+
+
+def ocr_with_confidence(image: Image.Image) -> Tuple[str, float]:
+    """
+    OCR an image with the configured backend.
+    
+    Returns:
+        Tuple of (text, mean word confidence 0-100)
+    """
+    if use_tesserocr():
+        return ocr_with_tesserocr(image)
+    return ocr_with_pytesseract(image)
+
+
+def ocr_with_tesserocr(image: Image.Image) -> Tuple[str, float]:
+    """OCR through the persistent in-process API, handing over raw pixels (no temp files)"""
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    bytes_per_pixel = 1 if image.mode == "L" else 3
+    
+    api = _get_tess_api()
+    try:
+        api.SetImageBytes(
+            image.tobytes(), image.width, image.height,
+            bytes_per_pixel, image.width * bytes_per_pixel
+        )
+        return api.GetUTF8Text(), float(api.MeanTextConf())
+    finally:
+        api.Clear()
+
+
+def ocr_with_pytesseract(image: Image.Image) -> Tuple[str, float]:
+    """OCR through the tesseract CLI, rebuilding text line by line from word-level output"""
+    data = pytesseract.image_to_data(image, lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for index, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        lines.setdefault(key, []).append(word)
+        confidence = float(data["conf"][index])
+        if confidence >= 0:
+            confidences.append(confidence)
+    
+    text = "\n".join(" ".join(words) for words in lines.values())
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, round(mean_confidence, 1)
+
+
+def ocr_image_file(image_path: str, preprocess: bool = True, dpi: int = 300) -> Tuple[str, float]:
+    """OCR a single image file, downscaled to roughly `dpi` when preprocessing"""
+    with Image.open(image_path) as image:
+        if preprocess:
+            image = ImagePreprocessor(target_dpi=dpi).process(image)
+        return ocr_with_confidence(image)
+
+
+def ocr_pdf_window(
+    pdf_path: str,
+    page_numbers: List[int],
+    dpi: int = 300,
+    preprocess: bool = True
+) -> Dict[int, Tuple[str, float]]:
+    """Rasterize and OCR a window of PDF pages (1-based), one page image at a time"""
+    preprocessor = ImagePreprocessor(target_dpi=dpi) if preprocess else None
+    results = {}
+    for page_number, image in iter_page_images(pdf_path, page_numbers, dpi, window=len(page_numbers)):
+        if preprocessor:
+            image = preprocessor.process(image, source_dpi=dpi)
+        results[page_number] = ocr_with_confidence(image)
+    return results
+
+
+class OCREngine:
+    """
+    Runs Tesseract and PDF rasterization in a dedicated process pool so the
+    event loop stays free while pages are being OCR'd.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or OCR_WORKERS
+        report_backend()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker)
+    
+    def submit(self, fn, *args) -> asyncio.Future:
+        """Schedule a picklable function on the pool and return an awaitable future"""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, fn, *args)
+    
+    async def extract_text_layer(self, pdf_path: str) -> Tuple[List[str], List[Tuple[float, float]]]:
+        return await self.submit(extract_pdf_text_layer, pdf_path)
+    
+    async def ocr_image(self, image_path: str, preprocess: bool = True, dpi: int = 300) -> Tuple[str, float]:
+        return await self.submit(ocr_image_file, image_path, preprocess, dpi)
+    
+    async def ocr_pdf_pages(
+        self,
+        pdf_path: str,
+        page_numbers: List[int],
+        page_bytes: int,
+        dpi: int = 300,
+        preprocess: bool = True,
+        on_window: Optional[Callable[[Dict[int, Tuple[str, float]]], None]] = None
+    ) -> Dict[int, Tuple[str, float]]:
+        """
+        OCR the given pages in parallel windows, returning {page_number: (text, confidence)}.
+        The number of windows in flight is capped so that one job's rasters
+        stay within RASTER_JOB_MEMORY_MB. `on_window` is called with each
+        window's results as soon as it is done.
+        """
+        windows, in_flight = plan_windows(page_numbers, page_bytes)
+        limit = asyncio.Semaphore(min(in_flight, self.max_workers))
+        
+        async def run(window: List[int]) -> Dict[int, Tuple[str, float]]:
+            async with limit:
+                result = await self.submit(ocr_pdf_window, pdf_path, window, dpi, preprocess)
+            if on_window:
+                on_window(result)
+            return result
+        
+        results = {}
+        for result in await asyncio.gather(*(run(window) for window in windows)):
+            results.update(result)
+        return results
+    
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_engine: Optional[OCREngine] = None
+
+
+def get_ocr_engine() -> OCREngine:
+    """Return the process-wide OCR engine, starting its pool on first use"""
+    global _engine
+    if _engine is None:
+        _engine = OCREngine()
+    return _engine
+
+
+def shutdown_ocr_engine():
+    global _engine
+    if _engine is not None:
+        _engine.shutdown()
+        _engine = None
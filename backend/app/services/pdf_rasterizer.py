@@ -0,0 +1,79 @@
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+from PIL import Image
+from pdf2image import convert_from_path
+from app.config import RASTER_SCRATCH_DIR, RASTER_WINDOW_PAGES, RASTER_JOB_MEMORY_MB
+
+# Pages whose embedded text layer is shorter than this are treated as scanned
+MIN_TEXT_LAYER_CHARS = 100
+
+
+def page_pixel_bytes(width_pt: float, height_pt: float, dpi: int) -> int:
+    """Approximate size of one grayscale (8-bit) raster of a page at the given DPI"""
+    return int((width_pt / 72 * dpi) * (height_pt / 72 * dpi))
+
+
+def plan_windows(
+    page_numbers: List[int],
+    page_bytes: int,
+    memory_limit: Optional[int] = None,
+    max_window: Optional[int] = None
+) -> Tuple[List[List[int]], int]:
+    """
+    Split pages into rasterization windows that respect the per-job memory cap.
+    
+    Returns:
+        Tuple of (windows, max number of windows that may be in flight at once)
+    """
+    memory_limit = memory_limit or RASTER_JOB_MEMORY_MB * 1024 * 1024
+    max_window = max_window or RASTER_WINDOW_PAGES
+    page_bytes = max(page_bytes, 1)
+    
+    window = max(1, min(max_window, memory_limit // page_bytes))
+    windows = [page_numbers[i:i + window] for i in range(0, len(page_numbers), window)]
+    in_flight = max(1, memory_limit // (window * page_bytes))
+    return windows, in_flight
+
+
+def _contiguous_runs(page_numbers: List[int], window: int) -> Iterator[Tuple[int, int]]:
+    """Group sorted page numbers into (first, last) runs of at most `window` pages"""
+    start = prev = None
+    for page in sorted(page_numbers):
+        if start is not None and page == prev + 1 and page - start < window:
+            prev = page
+            continue
+        if start is not None:
+            yield start, prev
+        start = prev = page
+    if start is not None:
+        yield start, prev
+
+
+def iter_page_images(
+    pdf_path: str,
+    page_numbers: List[int],
+    dpi: int = 300,
+    window: Optional[int] = None
+) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Yield (page_number, grayscale image) for the requested pages.
+    
+    Pages are rendered `window` at a time into a scratch directory (tmpfs
+    when available) and opened one by one, so at most one window of rasters
+    exists at any moment. Each image is closed once the consumer moves on.
+    """
+    window = window or RASTER_WINDOW_PAGES
+    for first, last in _contiguous_runs(page_numbers, window):
+        with tempfile.TemporaryDirectory(prefix="gst_raster_", dir=RASTER_SCRATCH_DIR) as scratch:
+            paths = convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=first,
+                last_page=last,
+                grayscale=True,
+                output_folder=scratch,
+                paths_only=True
+            )
+            for page_number, path in zip(range(first, last + 1), paths):
+                with Image.open(path) as image:
+                    yield page_number, image
@@ -0,0 +1,240 @@
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from app.services.match_index import GSTR2BIndex
+
+# Per-field sub-scores of a candidate pair, keyed like MatchEngine.SCORE_FIELDS
+PairScore = Tuple[float, Dict[str, float]]
+
+
+class ReconciliationState:
+    """
+    Reconciliation of one session's extracted invoices against an indexed
+    GSTR-2B, kept up to date across manual edits.
+    
+    Holds every qualifying (invoice, GSTR-2B row) pair, the current
+    assignment and each invoice's report entry. The optimal assignment is
+    solved separately per connected component of the pair graph, so editing
+    an invoice rescores only that invoice, then re-solves the component it
+    joins and the one holding the row it gave up; the result is the same as
+    matching everything again. Every other invoice keeps its match and entry.
+    """
+    
+    def __init__(self, detector, extracted_invoices: List[Dict], index: GSTR2BIndex):
+        self.detector = detector
+        self.index = index
+        self._rebuild(extracted_invoices)
+    
+    def _rebuild(self, extracted_invoices: List[Dict]):
+        self.extracted = list(extracted_invoices)
+        self.pairs_by_row: Dict[int, Dict[int, PairScore]] = {}
+        self.pairs_by_col: Dict[int, Dict[int, PairScore]] = {}
+        self.assignment: Dict[int, int] = {}
+        self.assigned_col: Dict[int, int] = {}
+        self._entries: Dict[int, Tuple[str, Dict]] = {}
+        
+        rows = range(len(self.extracted))
+        self._add_pairs(rows)
+        self._solve(rows)
+    
+    def update(self, invoices: List[Dict]) -> Set[int]:
+        """
+        Bring the state in line with a full edited invoice list.
+        
+        Returns:
+            Positions of the invoices that changed
+        """
+        if len(invoices) != len(self.extracted):
+            # Rows were added or removed; positions no longer line up
+            self._rebuild(invoices)
+            return set(range(len(invoices)))
+        
+        changes = {
+            position: invoice for position, invoice in enumerate(invoices)
+            if invoice != self.extracted[position]
+        }
+        self.apply_changes(changes)
+        return set(changes)
+    
+    def apply_changes(self, changes: Dict[int, Dict]):
+        """Replace the invoices at the given positions and re-match the affected rows"""
+        if not changes:
+            return
+        
+        for position, invoice in changes.items():
+            self.extracted[position] = invoice
+            for col in self.pairs_by_row.pop(position, {}):
+                self.pairs_by_col[col].pop(position, None)
+        self._add_pairs(changes)
+        
+        released = [self.assignment[position] for position in changes if position in self.assignment]
+        self._solve(self._connected(changes, released))
+    
+    def _connected(self, positions: Iterable[int], cols: Iterable[int]) -> Set[int]:
+        """Invoices linked to the given invoices or GSTR-2B rows through qualifying pairs"""
+        found = set(positions)
+        seen_cols = set(cols)
+        pending_rows, pending_cols = list(found), list(seen_cols)
+        while pending_rows or pending_cols:
+            while pending_cols:
+                for position in self.pairs_by_col.get(pending_cols.pop(), {}):
+                    if position not in found:
+                        found.add(position)
+                        pending_rows.append(position)
+            while pending_rows:
+                for col in self.pairs_by_row.get(pending_rows.pop(), {}):
+                    if col not in seen_cols:
+                        seen_cols.add(col)
+                        pending_cols.append(col)
+        return found
+    
+    def analysis(self) -> Dict:
+        """The reconciliation in the `MismatchDetector.detect_mismatches` result shape"""
+        return expand_results(self.results(), self.extracted, self.index.invoices)
+    
+    def results(self) -> Dict:
+        """
+        Compact form of `analysis()` for storing and sending: invoices are
+        referred to by position instead of copied ("invoice" indexes the
+        extracted invoices, "gstr2b" the indexed GSTR-2B rows), and the
+        mismatch details are left to be derived from the matched pairs.
+        """
+        matched_pairs = []
+        unmatched_extracted = []
+        for position, kind, entry in self.entries():
+            if kind == "matched":
+                matched_pairs.append({
+                    "invoice": position,
+                    "gstr2b": self.assignment[position],
+                    "match_score": entry["match_score"],
+                    "mismatches": entry["mismatches"]
+                })
+            else:
+                unmatched_extracted.append({"invoice": position, **{
+                    key: value for key, value in entry.items() if key != "invoice"
+                }})
+        
+        unmatched_gstr2b = [col for col in range(self.index.size) if col not in self.assigned_col]
+        
+        return {
+            "status": "completed",
+            "summary": {
+                "total_extracted": len(self.extracted),
+                "total_gstr2b": self.index.size,
+                "matched": len(matched_pairs),
+                "unmatched_extracted": len(unmatched_extracted),
+                "unmatched_gstr2b": len(unmatched_gstr2b),
+                "mismatch_count": sum(1 for pair in matched_pairs if pair["mismatches"])
+            },
+            "matched_pairs": matched_pairs,
+            "unmatched_extracted": unmatched_extracted,
+            "unmatched_gstr2b": unmatched_gstr2b
+        }
+    
+    def entries(self) -> Iterator[Tuple[int, str, Dict]]:
+        """(position, "matched" or "unmatched", report entry) for every invoice, in order"""
+        for position in range(len(self.extracted)):
+            kind, entry = self._entries[position]
+            yield position, kind, entry
+    
+    def unassigned_gstr2b(self) -> Iterator[Dict]:
+        """GSTR-2B rows no invoice is matched to"""
+        for col, gstr2b in enumerate(self.index.invoices):
+            if col not in self.assigned_col:
+                yield gstr2b
+    
+    def _add_pairs(self, positions: Iterable[int]):
+        """Score the given invoices against the index and record their qualifying pairs"""
+        positions = [
+            position for position in positions
+            if self.extracted[position].get("status") != "error"
+        ]
+        invoices = [self.extracted[position] for position in positions]
+        
+        for row, col, score, sub_scores in self.detector.engine.candidate_pairs(invoices, self.index):
+            position = positions[row]
+            self.pairs_by_row.setdefault(position, {})[col] = (score, sub_scores)
+            self.pairs_by_col.setdefault(col, {})[position] = (score, sub_scores)
+    
+    def _solve(self, positions: Iterable[int]):
+        """Optimally re-assign the given invoices among the rows no other invoice holds"""
+        positions = set(positions)
+        for position in positions:
+            if position in self.assignment:
+                del self.assigned_col[self.assignment.pop(position)]
+        
+        pairs = [
+            (position, col, score, sub_scores)
+            for position in positions
+            for col, (score, sub_scores) in self.pairs_by_row.get(position, {}).items()
+            if col not in self.assigned_col
+        ]
+        for position, col, _, _ in self.detector.engine.assign(pairs):
+            self.assignment[position] = col
+            self.assigned_col[col] = position
+        
+        self._refresh_entries(sorted(positions))
+    
+    def _refresh_entries(self, positions: List[int]):
+        unmatched = []
+        for position in positions:
+            extracted = self.extracted[position]
+            
+            if extracted.get("status") == "error":
+                self._entries[position] = ("unmatched", {
+                    "invoice": extracted,
+                    "reason": "Failed to extract data"
+                })
+            elif position in self.assignment:
+                col = self.assignment[position]
+                score, sub_scores = self.pairs_by_row[position][col]
+                gstr2b = self.index.invoices[col]
+                self._entries[position] = ("matched", {
+                    "extracted": extracted,
+                    "gstr2b": gstr2b,
+                    "match_score": score,
+                    "mismatches": self.detector.describe_mismatches(extracted, gstr2b, sub_scores)
+                })
+            else:
+                entry = {
+                    "invoice": extracted,
+                    "reason": "No matching invoice in GSTR2B"
+                }
+                self._entries[position] = ("unmatched", entry)
+                unmatched.append(entry)
+        
+        self.detector.suggest_closest(unmatched, self.index)
+
+
+def expand_results(results: Dict, extracted_invoices: List[Dict], gstr2b_rows: List[Dict]) -> Dict:
+    """
+    The `analysis()` shape of compact `results`, with the invoices they refer
+    to filled back in from the session's invoices and normalized GSTR-2B rows
+    """
+    matched_pairs = [
+        {
+            "extracted": extracted_invoices[pair["invoice"]],
+            "gstr2b": gstr2b_rows[pair["gstr2b"]],
+            "match_score": pair["match_score"],
+            "mismatches": pair["mismatches"]
+        }
+        for pair in results["matched_pairs"]
+    ]
+    return {
+        "status": results["status"],
+        "summary": results["summary"],
+        "matched_pairs": matched_pairs,
+        "unmatched_extracted": [
+            {"invoice": extracted_invoices[entry["invoice"]], **{
+                key: value for key, value in entry.items() if key != "invoice"
+            }}
+            for entry in results["unmatched_extracted"]
+        ],
+        "unmatched_gstr2b": [gstr2b_rows[col] for col in results["unmatched_gstr2b"]],
+        "mismatches": [
+            {
+                "invoice_number": pair["extracted"].get("invoice_number", "UNKNOWN"),
+                "match_score": pair["match_score"],
+                "issues": pair["mismatches"]
+            }
+            for pair in matched_pairs if pair["mismatches"]
+        ]
+    }
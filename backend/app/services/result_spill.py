@@ -0,0 +1,253 @@
+import os
+import uuid
+import pickle
+import shutil
+import tempfile
+import orjson
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.config import RESULTS_DIR
+
+# Collections a session's results are spilled to
+SPILL_COLLECTIONS = ("invoices", "matches", "mismatches", "unmatched")
+
+
+class StaleCursor(ValueError):
+    """The collection was rewritten since the cursor was issued"""
+
+
+class ResultSpill:
+    """
+    Session results on disk, one append-only JSONL file per collection.
+    
+    A collection is encoded and written one row per line from an iterator,
+    so a 50k-invoice month is never serialized as one document (the
+    extracted invoices are written once their job is finalized, not as each
+    file finishes). Pages are read back by seeking to a byte-offset cursor,
+    so serving a page costs the same whatever its position. A rewrite (after edits or a new detection run)
+    goes to a new file that replaces the old one. Every file starts with a
+    "#<generation>" line; cursors carry the generation and are refused once
+    the file has been rewritten.
+    The session's large lists live here too rather than in the session
+    store, as does the pickled matching state of the last detection run or
+    edit, so an edit handled by another process does not have to re-solve
+    the whole month; a session's spill is deleted along with the session.
+    """
+    
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = base_dir or RESULTS_DIR
+        os.makedirs(self.base_dir, exist_ok=True)
+    
+    def path(self, session_id: str, collection: str) -> str:
+        return os.path.join(self.base_dir, session_id, f"{collection}.jsonl")
+    
+    def exists(self, session_id: str, collection: str) -> bool:
+        return os.path.exists(self.path(session_id, collection))
+    
+    def write(self, session_id: str, collection: str, rows: Iterable[Dict]) -> int:
+        """Replace the collection with `rows`, appending them one line at a time; returns the row count"""
+        path = self.path(session_id, collection)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A temp file of its own, so concurrent writers (threads included) never share one
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{collection}.", suffix=".tmp")
+        count = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(f"#{uuid.uuid4().hex[:12]}\n".encode("ascii"))
+                for row in rows:
+                    f.write(orjson.dumps(row, default=str, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS))
+                    count += 1
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return count
+    
+    def read(self, session_id: str, collection: str) -> Iterator[Dict]:
+        """Every row of the collection, in order"""
+        with open(self.path(session_id, collection), "rb") as f:
+            self._generation(f)
+            for line in f:
+                yield orjson.loads(line)
+    
+    def page(
+        self,
+        session_id: str,
+        collection: str,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        fields: Optional[List[str]] = None,
+        statuses: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Up to `limit` rows after `cursor`, keeping only rows whose "status" is
+        in `statuses` and only the requested `fields` (dotted paths reach into
+        nested records, e.g. "extracted.invoice_number").
+        
+        Returns:
+            {"items": [...], "next_cursor": <cursor or None at the end>}
+        """
+        path = self.path(session_id, collection)
+        with open(path, "rb") as f:
+            generation, start = self._generation(f)
+            offset = self._parse_cursor(cursor, generation)
+            f.seek(max(offset, start))
+            
+            items = []
+            while len(items) < limit:
+                line = f.readline()
+                if not line:
+                    return {"items": items, "next_cursor": None}
+                row = orjson.loads(line)
+                if statuses and row.get("status") not in statuses:
+                    continue
+                items.append(project(row, fields) if fields else row)
+            
+            offset = f.tell()
+            more = f.read(1) != b""
+            return {"items": items, "next_cursor": f"{generation}.{offset:x}" if more else None}
+    
+    @staticmethod
+    def _generation(f: BinaryIO) -> Tuple[str, int]:
+        """The file's generation and the offset of its first row"""
+        header = f.readline()
+        if header.startswith(b"#"):
+            return header[1:].strip().decode("ascii"), f.tell()
+        # Written before files had a generation line
+        f.seek(0)
+        return "0", 0
+    
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str], generation: str) -> int:
+        if not cursor:
+            return 0
+        try:
+            cursor_generation, offset = cursor.split(".")
+            offset = int(offset, 16)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        if cursor_generation != generation:
+            raise StaleCursor("Results changed since this cursor was issued; start again without a cursor")
+        return offset
+    
+    def state_path(self, session_id: str) -> str:
+        return os.path.join(self.base_dir, session_id, "reconciliation.pkl")
+    
+    def write_state(self, session_id: str, state):
+        """Replace the session's saved matching state"""
+        path = self.state_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    
+    def read_state(self, session_id: str):
+        """The saved matching state, or None if there is none"""
+        try:
+            with open(self.state_path(session_id), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def discard_state(self, session_id: str):
+        """Remove the matching state once it no longer applies (e.g. a new GSTR2B upload)"""
+        try:
+            os.remove(self.state_path(session_id))
+        except FileNotFoundError:
+            pass
+    
+    def report_path(self, session_id: str) -> str:
+        """Where the session's Excel workbook is kept between downloads"""
+        return os.path.join(self.base_dir, session_id, "report.xlsx")
+    
+    def discard_report(self, session_id: str):
+        """Remove the workbook once it no longer reflects the session; the next download rebuilds it"""
+        try:
+            os.remove(self.report_path(session_id))
+        except FileNotFoundError:
+            pass
+    
+    def discard(self, session_id: str, collections: Iterable[str]):
+        """Remove collections that no longer apply"""
+        for collection in collections:
+            try:
+                os.remove(self.path(session_id, collection))
+            except FileNotFoundError:
+                pass
+    
+    def delete(self, session_id: str):
+        shutil.rmtree(os.path.join(self.base_dir, session_id), ignore_errors=True)
+
+
+def project(row: Dict, fields: List[str]) -> Dict:
+    """Copy of `row` with only the given (possibly dotted) fields"""
+    projected: Dict = {}
+    for field in fields:
+        value, target, parts = row, projected, field.split(".")
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+
+def invoice_rows(invoices: Iterable[Dict]) -> Iterator[Dict]:
+    """Extracted invoices with their position, which /update-excel edits refer to"""
+    for index, invoice in enumerate(invoices):
+        yield {"index": index, **invoice}
+
+
+def reconciliation_rows(state) -> Dict[str, Iterator[Dict]]:
+    """Rows of the "matches", "mismatches" and "unmatched" collections of a ReconciliationState"""
+    def matches() -> Iterator[Dict]:
+        for index, kind, entry in state.entries():
+            if kind == "matched":
+                yield {"index": index, "status": "mismatch" if entry["mismatches"] else "matched", **entry}
+    
+    def mismatches() -> Iterator[Dict]:
+        for index, kind, entry in state.entries():
+            if kind == "matched" and entry["mismatches"]:
+                yield {
+                    "index": index,
+                    "status": "mismatch",
+                    "invoice_number": entry["extracted"].get("invoice_number", "UNKNOWN"),
+                    "match_score": entry["match_score"],
+                    "issues": entry["mismatches"]
+                }
+    
+    def unmatched() -> Iterator[Dict]:
+        for index, kind, entry in state.entries():
+            if kind == "unmatched":
+                yield {"index": index, "status": "missing_from_gstr2b", **entry}
+        for gstr2b in state.unassigned_gstr2b():
+            yield {"index": None, "status": "extra_in_gstr2b", "gstr2b": gstr2b}
+    
+    return {"matches": matches(), "mismatches": mismatches(), "unmatched": unmatched()}
+
+
+def spill_reconciliation(spill: ResultSpill, session_id: str, state) -> Dict[str, int]:
+    """Write all reconciliation collections and the state itself; returns the row count of each collection"""
+    counts = {
+        collection: spill.write(session_id, collection, rows)
+        for collection, rows in reconciliation_rows(state).items()
+    }
+    spill.write_state(session_id, state)
+    return counts
+
+
+_result_spill: Optional[ResultSpill] = None
+
+
+def get_result_spill() -> ResultSpill:
+    global _result_spill
+    if _result_spill is None:
+        _result_spill = ResultSpill()
+    return _result_spill
@@ -0,0 +1,202 @@
+import re
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+GSTIN_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+GSTIN_PATTERN = re.compile(r"\b(\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z])\b")
+
+INVOICE_NUMBER_VALUE = r"([A-Z0-9][A-Z0-9/\-_.]{0,30}[A-Z0-9])"
+INVOICE_NUMBER_PATTERN = re.compile(
+    r"(?:tax\s+)?(?:invoice|inv|bill)\s*(?:no|number|num|#)\.?\s*[:\-#]?\s*" + INVOICE_NUMBER_VALUE,
+    re.IGNORECASE
+)
+
+DATE_VALUE = (
+    r"(\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}"
+    r"|\d{1,2}[\s\-]?[A-Za-z]{3,9}[\s\-,]*\d{2,4}"
+    r"|\d{4}-\d{2}-\d{2})"
+)
+INVOICE_DATE_PATTERN = re.compile(
+    r"(?:(?:invoice|bill|inv\.?)\s*date[d]?|date\s+of\s+(?:invoice|issue))\s*[:\-]?\s*" + DATE_VALUE,
+    re.IGNORECASE
+)
+# A bare "Date" may be any date on the page; "Due Date", "PO Date" and the
+# like are told apart by the word in front of the label
+BARE_DATE_PATTERN = re.compile(r"(?<![A-Za-z])(\w*\.?)[ \t]*\bdate[d]?\s*[:\-]?\s*" + DATE_VALUE, re.IGNORECASE)
+DATE_FORMATS = (
+    "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y", "%d.%m.%y",
+    "%d-%b-%Y", "%d %b %Y", "%d%b%Y", "%d-%B-%Y", "%d %B %Y", "%d %b, %Y", "%d %B, %Y",
+    "%d-%b-%y", "%Y-%m-%d"
+)
+
+# Indian grouping (1,23,456.00) as well as plain and western-grouped numbers
+AMOUNT_VALUE = r"(?:₹|Rs\.?|INR)?\s*(\d{1,3}(?:,\d{2,3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)"
+TOTAL_PATTERN = re.compile(
+    r"(?:grand\s+total|total\s+invoice\s+(?:value|amount)|invoice\s+total|total\s+amount"
+    r"|amount\s+payable|net\s+payable|net\s+amount)[^\d\n]{0,30}?" + AMOUNT_VALUE,
+    re.IGNORECASE
+)
+TAXABLE_PATTERN = re.compile(
+    r"(?:taxable\s+(?:value|amount)|sub\s*-?\s*total)[^\d\n]{0,30}?" + AMOUNT_VALUE,
+    re.IGNORECASE
+)
+TOTAL_TAX_PATTERN = re.compile(r"(?:total\s+tax(?:\s+amount)?|total\s+gst)[^\d\n]{0,30}?" + AMOUNT_VALUE, re.IGNORECASE)
+# The rate (e.g. "9%") is skipped so that the captured number is the tax amount
+COMPONENT_TAX_PATTERN = re.compile(
+    r"\b(CGST|SGST|UTGST|IGST)\b(?:\s*@?\s*\d{1,2}(?:\.\d+)?\s*%)?[^\d\n]{0,20}?" + AMOUNT_VALUE,
+    re.IGNORECASE
+)
+RECIPIENT_LABEL_PATTERN = re.compile(r"buyer|recipient|bill(?:ed)?\s+to|ship(?:ped)?\s+to|consignee|customer", re.IGNORECASE)
+
+REQUIRED_FIELDS = ("invoice_number", "invoice_date", "supplier_gstin", "total_amount")
+
+
+def gstin_check_digit(gstin: str) -> str:
+    """Compute the GSTIN check character (mod-36 checksum over the first 14 characters)"""
+    total = 0
+    for position, char in enumerate(gstin[:14]):
+        value = GSTIN_CHARSET.index(char) * (2 if position % 2 else 1)
+        total += value // 36 + value % 36
+    return GSTIN_CHARSET[(36 - total % 36) % 36]
+
+
+def is_valid_gstin(gstin: Optional[str]) -> bool:
+    if not gstin or not GSTIN_PATTERN.fullmatch(gstin):
+        return False
+    return gstin_check_digit(gstin) == gstin[14]
+
+
+def parse_amount(value: str) -> float:
+    return float(value.replace(",", ""))
+
+
+def parse_date(value: str) -> Optional[str]:
+    """Parse an Indian (day-first) date string into YYYY-MM-DD"""
+    value = re.sub(r"\s+", " ", value.strip())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+class RuleBasedExtractor:
+    """
+    Deterministic invoice field extractor for clean, machine-generated text.
+    
+    Finds the invoice number, date, GSTINs and amounts with compiled regexes,
+    validates GSTIN checksums and cross-checks taxable + tax = total. The
+    returned confidence is that of the weakest required field, so callers
+    can skip Gemini only when every field was found reliably.
+    """
+    
+    def __init__(self, min_confidence: float = 0.9):
+        self.min_confidence = min_confidence
+    
+    def extract(self, text: str) -> Tuple[Dict, float]:
+        """
+        Returns:
+            Tuple of (invoice data in the Gemini output shape, confidence 0-1)
+        """
+        field_confidence = {}
+        
+        invoice_number, field_confidence["invoice_number"] = self._find_invoice_number(text)
+        invoice_date, field_confidence["invoice_date"] = self._find_date(text)
+        supplier_gstin, recipient_gstin, field_confidence["supplier_gstin"] = self._find_gstins(text)
+        amounts, field_confidence["total_amount"] = self._find_amounts(text)
+        
+        data = {
+            "invoice_number": invoice_number,
+            "invoice_date": invoice_date,
+            "gstin": supplier_gstin,
+            "supplier_gstin": supplier_gstin,
+            "recipient_gstin": recipient_gstin,
+            "invoice_amount": amounts["invoice_amount"],
+            "tax_amount": amounts["tax_amount"],
+            "total_amount": amounts["total_amount"],
+            "items": [],
+            "status": "valid",
+            "extraction_method": "rules",
+            "field_confidence": field_confidence
+        }
+        confidence = min(field_confidence[field] for field in REQUIRED_FIELDS)
+        data["extraction_confidence"] = confidence
+        return data, confidence
+    
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.min_confidence
+    
+    def _find_invoice_number(self, text: str) -> Tuple[Optional[str], float]:
+        for match in INVOICE_NUMBER_PATTERN.finditer(text):
+            candidate = match.group(1)
+            # A bare word after "Invoice No" is usually a mis-read label, not a number
+            if any(char.isdigit() for char in candidate):
+                return candidate, 1.0
+        return None, 0.0
+    
+    def _find_date(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        An invoice/bill-labelled date is certain; a bare "Date" not preceded
+        by another word (as in "Due Date") is only likely, so the invoice
+        still goes to Gemini
+        """
+        for match in INVOICE_DATE_PATTERN.finditer(text):
+            parsed = parse_date(match.group(1))
+            if parsed:
+                return parsed, 1.0
+        for match in BARE_DATE_PATTERN.finditer(text):
+            parsed = parse_date(match.group(2))
+            if parsed and not re.search(r"[A-Za-z]", match.group(1)):
+                return parsed, 0.6
+        return None, 0.0
+    
+    def _find_gstins(self, text: str) -> Tuple[Optional[str], Optional[str], float]:
+        """
+        The first checksum-valid GSTIN not labelled as buyer/recipient is the
+        supplier's; a labelled one is recorded as the recipient
+        """
+        supplier = recipient = None
+        for match in GSTIN_PATTERN.finditer(text):
+            gstin = match.group(1)
+            if not is_valid_gstin(gstin):
+                continue
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            context = text[max(0, line_start - 80):match.start()]
+            if recipient is None and RECIPIENT_LABEL_PATTERN.search(context):
+                recipient = gstin
+            elif supplier is None and gstin != recipient:
+                supplier = gstin
+        
+        if supplier:
+            return supplier, recipient, 1.0
+        
+        # GSTIN-shaped strings that fail the checksum are likely OCR errors
+        unchecked = GSTIN_PATTERN.search(text)
+        return (unchecked.group(1) if unchecked else None), recipient, (0.3 if unchecked else 0.0)
+    
+    def _find_amounts(self, text: str) -> Tuple[Dict, float]:
+        totals = [parse_amount(value) for value in TOTAL_PATTERN.findall(text)]
+        taxables = [parse_amount(value) for value in TAXABLE_PATTERN.findall(text)]
+        
+        tax_total = TOTAL_TAX_PATTERN.findall(text)
+        if tax_total:
+            tax = parse_amount(tax_total[-1])
+        else:
+            components = {}
+            for name, value in COMPONENT_TAX_PATTERN.findall(text):
+                # Keep the last figure per tax head (summary rows come after line items)
+                components[name.upper()] = parse_amount(value)
+            tax = sum(components.values()) if components else None
+        
+        total = max(totals) if totals else None
+        taxable = taxables[-1] if taxables else None
+        amounts = {"invoice_amount": taxable, "tax_amount": tax, "total_amount": total}
+        
+        if total is None:
+            return amounts, 0.0
+        if taxable is not None and tax is not None:
+            # Allow for round-off lines of up to one rupee
+            return amounts, (1.0 if abs(taxable + tax - total) <= 1.0 else 0.5)
+        return amounts, 0.7
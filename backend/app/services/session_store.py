@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import (
+    SESSION_STORE_PATH,
+    SESSION_MEMORY_ITEMS,
+    SESSION_TTL_HOURS,
+    SESSION_STORE_MAX_MB,
+    SESSION_TOUCH_SECONDS
+)
+
+# Small, frequently updated fields are stored as columns so progress updates
+# do not rewrite the (large) session blob
+PROGRESS_FIELDS = ("status", "progress", "error", "job_id")
+
+
+class SessionStore:
+    """
+    Session storage shared by all worker processes.
+    
+    Sessions live in a local SQLite database (WAL mode, so several uvicorn
+    workers can read while one writes) as zlib-compressed JSON, with the
+    progress fields in their own columns. A small in-memory LRU tier keeps
+    recently used session objects, including runtime-only state such as the
+    GSTR2B index; a newer copy saved by another process replaces it.
+    Sessions idle for longer than the TTL, and the least recently used ones
+    beyond the size limit, are evicted (and passed to `on_evict`, e.g. to
+    remove data kept outside the store); reads refresh the last-access time at
+    most every `touch_seconds`, so polling a session does not write to the
+    database on every request.
+    
+    Supports `in`, `[]` and `del` like the dict it replaces; changes to a
+    session must be persisted with `save()` or `save_progress()`, which also
+    call `on_change` with the session (e.g. to publish a progress event).
+    `claim_job()` starts a background job on a session atomically, so two
+    processes asked to run the same job do not both start it.
+    `save()` encodes and compresses the whole session, so event-loop code
+    should run it with `asyncio.to_thread`.
+    """
+    
+    def __init__(
+        self,
+        factory: Callable[[Dict], Any],
+        db_path: Optional[str] = None,
+        memory_items: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        touch_seconds: Optional[float] = None,
+        on_change: Optional[Callable[[Any], None]] = None,
+        on_evict: Optional[Callable[[List[str]], None]] = None
+    ):
+        self.factory = factory
+        self.on_change = on_change
+        self.on_evict = on_evict
+        self.db_path = db_path or SESSION_STORE_PATH
+        self.memory_items = memory_items if memory_items is not None else SESSION_MEMORY_ITEMS
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else SESSION_TTL_HOURS * 3600
+        self.max_bytes = max_bytes if max_bytes is not None else SESSION_STORE_MAX_MB * 1024 * 1024
+        self.touch_seconds = touch_seconds if touch_seconds is not None else SESSION_TOUCH_SECONDS
+        
+        # session_id -> (session, data_version)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        # session_id -> when this process last wrote its last_access
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                data_version INTEGER NOT NULL,
+                status TEXT,
+                progress INTEGER,
+                error TEXT,
+                job_id TEXT,
+                job_claimed_at REAL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "job_claimed_at" not in columns:
+            # Stores created before jobs were claimed
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN job_claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+        self._evict()
+    
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+    
+    def __getitem__(self, session_id: str):
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+    
+    def __setitem__(self, session_id: str, session):
+        self.save(session)
+    
+    def __delitem__(self, session_id: str):
+        self.delete(session_id)
+    
+    def get(self, session_id: str):
+        """Return the session, or None if it does not exist or has expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data_version, status, progress, error, job_id FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                self._memory.pop(session_id, None)
+                return None
+            
+            data_version = row[0]
+            cached = self._memory.get(session_id)
+            if cached is not None and cached[1] == data_version:
+                session = cached[0]
+            else:
+                # Not cached, or saved since by another process
+                blob = self._conn.execute(
+                    "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                session = self.factory(json.loads(zlib.decompress(blob)))
+            
+            for field, value in zip(PROGRESS_FIELDS, row[1:]):
+                setattr(session, field, value)
+            
+            now = time.time()
+            if now - self._touched.get(session_id, 0.0) >= self.touch_seconds:
+                self._conn.execute(
+                    "UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id)
+                )
+                self._touched[session_id] = now
+            self._remember(session_id, session, data_version)
+            return session
+    
+    def save(self, session, record: Optional[Dict] = None):
+        """Persist the whole session, or `record` as its stored form when given (e.g. a snapshot taken earlier)"""
+        record = record if record is not None else session.to_dict()
+        blob = zlib.compress(json.dumps(record, separators=(",", ":"), default=str).encode("utf-8"))
+        with self._lock:
+            # The version is read and bumped in one write transaction, so two
+            # processes saving at once never store the same version
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data_version FROM sessions WHERE session_id = ?", (session.session_id,)
+                ).fetchone()
+                data_version = (row[0] if row else 0) + 1
+                now = time.time()
+                # An upsert, so a job claim on the row is kept
+                self._conn.execute(
+                    f"""
+                    INSERT INTO sessions
+                        (session_id, data, size, data_version, status, progress, error, job_id, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET
+                        data = excluded.data, size = excluded.size, data_version = excluded.data_version,
+                        {', '.join(f'{field} = excluded.{field}' for field in PROGRESS_FIELDS)},
+                        last_access = excluded.last_access
+                    """,
+                    (
+                        session.session_id, blob, len(blob), data_version,
+                        *(getattr(session, field) for field in PROGRESS_FIELDS),
+                        now
+                    )
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._touched[session.session_id] = now
+            self._remember(session.session_id, session, data_version)
+        self._evict()
+        if self.on_change:
+            self.on_change(session)
+    
+    def save_progress(self, session):
+        """Persist only the status/progress fields"""
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                f"UPDATE sessions SET {', '.join(f'{field} = ?' for field in PROGRESS_FIELDS)}, last_access = ? "
+                "WHERE session_id = ?",
+                (*(getattr(session, field) for field in PROGRESS_FIELDS), now, session.session_id)
+            )
+            self._touched[session.session_id] = now
+        if self.on_change:
+            self.on_change(session)
+    
+    def claim_job(
+        self,
+        session,
+        job_id: str,
+        status: str,
+        busy_statuses: Tuple[str, ...],
+        stale_seconds: float
+    ) -> bool:
+        """
+        Atomically make `job_id` the session's job and set `status`, unless a
+        job claimed less than `stale_seconds` ago (by any process) is still
+        in one of `busy_statuses`. Returns whether the claim was taken; if not,
+        the session's progress fields are refreshed to the running job's.
+        """
+        with self._lock:
+            now = time.time()
+            claimed = self._conn.execute(
+                f"""
+                UPDATE sessions
+                SET job_id = ?, status = ?, progress = 0, error = NULL, job_claimed_at = ?, last_access = ?
+                WHERE session_id = ?
+                    AND (status IS NULL OR status NOT IN ({', '.join('?' * len(busy_statuses))})
+                         OR job_claimed_at IS NULL OR job_claimed_at < ?)
+                """,
+                (job_id, status, now, now, session.session_id, *busy_statuses, now - stale_seconds)
+            ).rowcount == 1
+            
+            if claimed:
+                values = (status, 0, None, job_id)
+            else:
+                values = self._conn.execute(
+                    f"SELECT {', '.join(PROGRESS_FIELDS)} FROM sessions WHERE session_id = ?",
+                    (session.session_id,)
+                ).fetchone() or (session.status, session.progress, session.error, session.job_id)
+            for field, value in zip(PROGRESS_FIELDS, values):
+                setattr(session, field, value)
+        if claimed and self.on_change:
+            self.on_change(session)
+        return claimed
+    
+    def delete(self, session_id: str):
+        with self._lock:
+            self._memory.pop(session_id, None)
+            self._touched.pop(session_id, None)
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    
+    def _remember(self, session_id: str, session, data_version: int):
+        self._memory[session_id] = (session, data_version)
+        self._memory.move_to_end(session_id)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+    
+    def _evict(self):
+        """Drop expired sessions, then the least recently used beyond the size limit"""
+        with self._lock:
+            cutoff = time.time() - self.ttl_seconds
+            expired = [
+                session_id for (session_id,) in
+                self._conn.execute("SELECT session_id FROM sessions WHERE last_access < ?", (cutoff,))
+            ]
+            
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+            if total > self.max_bytes:
+                for session_id, size in self._conn.execute(
+                    "SELECT session_id, size FROM sessions WHERE last_access >= ? ORDER BY last_access",
+                    (cutoff,)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    expired.append(session_id)
+                    total -= size
+            
+            for session_id in expired:
+                self._memory.pop(session_id, None)
+            # Touch times older than the interval no longer hold back an update
+            self._touched = {
+                session_id: touched for session_id, touched in self._touched.items()
+                if touched > time.time() - self.touch_seconds and session_id not in expired
+            }
+            self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in expired])
+        if expired and self.on_evict:
+            self.on_evict(expired)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,257 @@
+import copy
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from app.services.event_bus import get_event_bus
+from app.services.result_spill import get_result_spill, invoice_rows
+from app.services.session_store import SessionStore
+
+# Large session fields kept in the result spill rather than in the stored
+# session: field -> spill collection
+SPILLED_FIELDS = {
+    "extracted_invoices": "invoices",
+    "gstr2b_data": "gstr2b",
+    "mismatch_results": "results"
+}
+
+# Value of a spilled field that has not been read back yet
+NOT_LOADED = object()
+
+
+class ProcessingSession:
+    """
+    Manages a processing session for documents.
+    
+    The extracted invoices, GSTR2B data and mismatch results live in the
+    session's result spill, not in the stored session, so saving a status
+    change or an edit does not re-encode them. They are read back the first
+    time they are used (`load()` reads them all, off the event loop), and
+    assigning one marks it to be spilled by `save_session`.
+    """
+    
+    def __init__(self, session_id: str, client_name: str, month: str):
+        self.session_id = session_id
+        self.client_name = client_name
+        self.month = month
+        self.status = "initialized"
+        self.progress = 0
+        self._lists = {"extracted_invoices": [], "gstr2b_data": None, "mismatch_results": None}
+        # Spilled fields assigned since the session was last saved, and the
+        # fields whose current value is in the spill
+        self._changed = set()
+        self._spilled = set()
+        # How often each spilled field has been assigned, so a save can tell
+        # whether a field was assigned again while it was being written
+        self._assigned = {field: 0 for field in SPILLED_FIELDS}
+        self.extracted_count = 0
+        self.gstr2b_count = 0
+        self.report_card = None
+        # Match index over the GSTR2B rows, rebuilt only when new data is uploaded
+        self.gstr2b_index = None
+        # Current matching, updated incrementally on manual edits (saved in
+        # the spill; see `rematch`)
+        self.reconciliation = None
+        # Background reconciliation job, if one is running
+        self.job_id = None
+        self.excel_data = None
+        self.error = None
+    
+    @property
+    def extracted_invoices(self) -> List[Dict]:
+        return self._get("extracted_invoices")
+    
+    @extracted_invoices.setter
+    def extracted_invoices(self, invoices: List[Dict]):
+        self._set("extracted_invoices", invoices)
+        self.extracted_count = len(invoices)
+    
+    @property
+    def gstr2b_data(self) -> Optional[Dict]:
+        return self._get("gstr2b_data")
+    
+    @gstr2b_data.setter
+    def gstr2b_data(self, gstr2b_data: Optional[Dict]):
+        self._set("gstr2b_data", gstr2b_data)
+        self.gstr2b_count = len((gstr2b_data or {}).get("invoices", []))
+    
+    @property
+    def mismatch_results(self) -> Optional[Dict]:
+        return self._get("mismatch_results")
+    
+    @mismatch_results.setter
+    def mismatch_results(self, mismatch_results: Optional[Dict]):
+        self._set("mismatch_results", mismatch_results)
+        self.report_card = (mismatch_results or {}).get("report_card")
+    
+    def _get(self, field: str):
+        if self._lists[field] is NOT_LOADED:
+            spill, collection = get_result_spill(), SPILLED_FIELDS[field]
+            if field == "extracted_invoices":
+                self._lists[field] = [
+                    {key: value for key, value in row.items() if key != "index"}
+                    for row in spill.read(self.session_id, collection)
+                ]
+            else:
+                self._lists[field] = next(spill.read(self.session_id, collection))
+        return self._lists[field]
+    
+    def _set(self, field: str, value):
+        self._lists[field] = value
+        self._changed.add(field)
+        self._assigned[field] += 1
+    
+    def has(self, field: str) -> bool:
+        """Whether a spilled field is set, without reading it back"""
+        return self._lists[field] is not None
+    
+    def load(self):
+        """Read back the spilled fields not loaded yet (blocking)"""
+        for field in SPILLED_FIELDS:
+            self._get(field)
+    
+    def snapshot(self) -> Tuple[Dict, Dict, Dict]:
+        """
+        (spilled fields assigned since the last save, their assignment
+        counts, stored record), copied so they can be written from a thread
+        while the session keeps changing on the event loop
+        """
+        changed = {field: copy.copy(self._lists[field]) for field in self._changed}
+        assigned = {field: self._assigned[field] for field in changed}
+        return changed, assigned, copy.deepcopy(self.to_dict(spilling=changed))
+    
+    def saved(self, changed: Dict, assigned: Dict):
+        """Record that a snapshot's fields are in the spill; fields assigned again since stay changed"""
+        for field, value in changed.items():
+            if value is None:
+                self._spilled.discard(field)
+            else:
+                self._spilled.add(field)
+            if self._assigned[field] == assigned[field]:
+                self._changed.discard(field)
+    
+    def to_dict(self, spilling: Optional[Dict] = None):
+        """
+        Stored form of the session, which only names the fields kept in the
+        spill; `spilling` are changed fields being written to the spill along
+        with it (see `save_session`)
+        """
+        spilling = spilling or {}
+        spilled = (self._spilled - self._changed) | {field for field, value in spilling.items() if value is not None}
+        record = {
+            "session_id": self.session_id,
+            "client_name": self.client_name,
+            "month": self.month,
+            "status": self.status,
+            "progress": self.progress,
+            "extracted_count": self.extracted_count,
+            "gstr2b_count": self.gstr2b_count,
+            "report_card": self.report_card,
+            "spilled": sorted(spilled),
+            "excel_data": self.excel_data,
+            "error": self.error
+        }
+        # Assigned but not spilled yet (saved without `save_session`): kept inline
+        for field in self._changed - set(spilling):
+            record[field] = self._lists[field]
+        return record
+    
+    def details(self) -> Dict:
+        """Session state including the large lists (blocking: they may be read from the spill)"""
+        return {
+            "session_id": self.session_id,
+            "client_name": self.client_name,
+            "month": self.month,
+            "status": self.status,
+            "progress": self.progress,
+            "extracted_invoices": self.extracted_invoices,
+            "gstr2b_data": self.gstr2b_data,
+            "mismatch_results": self.mismatch_results,
+            "excel_data": self.excel_data,
+            "error": self.error
+        }
+    
+    def summary(self) -> Dict:
+        """Session state without the large lists, which are paged through /session/{id}/{collection}"""
+        report_card = self.report_card
+        return {
+            "session_id": self.session_id,
+            "client_name": self.client_name,
+            "month": self.month,
+            "status": self.status,
+            "progress": self.progress,
+            "extracted_count": self.extracted_count,
+            "gstr2b_count": self.gstr2b_count,
+            "report_card": {key: value for key, value in report_card.items() if key != "detail"} if report_card else None,
+            "excel_data": self.excel_data,
+            "error": self.error
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ProcessingSession":
+        """Rebuild a stored session; the GSTR2B index and matching state are rebuilt on demand"""
+        session = cls(data["session_id"], data["client_name"], data["month"])
+        for field in ("status", "progress", "extracted_count", "gstr2b_count", "report_card",
+                      "excel_data", "error"):
+            setattr(session, field, data.get(field, getattr(session, field)))
+        for field in data.get("spilled", []):
+            session._lists[field] = NOT_LOADED
+            session._spilled.add(field)
+        for field in SPILLED_FIELDS:
+            if field in data:
+                # Stored inline (not spilled yet, or saved before sessions
+                # were spilled); spilled by the next `save_session`
+                setattr(session, field, data[field])
+        return session
+
+
+def progress_snapshot(session: ProcessingSession) -> Dict:
+    return {
+        "session_id": session.session_id,
+        "status": session.status,
+        "progress": session.progress,
+        "extracted_count": session.extracted_count,
+        "job_id": session.job_id,
+        "error": session.error
+    }
+
+
+def publish_progress(session: ProcessingSession):
+    """Push every saved status change to the session's event stream"""
+    get_event_bus().publish(session.session_id, "progress", progress_snapshot(session))
+
+
+def discard_spills(session_ids: List[str]):
+    """A session's spill goes with it when the store evicts the session"""
+    spill = get_result_spill()
+    for session_id in session_ids:
+        spill.delete(session_id)
+
+
+# Sessions are stored in SQLite so every worker process sees the same data;
+# call save_session()/save_progress() after changing a session
+processing_jobs = SessionStore(ProcessingSession.from_dict, on_change=publish_progress, on_evict=discard_spills)
+
+
+async def save_session(session: ProcessingSession):
+    """
+    Spill the session's changed lists, then save it. The session is copied
+    on the event loop; encoding and writing run in a thread.
+    """
+    changed, assigned, record = session.snapshot()
+    await asyncio.to_thread(write_session, session, changed, record)
+    session.saved(changed, assigned)
+
+
+def write_session(session: ProcessingSession, changed: Dict, record: Dict):
+    """Write a session snapshot's changed lists to the spill and its record to the store (blocking)"""
+    spill = get_result_spill()
+    for field, value in changed.items():
+        collection = SPILLED_FIELDS[field]
+        if value is None:
+            spill.discard(session.session_id, [collection])
+        else:
+            spill.write(
+                session.session_id,
+                collection,
+                invoice_rows(value) if field == "extracted_invoices" else [value]
+            )
+    processing_jobs.save(session, record)
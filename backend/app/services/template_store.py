@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+from app.config import (
+    TEMPLATE_STORE_PATH,
+    TEMPLATE_MIN_CONFIRMATIONS,
+    TEMPLATE_VALIDATION_RATE,
+    TEMPLATE_MIN_ACCURACY,
+    TEMPLATE_ACCURACY_WINDOW,
+    TEMPLATE_MIN_VALIDATIONS
+)
+from app.services.rule_extractor import (
+    AMOUNT_VALUE,
+    DATE_VALUE,
+    INVOICE_NUMBER_VALUE,
+    parse_amount,
+    parse_date
+)
+
+# Field -> kind of value that follows its label
+TEMPLATE_FIELDS = {
+    "invoice_number": "text",
+    "invoice_date": "date",
+    "total_amount": "amount",
+    "invoice_amount": "amount",
+    "tax_amount": "amount",
+}
+REQUIRED_TEMPLATE_FIELDS = ("invoice_number", "invoice_date", "total_amount")
+
+VALUE_PATTERNS = {
+    "text": re.compile(INVOICE_NUMBER_VALUE, re.IGNORECASE),
+    "date": re.compile(DATE_VALUE),
+    "amount": re.compile(AMOUNT_VALUE),
+}
+
+
+def _normalize_text_value(value) -> str:
+    return re.sub(r"[^A-Z0-9]", "", str(value or "").upper())
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_value(kind: str, raw: str):
+    if kind == "amount":
+        return parse_amount(raw)
+    if kind == "date":
+        return parse_date(raw)
+    return raw
+
+
+def _values_agree(kind: str, left, right) -> bool:
+    if kind == "amount":
+        left, right = _to_float(left), _to_float(right)
+        return left is not None and right is not None and abs(left - right) <= 1.0
+    if kind == "date":
+        return bool(left) and left == right
+    return bool(_normalize_text_value(left)) and _normalize_text_value(left) == _normalize_text_value(right)
+
+
+def _label_before(text: str, position: int) -> Optional[str]:
+    """
+    The label printed just before a value on the same line, e.g. "Bill No." in
+    "Date: 01/02/2026    Bill No.: A-17". Columns separated by wide spacing,
+    tabs or pipes are ignored, and at most the last four words are kept.
+    """
+    line_start = text.rfind("\n", 0, position) + 1
+    prefix = re.split(r"\s{3,}|\t|\|", text[line_start:position])[-1]
+    words = prefix.strip().rstrip(":-#.=").strip().split()
+    label = " ".join(words[-4:])
+    return label if re.search(r"[A-Za-z]", label) else None
+
+
+def learn_template(text: str, data: Dict) -> Dict:
+    """Record, for each field, the label that precedes the value Gemini extracted"""
+    anchors = {}
+    for field, kind in TEMPLATE_FIELDS.items():
+        expected = data.get(field)
+        if expected in (None, "", "UNKNOWN"):
+            continue
+        for match in VALUE_PATTERNS[kind].finditer(text):
+            if not _values_agree(kind, _parse_value(kind, match.group(1)), expected):
+                continue
+            label = _label_before(text, match.start())
+            if label:
+                anchors[field] = label
+                break
+    return {"anchors": anchors, "confirmations": 0, "active": False, "accuracy": 1.0, "validations": 0, "recent": []}
+
+
+def apply_template(template: Dict, text: str) -> Optional[Dict]:
+    """Parse invoice fields using a supplier's anchors; None if a required field is missing"""
+    values = {}
+    for field, label in template["anchors"].items():
+        kind = TEMPLATE_FIELDS[field]
+        pattern = re.compile(
+            re.escape(label) + r"[\s:\-#.=]*" + VALUE_PATTERNS[kind].pattern,
+            0 if kind == "date" else re.IGNORECASE
+        )
+        match = pattern.search(text)
+        if match:
+            values[field] = _parse_value(kind, match.group(1))
+    
+    if any(values.get(field) in (None, "") for field in REQUIRED_TEMPLATE_FIELDS):
+        return None
+    return values
+
+
+def record_validation(template: Dict, agrees: bool) -> bool:
+    """
+    Add a validation outcome to the template's window; returns whether the
+    template is still trusted. A template is only judged once it has
+    TEMPLATE_MIN_VALIDATIONS outcomes, so one early disagreement does not
+    throw away a layout that is right almost every time.
+    """
+    recent = (template.get("recent", []) + [int(agrees)])[-TEMPLATE_ACCURACY_WINDOW:]
+    template["recent"] = recent
+    template["validations"] += 1
+    template["accuracy"] = sum(recent) / len(recent)
+    return len(recent) < TEMPLATE_MIN_VALIDATIONS or template["accuracy"] >= TEMPLATE_MIN_ACCURACY
+
+
+def templates_agree(predicted: Optional[Dict], data: Dict) -> bool:
+    if predicted is None:
+        return False
+    return all(
+        _values_agree(TEMPLATE_FIELDS[field], predicted.get(field), data.get(field))
+        for field in REQUIRED_TEMPLATE_FIELDS
+    )
+
+
+class TemplateStore:
+    """
+    Per-supplier invoice layouts, keyed by supplier GSTIN and learned from
+    Gemini extractions.
+    
+    A template records which label precedes each field. It becomes active
+    after it reproduces Gemini's output on TEMPLATE_MIN_CONFIRMATIONS
+    further invoices. Active templates are then re-checked against Gemini
+    on a random TEMPLATE_VALIDATION_RATE sample, and dropped once their
+    accuracy over the last TEMPLATE_ACCURACY_WINDOW validations (at least
+    TEMPLATE_MIN_VALIDATIONS of them) falls below TEMPLATE_MIN_ACCURACY.
+    Each observation reads and rewrites the template in one transaction, so
+    concurrent files from the same supplier do not lose updates.
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or TEMPLATE_STORE_PATH
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS templates (
+                supplier_gstin TEXT PRIMARY KEY,
+                template TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+    
+    def get(self, supplier_gstin: str) -> Optional[Dict]:
+        with self._lock:
+            return self._read(supplier_gstin)
+    
+    def _read(self, supplier_gstin: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT template FROM templates WHERE supplier_gstin = ?", (supplier_gstin,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def _write(self, supplier_gstin: str, template: Dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO templates (supplier_gstin, template, updated_at) VALUES (?, ?, ?)",
+            (supplier_gstin, json.dumps(template), time.time())
+        )
+    
+    def delete(self, supplier_gstin: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM templates WHERE supplier_gstin = ?", (supplier_gstin,))
+    
+    def parse(self, supplier_gstin: str, text: str) -> Tuple[Optional[Dict], bool]:
+        """
+        Parse an invoice with the supplier's active template.
+        
+        Returns:
+            Tuple of (field values or None, whether this result should be
+            validated against Gemini)
+        """
+        template = self.get(supplier_gstin)
+        if not template or not template["active"]:
+            return None, False
+        return apply_template(template, text), random.random() < TEMPLATE_VALIDATION_RATE
+    
+    def observe(self, supplier_gstin: str, text: str, data: Dict):
+        """Learn from, confirm or validate a template using a Gemini extraction"""
+        invalidated = None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                template = self._read(supplier_gstin)
+                if template is None:
+                    template = learn_template(text, data)
+                elif template["active"]:
+                    if not record_validation(template, templates_agree(apply_template(template, text), data)):
+                        # Layout drifted: start over from this invoice
+                        invalidated = template["accuracy"]
+                        template = learn_template(text, data)
+                elif templates_agree(apply_template(template, text), data):
+                    template["confirmations"] += 1
+                    template["active"] = template["confirmations"] >= TEMPLATE_MIN_CONFIRMATIONS
+                else:
+                    template = learn_template(text, data)
+                self._write(supplier_gstin, template)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        if invalidated is not None:
+            print(f"[TEMPLATES] Invalidated template for {supplier_gstin} (accuracy {invalidated:.2f})", file=sys.stderr)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,98 @@
+"""
+OCR microbenchmarks.
+
+Usage (from the backend directory):
+    python -m app.utils.ocr_benchmark invoice1.jpg invoice2.png --repeat 3
+    python -m app.utils.ocr_benchmark scan.png --backends --pages 50
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List
+import pytesseract
+from PIL import Image
+import app.config  # noqa: F401  (applies the Tesseract path)
+from app.services.image_preprocessor import ImagePreprocessor
+from app.services import ocr_engine
+
+
+def _time_ms(fn: Callable, repeat: int) -> float:
+    """Median wall time of `fn` in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def benchmark_preprocessing(image_path: str, repeat: int = 3) -> Dict[str, float]:
+    """Compare Tesseract time on the raw image against preprocessing + Tesseract"""
+    preprocessor = ImagePreprocessor()
+    with Image.open(image_path) as image:
+        image.load()
+        raw = image.copy()
+    
+    stage_runs = [preprocessor.benchmark(raw) for _ in range(repeat)]
+    cleaned = preprocessor.process(raw)
+    
+    results = {
+        f"stage_{name}_ms": statistics.median(run[name] for run in stage_runs)
+        for name in stage_runs[0]
+    }
+    results["raw_pixels"] = raw.width * raw.height
+    results["preprocessed_pixels"] = cleaned.width * cleaned.height
+    results["ocr_raw_ms"] = _time_ms(lambda: pytesseract.image_to_string(raw), repeat)
+    results["ocr_preprocessed_ms"] = _time_ms(lambda: pytesseract.image_to_string(cleaned), repeat)
+    return results
+
+
+def benchmark_backends(image_path: str, pages: int = 20) -> Dict[str, float]:
+    """
+    Compare the per-image pytesseract subprocess (temp PNG round trip) with the
+    persistent tesserocr API fed raw pixels, over `pages` OCR calls each
+    """
+    with Image.open(image_path) as image:
+        cleaned = ImagePreprocessor().process(image)
+    
+    def run(ocr: Callable) -> float:
+        start = time.perf_counter()
+        for _ in range(pages):
+            ocr(cleaned)
+        return (time.perf_counter() - start) * 1000 / pages
+    
+    results = {"pytesseract_ms_per_page": run(ocr_engine.ocr_with_pytesseract)}
+    if ocr_engine.tesserocr is not None:
+        start = time.perf_counter()
+        ocr_engine.init_worker()
+        results["tesserocr_model_load_ms"] = (time.perf_counter() - start) * 1000
+        results["tesserocr_ms_per_page"] = run(ocr_engine.ocr_with_tesserocr)
+        results["speedup"] = results["pytesseract_ms_per_page"] / results["tesserocr_ms_per_page"]
+    else:
+        print("tesserocr is not installed; only the pytesseract path was measured")
+    return results
+
+
+def _print_results(title: str, results: Dict[str, float]):
+    print(f"\n{title}")
+    for name, value in results.items():
+        print(f"  {name:<28} {value:>12.1f}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the OCR pipeline on sample images")
+    parser.add_argument("images", nargs="+", help="Image files to OCR")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--backends", action="store_true", help="Compare pytesseract with persistent tesserocr")
+    parser.add_argument("--pages", type=int, default=20, help="OCR calls per backend with --backends")
+    args = parser.parse_args(argv)
+    
+    for image_path in args.images:
+        if args.backends:
+            _print_results(f"{image_path}: OCR backends", benchmark_backends(image_path, args.pages))
+        else:
+            _print_results(f"{image_path}: preprocessing", benchmark_preprocessing(image_path, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Extraction worker: claims per-file tasks from the job queue and writes the
+results to the session store.
+
+Run one or more worker processes next to the API (set EMBEDDED_WORKER=0 on
+the API so it does not also extract):
+
+    python -m app.worker --processes 4
+"""
+import os
+import sys
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from typing import Dict, Optional
+from app.services.sessions import processing_jobs, save_session
+from app.services.document_processor import DocumentProcessor
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.job_runner import build_invoice_sheet, get_job_runner
+from app.services.event_bus import get_event_bus
+from app.services.result_spill import get_result_spill
+from app.config import (
+    WORKER_CONCURRENCY,
+    WORKER_POLL_SECONDS,
+    WORKER_MAX_POLL_SECONDS,
+    WORKER_STATS_SECONDS,
+    PIPELINE_QUEUE_SIZE
+)
+
+
+class QueueWorker:
+    """
+    Extracts queued files, several at a time, in one process.
+    
+    A single claimer leases work from the queue whenever a slot is free and
+    hands it to the slots; while the queue is empty it backs off
+    exponentially, so idle workers cost a claim every few seconds rather
+    than one per slot per poll. Each slot extracts a file while renewing the
+    lease and checkpoints the result in the queue. When a job's last file is
+    done, a slot assembles the invoices into the session and builds the
+    invoice sheet in the job runner's process pool.
+    
+    The worker's cache, LLM batching and pipeline statistics are reported to
+    the queue (see `/process/queue/stats`) when it goes idle and
+    periodically while busy.
+    """
+    
+    def __init__(
+        self,
+        queue: Optional[JobQueue] = None,
+        concurrency: Optional[int] = None,
+        worker_id: Optional[str] = None
+    ):
+        self.queue = queue or get_job_queue()
+        self.concurrency = concurrency or WORKER_CONCURRENCY or PIPELINE_QUEUE_SIZE
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._processors: Dict[bool, DocumentProcessor] = {}
+        self._idle = True
+        self._busy = 0
+        self._reported_at = 0.0
+    
+    def _processor(self, preprocess: bool) -> DocumentProcessor:
+        if preprocess not in self._processors:
+            self._processors[preprocess] = DocumentProcessor(preprocess=preprocess)
+        return self._processors[preprocess]
+    
+    async def run(self):
+        """Work until cancelled"""
+        print(f"[WORKER] {self.worker_id} started with {self.concurrency} slots", file=sys.stderr)
+        free = asyncio.Semaphore(self.concurrency)
+        work_queue: asyncio.Queue = asyncio.Queue()
+        await asyncio.gather(
+            self._claimer(work_queue, free),
+            *(self._slot(work_queue, free) for _ in range(self.concurrency))
+        )
+    
+    async def _claimer(self, work_queue: asyncio.Queue, free: asyncio.Semaphore):
+        """The process's only caller of `claim()`: leases work whenever a slot is free"""
+        delay = WORKER_POLL_SECONDS
+        while True:
+            await free.acquire()
+            work = await asyncio.to_thread(self.queue.claim, self.worker_id)
+            if work is None:
+                free.release()
+                if not self._idle:
+                    self._idle = True
+                    await self._report()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WORKER_MAX_POLL_SECONDS)
+                continue
+            
+            self._idle = False
+            delay = WORKER_POLL_SECONDS
+            work_queue.put_nowait(work)
+            if time.monotonic() - self._reported_at > WORKER_STATS_SECONDS:
+                await self._report()
+    
+    async def _slot(self, work_queue: asyncio.Queue, free: asyncio.Semaphore):
+        while True:
+            work = await work_queue.get()
+            self._busy += 1
+            try:
+                if work["kind"] == "finalize":
+                    await self._hold_lease(work, self._finalize(work))
+                else:
+                    await self._hold_lease(work, self._extract(work))
+            finally:
+                self._busy -= 1
+                free.release()
+    
+    def stats(self) -> Dict:
+        """Slot usage plus cache, LLM batching and pipeline statistics per processor"""
+        return {
+            "slots": self.concurrency,
+            "busy_slots": self._busy,
+            "processors": {
+                "preprocessed" if preprocess else "raw": processor.stats()
+                for preprocess, processor in self._processors.items()
+            }
+        }
+    
+    async def _report(self):
+        self._reported_at = time.monotonic()
+        try:
+            await asyncio.to_thread(self.queue.report_worker, self.worker_id, self.stats())
+        except Exception as e:
+            print(f"[WORKER] Could not report stats: {e}", file=sys.stderr)
+    
+    async def _hold_lease(self, work: Dict, job):
+        """Run `job`, renewing the lease on `work` until it finishes"""
+        task = asyncio.ensure_future(job)
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.queue.lease_seconds / 3)
+                if not task.done() and not await asyncio.to_thread(self.queue.renew, work, self.worker_id):
+                    print(f"[WORKER] Lost lease on {work['job_id']}/{work.get('task_id')}", file=sys.stderr)
+            task.result()
+        except asyncio.CancelledError:
+            task.cancel()
+            self.queue.release(work, self.worker_id)
+            raise
+        except Exception as e:
+            print(f"[WORKER] ✗ {work['kind']} {work['job_id']} failed: {e}", file=sys.stderr)
+    
+    async def _extract(self, work: Dict):
+        file_path = work["file_path"]
+        on_event = None
+        if work["session_id"] is not None:
+            bus = get_event_bus()
+            on_event = lambda event_type, data: bus.publish(work["session_id"], event_type, data)
+        result = await self._processor(work["preprocess"]).process_file(file_path, on_event)
+        owner = await asyncio.to_thread(self.queue.complete, work, self.worker_id, result)
+        if owner is None:
+            return
+        
+        # Prefetched files report progress only once a job has taken them over
+        job_id, session_id = owner
+        if session_id is None:
+            return
+        
+        done, total = await asyncio.to_thread(self.queue.progress, job_id)
+        session = processing_jobs.get(session_id)
+        if session is not None:
+            session.progress = 10 + int(done / total * 70)
+            session.status = f"Processed {os.path.basename(file_path)}"
+            processing_jobs.save_progress(session)
+        print(f"[WORKER] {job_id}: {done}/{total} files done", file=sys.stderr)
+    
+    async def _finalize(self, work: Dict):
+        job_id = work["job_id"]
+        session = processing_jobs.get(work["session_id"])
+        if session is None:
+            # Session deleted or expired while its files were processed
+            await asyncio.to_thread(self.queue.finish, job_id, self.worker_id, "failed")
+            return
+        
+        try:
+            session.extracted_invoices = await asyncio.to_thread(self.queue.results, job_id)
+            session.progress = 80
+            session.status = "extracted"
+            await save_session(session)
+            
+            # Kept with the session's results and served by /download-excel
+            path = get_result_spill().report_path(session.session_id)
+            filename = await get_job_runner().run(build_invoice_sheet, session.extracted_invoices, path)
+            session.excel_data = {
+                "filename": filename,
+                "size": os.path.getsize(path),
+                "data_preview": [inv for inv in session.extracted_invoices[:5]]  # First 5 for preview
+            }
+            session.progress = 100
+            session.status = "completed"
+            await save_session(session)
+            await asyncio.to_thread(self.queue.finish, job_id, self.worker_id)
+            print(f"[WORKER] ✓ Job {job_id} complete ({len(session.extracted_invoices)} invoices)", file=sys.stderr)
+        
+        except Exception as e:
+            session.status = "error"
+            session.error = str(e)
+            session.progress = 0
+            processing_jobs.save_progress(session)
+            await asyncio.to_thread(self.queue.finish, job_id, self.worker_id, "failed")
+            raise
+
+
+_embedded: Optional[asyncio.Task] = None
+
+
+def start_embedded_worker():
+    """Run a worker on the current event loop (single-process deployments)"""
+    global _embedded
+    if _embedded is None:
+        _embedded = asyncio.ensure_future(QueueWorker().run())
+
+
+def stop_embedded_worker():
+    global _embedded
+    if _embedded is not None:
+        _embedded.cancel()
+        _embedded = None
+
+
+def run_worker(concurrency: Optional[int] = None):
+    try:
+        asyncio.run(QueueWorker(concurrency=concurrency).run())
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run document extraction workers")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    parser.add_argument("--concurrency", type=int, default=None, help="Files in flight per process")
+    args = parser.parse_args()
+    
+    if args.processes <= 1:
+        run_worker(args.concurrency)
+        return
+    
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.concurrency,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
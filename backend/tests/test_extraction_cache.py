@@ -0,0 +1,25 @@
+from app.services.extraction_cache import ExtractionCache
+
+
+def stored_sizes(cache: ExtractionCache):
+    total = cache._conn.execute("SELECT size FROM totals").fetchone()[0]
+    actual = cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    return total, actual
+
+
+def test_running_total_follows_replacements_and_evictions(tmp_path):
+    cache = ExtractionCache(db_path=str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    for i in range(60):
+        cache.put("text", f"k{i % 20}", {"text": "x" * (i * 3)})
+        total, actual = stored_sizes(cache)
+        assert total == actual <= 1000
+    
+    # The most recent entries survive eviction
+    assert cache.get("text", "k19") is not None
+    assert cache.get("text", "k0") is None
+    cache.close()
+    
+    # Reopening keeps the stored total
+    reopened = ExtractionCache(db_path=str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    assert stored_sizes(reopened)[0] == total
+    reopened.close()
@@ -0,0 +1,59 @@
+from collections import Counter
+from app.services.fair_scheduler import FairScheduler
+
+
+def job(job_id, client_name, pages=1000, remaining=None, created_at=0.0):
+    return {
+        "job_id": job_id,
+        "client_name": client_name,
+        "pages": pages,
+        "remaining": pages if remaining is None else remaining,
+        "created_at": created_at
+    }
+
+
+def serve(scheduler, jobs, files, now=0.0, virtual_times=None, clock=0.0):
+    """Hand out `files` one-page files the way the job queue does; returns the client served each time"""
+    virtual_times = dict(virtual_times or {})
+    served = []
+    for _ in range(files):
+        picked = scheduler.pick(jobs, virtual_times, clock, now)
+        client_name = picked["client_name"]
+        start = scheduler.start_time(client_name, virtual_times, clock)
+        clock = max(clock, start)
+        virtual_times[client_name] = scheduler.charge(client_name, start, 1)
+        served.append(client_name)
+    return served
+
+
+def test_clients_share_in_proportion_to_their_weights():
+    scheduler = FairScheduler(weights={"big": 2.0}, small_job_pages=0, max_wait=3600)
+    served = serve(scheduler, [job("a", "big"), job("b", "small")], 300)
+    assert Counter(served) == {"big": 200, "small": 100}
+    # Interleaved, not one client after the other
+    assert set(served[:6]) == {"big", "small"}
+
+
+def test_returning_client_does_not_spend_banked_credit():
+    scheduler = FairScheduler(weights={}, small_job_pages=0, max_wait=3600)
+    # "idle" last ran long ago; the clock has since moved on to 100
+    served = serve(scheduler, [job("a", "busy"), job("b", "idle")], 20, virtual_times={"busy": 100.0, "idle": 5.0}, clock=100.0)
+    assert Counter(served) == {"busy": 10, "idle": 10}
+
+
+def test_small_jobs_go_ahead_of_large_ones():
+    scheduler = FairScheduler(weights={}, small_job_pages=20, max_wait=600)
+    jobs = [job("month", "a", pages=2000), job("upload", "b", pages=5)]
+    assert scheduler.pick(jobs, {"a": 0.0, "b": 50.0}, 0.0, now=10.0)["job_id"] == "upload"
+
+
+def test_large_job_waiting_past_max_wait_is_not_starved():
+    scheduler = FairScheduler(weights={}, small_job_pages=20, max_wait=600)
+    jobs = [job("month", "a", pages=2000, created_at=0.0), job("upload", "b", pages=5, created_at=650.0)]
+    assert scheduler.pick(jobs, {"a": 0.0, "b": 50.0}, 0.0, now=700.0)["job_id"] == "month"
+
+
+def test_fewest_pages_left_goes_first_within_a_client():
+    scheduler = FairScheduler(weights={}, small_job_pages=0, max_wait=3600)
+    jobs = [job("older", "a", remaining=300, created_at=0.0), job("newer", "a", remaining=40, created_at=5.0)]
+    assert scheduler.pick(jobs, {}, 0.0, now=10.0)["job_id"] == "newer"
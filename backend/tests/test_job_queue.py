@@ -0,0 +1,87 @@
+import time
+import pytest
+from app.services.job_queue import JobQueue
+
+LEASE_SECONDS = 0.4
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), lease_seconds=LEASE_SECONDS, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def expire():
+    time.sleep(LEASE_SECONDS * 1.5)
+
+
+def test_expired_lease_is_taken_over(queue):
+    job_id = queue.enqueue("s1", "client", ["/x/a.pdf"], pages=[1])
+    lost = queue.claim("w1")
+    assert queue.claim("w2") is None
+    
+    expire()
+    taken = queue.claim("w2")
+    assert taken["task_id"] == lost["task_id"]
+    
+    # The first worker's late result is discarded; the new owner's is kept
+    assert queue.complete(lost, "w1", {"file": "a.pdf", "status": "valid", "by": "w1"}) is None
+    assert not queue.renew(lost, "w1")
+    assert queue.complete(taken, "w2", {"file": "a.pdf", "status": "valid", "by": "w2"}) == (job_id, "s1")
+    assert queue.results(job_id) == [{"file": "a.pdf", "status": "valid", "by": "w2"}]
+
+
+def test_renewed_lease_is_kept(queue):
+    queue.enqueue("s1", "client", ["/x/a.pdf"], pages=[1])
+    work = queue.claim("w1")
+    for _ in range(3):
+        time.sleep(LEASE_SECONDS / 4)
+        assert queue.renew(work, "w1")
+        assert queue.claim("w2") is None
+
+
+def test_file_losing_every_worker_is_given_up(queue):
+    job_id = queue.enqueue("s1", "client", ["/x/a.pdf"], pages=[1])
+    for worker_id in ("w1", "w2"):
+        assert queue.claim(worker_id)["kind"] == "file"
+        expire()
+    
+    # Out of attempts: recorded as an error, and the job goes on to finalize
+    work = queue.claim("w3")
+    assert work == {"kind": "finalize", "job_id": job_id, "session_id": "s1", "preprocess": True}
+    [result] = queue.results(job_id)
+    assert result["status"] == "error" and result["file"] == "a.pdf"
+
+
+def test_released_file_does_not_use_an_attempt(queue):
+    queue.enqueue("s1", "client", ["/x/a.pdf"], pages=[1])
+    for _ in range(3):
+        queue.release(queue.claim("w1"), "w1")
+    assert queue.claim("w1")["kind"] == "file"
+
+
+def test_expired_finalize_lease_is_taken_over(queue):
+    job_id = queue.enqueue("s1", "client", ["/x/a.pdf"], pages=[1])
+    work = queue.claim("w1")
+    queue.complete(work, "w1", {"file": "a.pdf", "status": "valid"})
+    
+    assert queue.claim("w1")["kind"] == "finalize"
+    assert queue.claim("w2") is None
+    expire()
+    assert queue.claim("w2") == {"kind": "finalize", "job_id": job_id, "session_id": "s1", "preprocess": True}
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), lease_seconds=LEASE_SECONDS, retention_hours=0.5 / 3600)
+    done, kept = [queue.enqueue(f"s{i}", "client", [f"/x/{i}.pdf"], pages=[1]) for i in range(2)]
+    work = queue.claim("w1")
+    queue.complete(work, "w1", {"file": "0.pdf", "status": "valid"})
+    assert queue.claim("w1")["kind"] == "finalize"
+    queue.finish(done, "w1")
+    
+    time.sleep(0.6)
+    queue.claim("w1")
+    jobs = [job_id for (job_id,) in queue._conn.execute("SELECT job_id FROM jobs")]
+    assert jobs == [kept]
+    queue.close()
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from app.services.llm_dispatcher import LLMDispatcher, TokenBucket
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+    
+    async def generate_content(self, model, contents):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return type("Response", (), {"text": contents.upper()})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.aio = type("Aio", (), {})()
+        self.aio.models = FakeModels()
+
+
+def test_dispatcher_works_across_event_loops():
+    client = FakeClient()
+    dispatcher = LLMDispatcher(client, max_concurrency=2, requests_per_minute=6000)
+    
+    async def burst():
+        return await asyncio.gather(*(dispatcher.generate(f"p{i}", "model") for i in range(6)))
+    
+    # Each asyncio.run is a fresh loop; primitives bound to the first would raise here
+    assert asyncio.run(burst()) == [f"P{i}" for i in range(6)]
+    assert asyncio.run(burst()) == [f"P{i}" for i in range(6)]
+    assert client.aio.models.calls == 12
+
+
+def test_token_bucket_rate_is_shared_between_loops():
+    bucket = TokenBucket(rate=20, capacity=1)
+    
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+    
+    start = time.monotonic()
+    asyncio.run(take(3))
+    asyncio.run(take(3))
+    # One burst token, then five more at 20/s
+    assert time.monotonic() - start >= 0.2
@@ -0,0 +1,101 @@
+import random
+from difflib import SequenceMatcher
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from app.services import match_engine
+from app.services.mismatch_detector import MismatchDetector
+
+GSTIN = "27AAACR5055K1Z7"
+OCR_CONFUSIONS = {"0": "O", "1": "I", "5": "S", "8": "B", "2": "Z"}
+
+
+def same_date_cluster(seed: int, size: int = 200):
+    """One supplier, one date, one amount: only the (noisy) invoice numbers tell invoices apart"""
+    rnd = random.Random(seed)
+    rows, extracted = [], []
+    for i in range(size):
+        number = f"INV/2026/{i:04d}"
+        rows.append({"gstin": GSTIN, "inv_no": number, "inv_dt": "2026-01-15", "total_amt": 1180.0})
+        noisy = number.replace("/", rnd.choice(["-", "", " ", "/"]))
+        noisy = "".join(OCR_CONFUSIONS.get(ch, ch) if rnd.random() < 0.05 else ch for ch in noisy)
+        extracted.append({
+            "file": f"f{i}.pdf",
+            "gstin": GSTIN,
+            "invoice_number": noisy,
+            "invoice_date": "2026-01-15",
+            "total_amount": 1180.0
+        })
+    rnd.shuffle(extracted)
+    return rows, extracted
+
+
+def optimal_total(detector: MismatchDetector, rows, extracted) -> float:
+    """Best total score over every qualifying pair, scored pair by pair without any pruning"""
+    weights = detector.weights
+    # Date, GSTIN and amount agree for every pair of the cluster
+    scores = np.zeros((len(extracted), len(rows)))
+    for i, invoice in enumerate(extracted):
+        for j, row in enumerate(rows):
+            ratio = SequenceMatcher(None, invoice["invoice_number"].lower(), row["inv_no"].lower()).ratio()
+            score = ratio * weights["invoice_number"] + weights["date"] + weights["gstin"] + weights["amount"]
+            if score >= detector.similarity_threshold:
+                scores[i, j] = score
+    matched_rows, matched_cols = linear_sum_assignment(scores, maximize=True)
+    return float(scores[matched_rows, matched_cols].sum())
+
+
+def test_same_date_cluster_gets_optimal_assignment():
+    for seed in range(2):
+        rows, extracted = same_date_cluster(seed)
+        detector = MismatchDetector()
+        analysis = detector.detect_mismatches(extracted, {"invoices": rows})
+        
+        total = sum(pair["match_score"] for pair in analysis["matched_pairs"])
+        assert abs(total - optimal_total(detector, rows, extracted)) < 1e-6
+
+
+def test_shortlist_only_prunes_oversized_blocks():
+    rows, extracted = same_date_cluster(0, size=60)
+    exact = MismatchDetector()
+    pruned = MismatchDetector()
+    pruned.engine.shortlist_above_pairs = 0
+    
+    exact_pairs = exact.engine.candidate_pairs(extracted, exact.build_index({"invoices": rows}))
+    pruned_pairs = pruned.engine.candidate_pairs(extracted, pruned.build_index({"invoices": rows}))
+    
+    assert set(pair[:2] for pair in pruned_pairs) < set(pair[:2] for pair in exact_pairs)
+
+
+def test_dates_are_compared_after_parsing():
+    rows = [{"gstin": GSTIN, "inv_no": "INV-1", "inv_dt": "2026-01-15", "total_amt": 1180.0}]
+    extracted = [{"file": "a.pdf", "gstin": GSTIN, "invoice_number": "INV-1", "invoice_date": "15/01/2026", "total_amount": 1180.0}]
+    detector = MismatchDetector()
+    pairs = detector.engine.candidate_pairs(extracted, detector.build_index({"invoices": rows}))
+    assert [pair[:2] for pair in pairs] == [(0, 0)]
+    assert pairs[0][3]["date"] == 1.0
+
+
+def test_chunked_scoring_matches_single_pass():
+    rows, extracted = same_date_cluster(1, size=80)
+    # Spread the amounts so the amount window rules some pairs out
+    for i, row in enumerate(rows):
+        row["total_amt"] = 1000.0 + 40 * (i % 10)
+    for invoice, row in zip(extracted, rows):
+        invoice["total_amount"] = row["total_amt"]
+    
+    single, chunked = MismatchDetector(), MismatchDetector()
+    chunked.engine.chunk_pairs = 7
+    single_pairs = single.engine.candidate_pairs(extracted, single.build_index({"invoices": rows}))
+    chunked_pairs = chunked.engine.candidate_pairs(extracted, chunked.build_index({"invoices": rows}))
+    assert sorted(single_pairs) == sorted(chunked_pairs)
+    assert all(pair[3]["amount"] >= 0.25 for pair in single_pairs)
+
+
+def test_sparse_assignment_is_optimal(monkeypatch):
+    monkeypatch.setattr(match_engine, "DENSE_ASSIGNMENT_CELLS", 0)
+    rows, extracted = same_date_cluster(0, size=80)
+    detector = MismatchDetector()
+    analysis = detector.detect_mismatches(extracted, {"invoices": rows})
+    
+    total = sum(pair["match_score"] for pair in analysis["matched_pairs"])
+    assert abs(total - optimal_total(detector, rows, extracted)) < 1e-6
@@ -0,0 +1,76 @@
+import random
+from app.services.mismatch_detector import MismatchDetector
+
+GSTINS = [f"27AAAC{suffix}1234A1Z{suffix}" for suffix in "ABCD"]
+AMOUNTS = [1000.0, 1180.0, 2360.0, 5000.0]
+
+
+def crowded_month(rnd: random.Random):
+    """Few suppliers, dates and amounts, so many invoices compete for the same rows"""
+    rows, extracted = [], []
+    for i in range(120):
+        gstin, number = rnd.choice(GSTINS), f"INV-{rnd.randint(1, 60)}"
+        date, amount = f"2026-01-{rnd.randint(10, 14)}", rnd.choice(AMOUNTS)
+        rows.append({"gstin": gstin, "inv_no": number, "inv_dt": date, "total_amt": amount})
+        if rnd.random() < 0.85:
+            extracted.append({
+                "file": f"f{i}.pdf",
+                "gstin": gstin,
+                "invoice_number": number if rnd.random() < 0.8 else number + "1",
+                "invoice_date": date,
+                "total_amount": amount
+            })
+    rnd.shuffle(extracted)
+    return rows, extracted
+
+
+def random_edit(rnd: random.Random, invoices):
+    invoice = dict(invoices[rnd.randrange(len(invoices))])
+    field = rnd.choice(["invoice_number", "total_amount", "gstin", "invoice_date", "copy"])
+    if field == "copy":
+        return dict(invoices[rnd.randrange(len(invoices))])
+    invoice[field] = {
+        "invoice_number": lambda: f"INV-{rnd.randint(1, 60)}",
+        "total_amount": lambda: rnd.choice(AMOUNTS),
+        "gstin": lambda: rnd.choice(GSTINS),
+        "invoice_date": lambda: f"2026-01-{rnd.randint(10, 14)}"
+    }[field]()
+    return invoice
+
+
+def total_score(results):
+    return sum(pair["match_score"] for pair in results["matched_pairs"])
+
+
+def test_local_resolve_matches_full_resolve():
+    detector = MismatchDetector()
+    for seed in range(12):
+        rnd = random.Random(seed)
+        rows, invoices = crowded_month(rnd)
+        state = detector.reconcile(invoices, {"invoices": rows})
+        
+        for _ in range(12):
+            changes = {rnd.randrange(len(invoices)): random_edit(rnd, invoices) for _ in range(rnd.randint(1, 3))}
+            for position, invoice in changes.items():
+                invoices[position] = invoice
+            state.apply_changes(changes)
+            
+            local = state.results()
+            full = detector.reconcile(invoices, {"invoices": rows}, state.index).results()
+            assert abs(total_score(local) - total_score(full)) < 1e-6
+            assert local["summary"]["matched"] == full["summary"]["matched"]
+
+
+def test_update_with_full_list_rematches_only_changed_invoices():
+    rnd = random.Random(0)
+    rows, invoices = crowded_month(rnd)
+    detector = MismatchDetector()
+    state = detector.reconcile(invoices, {"invoices": rows})
+    
+    edited = list(invoices)
+    edited[5] = {**edited[5], "total_amount": 1.0}
+    assert state.update(edited) == {5}
+    assert abs(total_score(state.results()) - total_score(detector.reconcile(edited, {"invoices": rows}).results())) < 1e-6
+    
+    # A different length renumbers the invoices, so everything is re-matched
+    assert state.update(edited[:-1]) == set(range(len(edited) - 1))
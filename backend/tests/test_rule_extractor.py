@@ -0,0 +1,49 @@
+from app.services.rule_extractor import GSTIN_CHARSET, RuleBasedExtractor, gstin_check_digit, is_valid_gstin
+
+# Published GSTINs with their real check characters
+KNOWN_GSTINS = ["27AAPFU0939F1ZV", "29AAGCB7383J1Z4", "33AAACH7409R1Z8"]
+
+
+def test_known_gstins_are_valid():
+    for gstin in KNOWN_GSTINS:
+        assert gstin_check_digit(gstin) == gstin[14]
+        assert is_valid_gstin(gstin)
+
+
+def test_any_other_check_character_is_rejected():
+    for gstin in KNOWN_GSTINS:
+        for char in GSTIN_CHARSET:
+            if char != gstin[14]:
+                assert not is_valid_gstin(gstin[:14] + char)
+
+
+def test_single_character_ocr_errors_are_caught():
+    # Substituting any one character of the body changes the check character
+    gstin = KNOWN_GSTINS[0]
+    for position in range(14):
+        for char in GSTIN_CHARSET:
+            if char != gstin[position]:
+                assert gstin_check_digit(gstin[:position] + char + gstin[position + 1:]) != gstin[14]
+
+
+def test_malformed_gstins_are_rejected():
+    for gstin in (None, "", "27AAPFU0939F1Z", "27aapfu0939f1zv", "27AAPFU0939F1XV", "2AAAPFU0939F1ZV"):
+        assert not is_valid_gstin(gstin)
+
+
+def test_invoice_date_wins_over_a_due_date_printed_first():
+    text = "Due Date: 15/02/2026\nPO Date: 02/01/2026\nInvoice Date: 16/01/2026\n"
+    assert RuleBasedExtractor()._find_date(text) == ("2026-01-16", 1.0)
+
+
+def test_other_dates_are_not_taken_for_the_invoice_date():
+    extractor = RuleBasedExtractor()
+    for text in ("Due Date: 15/02/2026", "PO Date 01/01/2026", "Date of Supply: 12/01/2026"):
+        assert extractor._find_date(text) == (None, 0.0)
+
+
+def test_bare_date_is_not_confident():
+    extractor = RuleBasedExtractor()
+    date, confidence = extractor._find_date("Invoice No: A-12   Date: 16/01/2026")
+    assert date == "2026-01-16"
+    assert not extractor.is_confident(confidence)
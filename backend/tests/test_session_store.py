@@ -0,0 +1,75 @@
+import time
+import threading
+import pytest
+from app.services.session_store import SessionStore
+
+BUSY = ("detecting_mismatches", "building_report")
+
+
+class Session:
+    def __init__(self, session_id: str, status: str = "gstr2b_uploaded"):
+        self.session_id = session_id
+        self.status = status
+        self.progress = 0
+        self.error = None
+        self.job_id = None
+    
+    def to_dict(self):
+        return {"session_id": self.session_id}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["session_id"])
+
+
+@pytest.fixture
+def stores(tmp_path):
+    # Two processes sharing one database
+    path = str(tmp_path / "sessions.sqlite3")
+    stores = [SessionStore(Session.from_dict, db_path=path) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def test_only_one_process_claims_a_job(stores):
+    first, second = stores
+    first.save(Session("s1"))
+    a, b = first["s1"], second["s1"]
+    
+    assert first.claim_job(a, "job-a", "detecting_mismatches", BUSY, 60)
+    assert not second.claim_job(b, "job-b", "detecting_mismatches", BUSY, 60)
+    assert b.job_id == "job-a" and b.status == "detecting_mismatches"
+    
+    # A full save keeps the claim
+    first.save(a)
+    assert not second.claim_job(b, "job-b", "detecting_mismatches", BUSY, 60)
+    
+    a.status = "mismatch_detection_completed"
+    first.save_progress(a)
+    assert second.claim_job(b, "job-b", "detecting_mismatches", BUSY, 60)
+
+
+def test_stale_claim_is_retaken(stores):
+    first, second = stores
+    first.save(Session("s1"))
+    assert first.claim_job(first["s1"], "job-a", "detecting_mismatches", BUSY, 0.2)
+    time.sleep(0.3)
+    assert second.claim_job(second["s1"], "job-b", "detecting_mismatches", BUSY, 0.2)
+
+
+def test_concurrent_saves_never_share_a_version(stores):
+    stores[0].save(Session("s1"))
+    
+    def save_many(store):
+        for _ in range(50):
+            store.save(Session("s1"))
+    
+    threads = [threading.Thread(target=save_many, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    version = stores[0]._conn.execute("SELECT data_version FROM sessions WHERE session_id = 's1'").fetchone()[0]
+    assert version == 101
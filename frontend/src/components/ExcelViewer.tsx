@@ -38,7 +38,11 @@ const ExcelViewer = ({ invoices, isEditable = false, onUpdate = null }) => {
     setEditingCell(null);
 
     if (onUpdate) {
-      onUpdate(newData);
+      // Rows carry their session `index` when loaded page by page
+      onUpdate(newData, {
+        index: newData[rowIdx].index ?? rowIdx,
+        fields: { [colName]: value },
+      });
     }
   };
 
@@ -23,7 +23,8 @@ const UploadForm = (props: any = {}) => {
   const [isProcessing, setIsProcessing] = useState(false);
   
   const clientNameInputRef = useRef(null);
-  const progressIntervalRef = useRef(null);
+  const eventSourceRef = useRef(null);
+  const invoicesReadyRef = useRef(0);
 
   // Focus input when component mounts with folder name
   useEffect(() => {
@@ -35,53 +36,73 @@ const UploadForm = (props: any = {}) => {
     }
   }, [location.state?.folderName]);
 
-  // Cleanup interval on unmount
+  // Close the progress stream on unmount
   useEffect(() => {
     return () => {
-      if (progressIntervalRef.current) {
-        clearInterval(progressIntervalRef.current);
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close();
       }
     };
   }, []);
 
-  const pollProcessingProgress = async (sessionId) => {
-    try {
-      const response = await fetch(
-        `http://localhost:8000/process/progress/${sessionId}`
+  // Follow processing over one Server-Sent Events connection instead of polling
+  const watchProcessingEvents = (sessionId) => {
+    invoicesReadyRef.current = 0;
+    const source = new EventSource(
+      `http://localhost:8000/process/events/${sessionId}`
+    );
+    eventSourceRef.current = source;
+
+    source.addEventListener("progress", (event) => {
+      handleProgress(sessionId, JSON.parse(event.data));
+    });
+    source.addEventListener("ocr_page", (event) => {
+      const data = JSON.parse(event.data);
+      const pages = data.pages.map((page) => page.page).join(", ");
+      setProcessingStatus(`OCR ${data.file}: page ${pages} done`);
+    });
+    source.addEventListener("llm_done", (event) => {
+      setProcessingStatus(`Reading fields from ${JSON.parse(event.data).file}`);
+    });
+    source.addEventListener("invoice", (event) => {
+      invoicesReadyRef.current += 1;
+      const data = JSON.parse(event.data);
+      setProcessingStatus(
+        `${invoicesReadyRef.current} invoice(s) ready (latest: ${data.file})`
       );
-      
-      if (!response.ok) {
-        throw new Error("Failed to get progress");
-      }
-
-      const data = await response.json();
-
-      setProcessingProgress(data.progress);
-      setProcessingStatus(data.status);
-
-      console.log("Progress:", data); // Debug log
-
-      if (data.status === "completed") {
-        clearInterval(progressIntervalRef.current);
-        setIsProcessing(false);
-        // Navigate to report page after 2 seconds
-        setTimeout(() => {
-          navigate("/report", {
-            state: {
-              sessionId,
-              clientName,
-              month,
-            },
-          });
-        }, 2000);
-      } else if (data.status === "error") {
-        clearInterval(progressIntervalRef.current);
-        setError(data.error || "Processing failed");
+    });
+    source.onerror = () => {
+      // The browser reconnects on its own unless the stream was refused
+      if (source.readyState === EventSource.CLOSED) {
+        setError("Lost connection to the processing server");
         setIsProcessing(false);
         setLoading(false);
       }
-    } catch (err) {
-      console.error("Error polling progress:", err);
+    };
+  };
+
+  const handleProgress = (sessionId, data) => {
+    setProcessingProgress(data.progress);
+    setProcessingStatus(data.status);
+
+    if (data.status === "completed") {
+      eventSourceRef.current.close();
+      setIsProcessing(false);
+      // Navigate to report page after 2 seconds
+      setTimeout(() => {
+        navigate("/report", {
+          state: {
+            sessionId,
+            clientName,
+            month,
+          },
+        });
+      }, 2000);
+    } else if (data.status === "error") {
+      eventSourceRef.current.close();
+      setError(data.error || "Processing failed");
+      setIsProcessing(false);
+      setLoading(false);
     }
   };
 
@@ -105,37 +126,52 @@ const UploadForm = (props: any = {}) => {
       // Convert month from YYYY-MM format to YYYY_MM format
       const formattedMonth = month.replace("-", "_");
 
-      const formData = new FormData();
-      formData.append("client_name", clientName);
-      formData.append("month", formattedMonth);
-
-      files.forEach((file) => {
-        formData.append("files", file);
-      });
+      // Upload in batches so the backend starts extracting the first files
+      // (process on arrival) while later ones are still uploading
+      const batchSize = 10;
+      let uploadedCount = 0;
+      let uploadResult = null;
 
       console.log("Uploading files:", files.length);
 
-      // Upload files
-      const uploadResponse = await fetch("http://localhost:8000/upload/", {
-        method: "POST",
-        body: formData,
-      });
+      for (let start = 0; start < files.length; start += batchSize) {
+        const formData = new FormData();
+        formData.append("client_name", clientName);
+        formData.append("month", formattedMonth);
+        formData.append("process_on_arrival", "true");
 
-      console.log("Upload response status:", uploadResponse.status);
+        files.slice(start, start + batchSize).forEach((file) => {
+          formData.append("files", file);
+        });
+
+        const uploadResponse = await fetch("http://localhost:8000/upload/", {
+          method: "POST",
+          body: formData,
+        });
+
+        console.log("Upload response status:", uploadResponse.status);
+
+        if (!uploadResponse.ok) {
+          const errorData = await uploadResponse.json();
+          throw new Error(errorData.detail || errorData.message || "Upload failed");
+        }
+
+        uploadResult = await uploadResponse.json();
+        if (uploadResult.status === "error") {
+          throw new Error(uploadResult.message || "Upload failed");
+        }
 
-      if (!uploadResponse.ok) {
-        const errorData = await uploadResponse.json();
-        throw new Error(errorData.message || "Upload failed");
+        uploadedCount += uploadResult.file_count;
+        setUploadProgress(Math.round((uploadedCount / files.length) * 100));
       }
 
-      const uploadResult = await uploadResponse.json();
       console.log("Upload result:", uploadResult);
 
       setUploadProgress(100);
       setUploadStatus({
         success: true,
         message: uploadResult.message,
-        fileCount: uploadResult.file_count,
+        fileCount: uploadedCount,
       });
 
       // Start processing with slight delay
@@ -170,10 +206,8 @@ const UploadForm = (props: any = {}) => {
           setSessionId(newSessionId);
           setProcessingProgress(10);
 
-          // Start polling progress
-          progressIntervalRef.current = setInterval(() => {
-            pollProcessingProgress(newSessionId);
-          }, 1000);
+          // Start following progress events
+          watchProcessingEvents(newSessionId);
         } catch (err) {
           console.error("Processing error:", err);
           setError(err.message || "An error occurred during processing");
@@ -17,6 +17,11 @@ const Report = () => {
   const [gstr2bError, setGstr2bError] = useState(null);
   const [mismatchRunning, setMismatchRunning] = useState(false);
   const [reportCard, setReportCard] = useState(null);
+  // Invoices and mismatches are loaded a page at a time
+  const [invoices, setInvoices] = useState([]);
+  const [invoicesCursor, setInvoicesCursor] = useState(null);
+  const [mismatches, setMismatches] = useState([]);
+  const [mismatchesCursor, setMismatchesCursor] = useState(null);
   const [gstin, setGstin] = useState("");
 
   useEffect(() => {
@@ -33,7 +38,7 @@ const Report = () => {
     try {
       setLoading(true);
       const response = await fetch(
-        `http://localhost:8000/process/session/${sessionId}`
+        `http://localhost:8000/process/session/${sessionId}?summary=true`
       );
 
       if (!response.ok) {
@@ -42,6 +47,7 @@ const Report = () => {
 
       const data = await response.json();
       setSessionData(data);
+      await fetchInvoices(null);
       setError(null);
     } catch (err) {
       setError(err.message || "Failed to load report");
@@ -51,6 +57,40 @@ const Report = () => {
     }
   };
 
+  const fetchResultsPage = async (collection, cursor, fields) => {
+    const params = new URLSearchParams({ limit: "200", fields });
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    const response = await fetch(
+      `http://localhost:8000/process/session/${sessionId}/${collection}?${params}`
+    );
+    if (!response.ok) {
+      throw new Error(`Failed to fetch ${collection}`);
+    }
+    return response.json();
+  };
+
+  const fetchInvoices = async (cursor) => {
+    const page = await fetchResultsPage(
+      "invoices",
+      cursor,
+      "index,file,invoice_number,invoice_date,gstin,invoice_amount,tax_amount,total_amount,status"
+    );
+    setInvoices((previous) => (cursor ? [...previous, ...page.items] : page.items));
+    setInvoicesCursor(page.next_cursor);
+  };
+
+  const fetchMismatches = async (cursor) => {
+    const page = await fetchResultsPage(
+      "mismatches",
+      cursor,
+      "index,invoice_number,match_score,issues"
+    );
+    setMismatches((previous) => (cursor ? [...previous, ...page.items] : page.items));
+    setMismatchesCursor(page.next_cursor);
+  };
+
   const handleDownloadExcel = async () => {
     try {
       const response = await fetch(
@@ -185,10 +225,43 @@ const Report = () => {
         throw new Error(errorData.detail || "Failed to run mismatch detection");
       }
 
-      const data = await response.json();
+      // Detection runs as a background job; wait for it on the session's event stream
+      const progress = await new Promise((resolve, reject) => {
+        const source = new EventSource(
+          `http://localhost:8000/process/events/${sessionId}`
+        );
+        source.addEventListener("progress", (event) => {
+          const data = JSON.parse(event.data);
+          if (
+            data.status === "mismatch_detection_completed" ||
+            data.status === "error"
+          ) {
+            source.close();
+            resolve(data);
+          }
+        });
+        source.onerror = () => {
+          if (source.readyState === EventSource.CLOSED) {
+            reject(new Error("Failed to follow mismatch detection progress"));
+          }
+        };
+      });
+
+      if (progress.status === "error") {
+        throw new Error(progress.error || "Mismatch detection failed");
+      }
+
+      const sessionResponse = await fetch(
+        `http://localhost:8000/process/session/${sessionId}?summary=true`
+      );
+      if (!sessionResponse.ok) {
+        throw new Error("Failed to fetch session data");
+      }
+      const data = await sessionResponse.json();
+      setSessionData(data);
       setReportCard(data.report_card);
+      await fetchMismatches(null);
       setStage("report");
-      await fetchSessionData();
     } catch (err) {
       setError(err.message);
     } finally {
@@ -196,7 +269,8 @@ const Report = () => {
     }
   };
 
-  const handleEditAndUpdateExcel = async (updatedData) => {
+  const handleEditAndUpdateExcel = async (updatedData, change) => {
+    // Only the loaded pages are on screen, so send just the edited field
     try {
       const response = await fetch(
         `http://localhost:8000/process/update-excel/${sessionId}`,
@@ -205,7 +279,7 @@ const Report = () => {
           headers: {
             "Content-Type": "application/json",
           },
-          body: JSON.stringify({ invoices: updatedData }),
+          body: JSON.stringify({ changes: [change] }),
         }
       );
 
@@ -284,16 +358,25 @@ const Report = () => {
             <p>
               Total invoices extracted:{" "}
               <span className="font-bold text-blue-600">
-                {sessionData?.extracted_invoices?.length || 0}
+                {sessionData?.extracted_count || 0}
               </span>
             </p>
           </div>
 
           <ExcelViewer
-            invoices={sessionData?.extracted_invoices || []}
+            invoices={invoices}
             isEditable={stage === "extracted" || stage === "gstr2b"}
             onUpdate={handleEditAndUpdateExcel}
           />
+
+          {invoicesCursor && (
+            <button
+              onClick={() => fetchInvoices(invoicesCursor).catch((err) => setError(err.message))}
+              className="mt-4 px-4 py-2 bg-white border border-gray-300 text-gray-700 rounded-lg hover:bg-gray-100 text-sm"
+            >
+              Load more invoices ({invoices.length} of {sessionData?.extracted_count || 0} shown)
+            </button>
+          )}
         </div>
       )}
 
@@ -483,13 +566,13 @@ const Report = () => {
           </div>
 
           {/* Detailed Mismatches */}
-          {reportCard.detail.mismatches.length > 0 && (
+          {mismatches.length > 0 && (
             <div>
               <h3 className="font-semibold text-gray-900 mb-4">
-                Issues Found ({reportCard.detail.mismatches.length})
+                Issues Found ({reportCard.summary.discrepancies_found})
               </h3>
               <div className="space-y-3 max-h-96 overflow-y-auto">
-                {reportCard.detail.mismatches.map((mismatch, idx) => (
+                {mismatches.map((mismatch, idx) => (
                   <div key={idx} className="bg-white p-4 rounded-lg border border-yellow-300">
                     <p className="font-medium text-gray-900">
                       Invoice: {mismatch.invoice_number}
@@ -504,6 +587,14 @@ const Report = () => {
                     </ul>
                   </div>
                 ))}
+                {mismatchesCursor && (
+                  <button
+                    onClick={() => fetchMismatches(mismatchesCursor).catch((err) => setError(err.message))}
+                    className="w-full px-4 py-2 bg-white border border-gray-300 text-gray-700 rounded-lg hover:bg-gray-100 text-sm"
+                  >
+                    Load more issues
+                  </button>
+                )}
               </div>
             </div>
           )}